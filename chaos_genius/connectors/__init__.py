@@ -35,14 +35,20 @@ def get_sqla_db_conn(data_source_info=None, connection_config=None) -> BaseDb:
             db_connection_info = data_source_info["sourceConfig"][
                 "connectionConfiguration"
             ]
-            database = db_class(connection_info=db_connection_info)
+            database = db_class(
+                connection_info=db_connection_info,
+                data_source_id=data_source_info.get("id"),
+            )
         else:
             # TODO: Make this configurable from the integration constants
             db_class = DB_CLASS_MAPPER["Postgres"]
             db_connection_info = data_source_info["destinationConfig"][
                 "connectionConfiguration"
             ]
-            database = db_class(connection_info=db_connection_info)
+            database = db_class(
+                connection_info=db_connection_info,
+                data_source_id=data_source_info.get("id"),
+            )
     elif connection_config:
         ds_type = connection_config["connection_type"]
         db_connection_info = connection_config["connectionConfiguration"]
@@ -16,6 +16,9 @@ class AwsAthenaDb(BaseDb):
     __SQL_STRPTIME_FORMAT = "timestamp '%Y-%m-%d %H:%M:%S%z'"
     __SQL_STRFTIME_FORMAT = "timestamp '%Y-%m-%d %H:%M:%S'"
     __SQL_IDENTIFIER = '"'
+    # queries go over HTTP, so there are no stale connections to detect and
+    # a ping would run a full query on every checkout
+    __POOL_PRE_PING = False
 
     @property
     def sql_identifier(self):
@@ -37,6 +40,11 @@ class AwsAthenaDb(BaseDb):
         """Format to convert dates into strings."""
         return self.__SQL_STRFTIME_FORMAT
 
+    @property
+    def pool_pre_ping(self):
+        """Whether pooled connections are checked for liveness before use."""
+        return self.__POOL_PRE_PING
+
     db_name = "aws athena"
     test_db_query = "SELECT 1"
 
@@ -71,7 +79,9 @@ class AwsAthenaDb(BaseDb):
 
     def get_db_engine(self):
         db_uri = self.get_db_uri()
-        self.engine = create_engine(db_uri, echo=self.debug)
+        self.engine = create_engine(
+            db_uri, echo=self.debug, **self.engine_pool_options
+        )
         return self.engine
 
     def get_pyathena_engine(self):
@@ -113,7 +123,7 @@ class AwsAthenaDb(BaseDb):
         return status, message
 
     def run_query(self, query, as_df=True):
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df:
             return merge_dataframe_chunks(
                 pd.read_sql_query(query, engine, chunksize=self.CHUNKSIZE)
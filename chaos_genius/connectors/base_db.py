@@ -1,9 +1,18 @@
 import logging
 
+import pandas as pd
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import exc as sqlalchemy_exc
 from sqlalchemy import text
 
+from chaos_genius.connectors.engine_registry import get_registered_engine
+from chaos_genius.connectors.query_cache import get_query_cache, get_query_cache_key
+from chaos_genius.settings import (
+    DATA_SOURCE_ENGINE_MAX_OVERFLOW,
+    DATA_SOURCE_ENGINE_POOL_SIZE,
+    QUERY_CACHE_ENABLED,
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -13,6 +22,12 @@ class BaseDb:
     __SQL_DATE_FORMAT = "'%Y-%m-%dT00:00:00{}'"
     __SQL_STRPTIME_FORMAT = "'%Y-%m-%dT%H:%M:%S%z'"
     __SQL_STRFTIME_FORMAT = "'%Y-%m-%dT%H:%M:%S'"
+    __SQL_DATE_TRUNC = {
+        "H": "date_trunc('hour', {})",
+        "D": "date_trunc('day', {})",
+    }
+    __SQL_DATE_TRUNC_IN_UTC = False
+    __POOL_PRE_PING = True
 
     @property
     def sql_identifier(self):
@@ -34,8 +49,36 @@ class BaseDb:
         """Format to convert dates into strings."""
         return self.__SQL_STRFTIME_FORMAT
 
+    @property
+    def sql_date_trunc(self):
+        """Expressions to truncate a datetime column to an hour or a day."""
+        return self.__SQL_DATE_TRUNC
+
+    @property
+    def sql_date_trunc_in_utc(self):
+        """Whether timestamp columns are truncated in UTC by sql_date_trunc.
+
+        Otherwise datetimes are truncated in the database timezone.
+        """
+        return self.__SQL_DATE_TRUNC_IN_UTC
+
+    @property
+    def pool_pre_ping(self):
+        """Whether pooled connections are checked for liveness before use."""
+        return self.__POOL_PRE_PING
+
+    @property
+    def engine_pool_options(self):
+        """Options for the connection pool of the SQLAlchemy engine."""
+        return {
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_size": DATA_SOURCE_ENGINE_POOL_SIZE,
+            "max_overflow": DATA_SOURCE_ENGINE_MAX_OVERFLOW,
+        }
+
     def __init__(self, *args, **kwargs):
         self.ds_info = kwargs.get("connection_info")
+        self.data_source_id = kwargs.get("data_source_id")
         self.CHUNKSIZE = 20000
         self.debug = False
 
@@ -45,18 +88,82 @@ class BaseDb:
     def get_db_engine(self):
         raise NotImplementedError()
 
+    def get_shared_db_engine(self):
+        """Return the engine of the data source from the engine registry.
+
+        Connection configs which are not saved as a data source (e.g. when
+        testing a new connection) get a new engine.
+        """
+        if self.data_source_id is None:
+            return self.get_db_engine()
+        self.engine = get_registered_engine(
+            self.data_source_id,
+            type(self).__name__,
+            self.ds_info,
+            self.get_db_engine,
+        )
+        return self.engine
+
     def test_connection(self):
         raise NotImplementedError()
 
     def run_query(self, query):
         raise NotImplementedError()
 
+    def run_cached_query(self, query, use_cache=True):
+        """Run a query, reusing its result from the query cache if enabled.
+
+        Queries on connection configs which are not saved as a data source
+        are never cached.
+
+        :param query: SQL query
+        :type query: str
+        :param use_cache: set to False to always run the query on the data
+        source (the fresh result is still cached), defaults to True
+        :type use_cache: bool, optional
+        :return: query result
+        :rtype: pd.DataFrame
+        """
+        if not QUERY_CACHE_ENABLED or self.data_source_id is None:
+            return self.run_query(query)
+
+        key = get_query_cache_key(self.data_source_id, self.ds_info, query)
+        if use_cache:
+            try:
+                df = get_query_cache().get(key)
+            except Exception:  # noqa: B902
+                logger.warning("Error reading from query cache", exc_info=True)
+                df = None
+            if df is not None:
+                logger.info(f"Query cache hit for data source {self.data_source_id}")
+                return df
+
+        df = self.run_query(query)
+        try:
+            get_query_cache().set(key, df)
+        except Exception:  # noqa: B902
+            logger.warning("Error writing to query cache", exc_info=True)
+        return df
+
+    def iter_query_chunks(self, query):
+        """Yield the result of a query as dataframes of at most CHUNKSIZE rows.
+
+        Server side cursors are used where the database driver supports them,
+        so the full result set is never held in memory at once.
+        """
+        engine = self.get_shared_db_engine()
+        with engine.connect() as connection:
+            connection = connection.execution_options(stream_results=True)
+            yield from pd.read_sql_query(
+                query, connection, chunksize=self.CHUNKSIZE
+            )
+
     def get_schema(self):
         raise NotImplementedError()
 
     def init_inspector(self):
         if not hasattr(self, "engine") or not self.engine:
-            self.engine = self.get_db_engine()
+            self.engine = self.get_shared_db_engine()
         self.inspector = SQLAlchemy().inspect(self.engine)
         return self.inspector
 
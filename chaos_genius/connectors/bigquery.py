@@ -13,12 +13,38 @@ class BigQueryDb(BaseDb):
     test_db_query = "SELECT 1"
 
     __SQL_IDENTIFIER = "`"
+    # DATETIME columns keep their (database timezone) wall time, TIMESTAMP
+    # columns are cast to their UTC wall time. Both come back as DATETIME,
+    # like unaware datetimes from the other data sources.
+    __SQL_DATE_TRUNC = {
+        "H": "DATETIME_TRUNC(CAST({} AS DATETIME), HOUR)",
+        "D": "DATETIME_TRUNC(CAST({} AS DATETIME), DAY)",
+    }
+    __SQL_DATE_TRUNC_IN_UTC = True
+    # queries go over HTTP, so there are no stale connections to detect and
+    # a ping would run a full query on every checkout
+    __POOL_PRE_PING = False
 
     @property
     def sql_identifier(self):
         """Used to quote SQL illegal identifiers."""
         return self.__SQL_IDENTIFIER
 
+    @property
+    def sql_date_trunc(self):
+        """Expressions to truncate a datetime column to an hour or a day."""
+        return self.__SQL_DATE_TRUNC
+
+    @property
+    def sql_date_trunc_in_utc(self):
+        """Whether timestamp columns are truncated in UTC by sql_date_trunc."""
+        return self.__SQL_DATE_TRUNC_IN_UTC
+
+    @property
+    def pool_pre_ping(self):
+        """Whether pooled connections are checked for liveness before use."""
+        return self.__POOL_PRE_PING
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -39,7 +65,10 @@ class BigQueryDb(BaseDb):
             raise NotImplementedError("Credentials JSON not found for Google BigQuery.")
         credentials_info = json.loads(credentials_info)
         self.engine = create_engine(
-            db_uri, credentials_info=credentials_info, echo=self.debug
+            db_uri,
+            credentials_info=credentials_info,
+            echo=self.debug,
+            **self.engine_pool_options,
         )
         return self.engine
 
@@ -59,7 +88,7 @@ class BigQueryDb(BaseDb):
         return status, message
 
     def run_query(self, query, as_df=True):
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df:
             return merge_dataframe_chunks(
                 pd.read_sql_query(query, engine, chunksize=self.CHUNKSIZE)
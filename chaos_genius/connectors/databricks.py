@@ -54,7 +54,12 @@ class Databricks(BaseDb):
         if catalog:
             connect_args["catalog"] = catalog
 
-        self.engine = create_engine(db_uri, echo=self.debug, connect_args=connect_args)
+        self.engine = create_engine(
+            db_uri,
+            echo=self.debug,
+            connect_args=connect_args,
+            **self.engine_pool_options,
+        )
         return self.engine
 
     def test_connection(self):
@@ -81,7 +86,7 @@ class Databricks(BaseDb):
 
     def run_query(self, query, as_df=True):
         """Run a SQL query."""
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df:
             return merge_dataframe_chunks(
                 pd.read_sql_query(query, engine, chunksize=self.CHUNKSIZE)
@@ -20,12 +20,35 @@ class Druid(BaseDb):
     ]
 
     __SQL_IDENTIFIER = '"'
+    __SQL_DATE_TRUNC = {
+        "H": "TIME_FLOOR({}, 'PT1H')",
+        "D": "TIME_FLOOR({}, 'P1D')",
+    }
+    __SQL_DATE_TRUNC_IN_UTC = True
+    # queries go over HTTP, so there are no stale connections to detect and
+    # a ping would run a full query on every checkout
+    __POOL_PRE_PING = False
 
     @property
     def sql_identifier(self):
         """Used to quote SQL illegal identifiers."""
         return self.__SQL_IDENTIFIER
 
+    @property
+    def sql_date_trunc(self):
+        """Expressions to truncate a datetime column to an hour or a day."""
+        return self.__SQL_DATE_TRUNC
+
+    @property
+    def sql_date_trunc_in_utc(self):
+        """Whether timestamp columns are truncated in UTC by sql_date_trunc."""
+        return self.__SQL_DATE_TRUNC_IN_UTC
+
+    @property
+    def pool_pre_ping(self):
+        """Whether pooled connections are checked for liveness before use."""
+        return self.__POOL_PRE_PING
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -50,7 +73,9 @@ class Druid(BaseDb):
 
     def get_db_engine(self):
         db_uri = self.get_db_uri()
-        self.engine = create_engine(db_uri, echo=self.debug)
+        self.engine = create_engine(
+            db_uri, echo=self.debug, **self.engine_pool_options
+        )
         return self.engine
 
     def test_connection(self):
@@ -88,7 +113,7 @@ class Druid(BaseDb):
         return db_columns
 
     def run_query(self, query, as_df=True):
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df:
             return merge_dataframe_chunks(
                 pd.read_sql_query(query, engine, chunksize=self.CHUNKSIZE)
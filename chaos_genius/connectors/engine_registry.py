@@ -0,0 +1,113 @@
+"""Process-wide registry of SQLAlchemy engines for data sources.
+
+Creating an engine for every query means a new connection pool, and so a new
+connection (with its TLS and auth handshakes) for every query. The registry
+keeps one engine per data source, which is re-created if the connection
+config of the data source changes.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+_ENGINES: Dict[int, Tuple[str, Engine]] = {}
+_ENGINES_LOCK = threading.Lock()
+
+# pools inherited by a forked process. They are kept referenced so that their
+# connections, which are shared with the parent process, are not closed from
+# the forked process.
+_INHERITED_POOLS: List[Pool] = []
+
+
+def _get_config_hash(db_class_name: str, connection_info: dict) -> str:
+    config = json.dumps(
+        {"class": db_class_name, "connection_info": connection_info},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+def get_registered_engine(
+    data_source_id: int,
+    db_class_name: str,
+    connection_info: dict,
+    create_engine_func: Callable[[], Engine],
+) -> Engine:
+    """Return the engine of a data source, creating it if needed.
+
+    :param data_source_id: ID of the data source
+    :type data_source_id: int
+    :param db_class_name: name of the connector class
+    :type db_class_name: str
+    :param connection_info: connection config of the data source
+    :type connection_info: dict
+    :param create_engine_func: function which creates a new engine
+    :type create_engine_func: Callable[[], Engine]
+    :return: the shared engine for the data source
+    :rtype: Engine
+    """
+    config_hash = _get_config_hash(db_class_name, connection_info)
+    with _ENGINES_LOCK:
+        registered = _ENGINES.get(data_source_id)
+        if registered is not None:
+            registered_hash, engine = registered
+            if registered_hash == config_hash:
+                return engine
+
+            logger.info(
+                f"Connection config changed for data source {data_source_id}, "
+                + "re-creating engine"
+            )
+            engine.dispose()
+
+        engine = create_engine_func()
+        _ENGINES[data_source_id] = (config_hash, engine)
+        return engine
+
+
+def evict_engine(data_source_id: int) -> None:
+    """Dispose and remove the engine of a data source from the registry.
+
+    Must be called when a data source is updated or deleted.
+
+    :param data_source_id: ID of the data source
+    :type data_source_id: int
+    """
+    with _ENGINES_LOCK:
+        registered = _ENGINES.pop(data_source_id, None)
+    if registered is not None:
+        registered[1].dispose()
+        logger.info(f"Evicted engine for data source {data_source_id}")
+
+
+def dispose_engine_after_fork(engine: Engine) -> None:
+    """Discard the connections a forked process inherited with an engine.
+
+    The engine opens new connections afterwards. The inherited connections
+    are left open, as the parent process still uses them.
+
+    :param engine: engine created in the parent process
+    :type engine: Engine
+    """
+    try:
+        engine.dispose(close=False)
+    except TypeError:
+        # close is only supported from SQLAlchemy 1.4.33
+        _INHERITED_POOLS.append(engine.pool)
+        engine.pool = engine.pool.recreate()
+
+
+def dispose_engines_after_fork() -> None:
+    """Discard the connections of all registered engines in a forked process."""
+    with _ENGINES_LOCK:
+        engines = [engine for _, engine in _ENGINES.values()]
+    for engine in engines:
+        dispose_engine_after_fork(engine)
@@ -8,12 +8,21 @@ from .connector_utils import merge_dataframe_chunks
 class MysqlDb(BaseDb):
 
     __SQL_IDENTIFIER = "`"
+    __SQL_DATE_TRUNC = {
+        "H": "DATE_ADD(DATE({0}), INTERVAL HOUR({0}) HOUR)",
+        "D": "TIMESTAMP(DATE({0}))",
+    }
 
     @property
     def sql_identifier(self):
         """Used to quote any SQL identifier in case of it using special characters or keywords."""
         return self.__SQL_IDENTIFIER
 
+    @property
+    def sql_date_trunc(self):
+        """Expressions to truncate a datetime column to an hour or a day."""
+        return self.__SQL_DATE_TRUNC
+
     db_name = "mysql"
     test_db_query = "SELECT 1"
 
@@ -38,7 +47,9 @@ class MysqlDb(BaseDb):
 
     def get_db_engine(self):
         db_uri = self.get_db_uri()
-        self.engine = create_engine(db_uri, echo=self.debug)
+        self.engine = create_engine(
+            db_uri, echo=self.debug, **self.engine_pool_options
+        )
         return self.engine
 
     def test_connection(self):
@@ -60,7 +71,7 @@ class MysqlDb(BaseDb):
         return status, message
 
     def run_query(self, query, as_df=True):
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df == True:
             return merge_dataframe_chunks(
                 pd.read_sql_query(query, engine, chunksize=self.CHUNKSIZE)
@@ -36,7 +36,9 @@ class PostgresDb(BaseDb):
 
     def get_db_engine(self):
         db_uri = self.get_db_uri()
-        self.engine = create_engine(db_uri, echo=self.debug)
+        self.engine = create_engine(
+            db_uri, echo=self.debug, **self.engine_pool_options
+        )
         return self.engine
 
     def test_connection(self):
@@ -58,7 +60,7 @@ class PostgresDb(BaseDb):
         return status, message
 
     def run_query(self, query, as_df=True):
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df == True:
             return merge_dataframe_chunks(
                 pd.read_sql_query(query, engine, chunksize=self.CHUNKSIZE)
@@ -0,0 +1,228 @@
+"""Cache of data source query results, keyed by data source and query.
+
+The same query is often run several times in a short window (e.g. the
+DeepDrills line data and time ranges, or KPI validation right before the
+first analytics run). Results are kept for QUERY_CACHE_TTL seconds, and at
+most QUERY_CACHE_MAX_ENTRIES results are kept, evicting the least recently
+used ones. Results can be cached on disk (per host) or in redis (shared).
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from typing import Optional
+
+import pandas as pd
+
+from chaos_genius.settings import (
+    QUERY_CACHE_BACKEND,
+    QUERY_CACHE_DIR,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_REDIS_URL,
+    QUERY_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "cg_query_cache:"
+REDIS_LRU_KEY = "cg_query_cache_lru"
+
+
+def canonicalize_query(query: str) -> str:
+    """Return the query with insignificant whitespace and semicolons removed."""
+    return re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
+
+
+def get_query_cache_key(
+    data_source_id: int, connection_info: dict, query: str
+) -> str:
+    """Return the cache key of a query on a data source.
+
+    The connection config is part of the key, so results are not reused once
+    the data source is pointed elsewhere.
+
+    :param data_source_id: ID of the data source
+    :type data_source_id: int
+    :param connection_info: connection config of the data source
+    :type connection_info: dict
+    :param query: SQL query
+    :type query: str
+    :return: hex digest identifying the query result
+    :rtype: str
+    """
+    key = json.dumps(
+        {
+            "data_source_id": data_source_id,
+            "connection_info": connection_info,
+            "query": canonicalize_query(query),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class DiskQueryCache:
+    """Query results pickled to files, one file per cache key."""
+
+    def __init__(self, path: str, ttl: int, max_entries: int):
+        """Initialize the cache.
+
+        :param path: directory to store results in
+        :type path: str
+        :param ttl: seconds for which a result is valid
+        :type ttl: int
+        :param max_entries: max number of results to keep
+        :type max_entries: int
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _get_entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached result of a key, None if missing or expired."""
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                created_at, df = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+
+        if time.time() - created_at > self.ttl:
+            self._remove(entry_path)
+            return None
+
+        # the modification time tracks the last use, for LRU eviction
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return df
+
+    def set(self, key: str, df: pd.DataFrame) -> None:
+        """Cache the result of a key, evicting old results if needed."""
+        os.makedirs(self.path, exist_ok=True)
+        entry_path = self._get_entry_path(key)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((time.time(), df), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+        with self._lock:
+            self._evict()
+
+    def _remove(self, entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".pkl"):
+                continue
+            entry_path = os.path.join(self.path, name)
+            try:
+                entries.append((os.path.getmtime(entry_path), entry_path))
+            except OSError:
+                continue
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, entry_path in entries[: len(entries) - self.max_entries]:
+            self._remove(entry_path)
+
+
+class RedisQueryCache:
+    """Query results stored as Parquet in redis, shared by all workers.
+
+    Values are never unpickled, so whoever can write to the redis database
+    can not run code in the workers through it.
+    """
+
+    def __init__(self, url: str, ttl: int, max_entries: int):
+        """Initialize the cache.
+
+        :param url: URL of the redis database
+        :type url: str
+        :param ttl: seconds for which a result is valid
+        :type ttl: int
+        :param max_entries: max number of results to keep
+        :type max_entries: int
+        """
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached result of a key, None if missing or expired."""
+        value = self.client.get(REDIS_KEY_PREFIX + key)
+        if value is None:
+            return None
+        try:
+            df = pd.read_parquet(io.BytesIO(value))
+        except (OSError, ValueError):
+            logger.warning(f"Discarding invalid query cache entry {key}")
+            self.client.delete(REDIS_KEY_PREFIX + key)
+            return None
+        self.client.zadd(REDIS_LRU_KEY, {key: time.time()})
+        return df
+
+    def set(self, key: str, df: pd.DataFrame) -> None:
+        """Cache the result of a key, evicting old results if needed."""
+        buffer = io.BytesIO()
+        df.to_parquet(buffer)
+        value = buffer.getvalue()
+        pipeline = self.client.pipeline()
+        pipeline.set(REDIS_KEY_PREFIX + key, value, ex=self.ttl)
+        pipeline.zadd(REDIS_LRU_KEY, {key: time.time()})
+        pipeline.execute()
+
+        # expired keys are dropped by redis, the LRU index is trimmed here
+        excess = self.client.zcard(REDIS_LRU_KEY) - self.max_entries
+        if excess > 0:
+            evicted = self.client.zrange(REDIS_LRU_KEY, 0, excess - 1)
+            pipeline = self.client.pipeline()
+            for evicted_key in evicted:
+                pipeline.delete(REDIS_KEY_PREFIX + evicted_key.decode())
+            pipeline.zrem(REDIS_LRU_KEY, *evicted)
+            pipeline.execute()
+
+
+_QUERY_CACHE = None
+_QUERY_CACHE_LOCK = threading.Lock()
+
+
+def get_query_cache():
+    """Return the query cache of the configured backend."""
+    global _QUERY_CACHE
+    with _QUERY_CACHE_LOCK:
+        if _QUERY_CACHE is None:
+            if QUERY_CACHE_BACKEND == "redis":
+                _QUERY_CACHE = RedisQueryCache(
+                    QUERY_CACHE_REDIS_URL, QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES
+                )
+            elif QUERY_CACHE_BACKEND == "disk":
+                _QUERY_CACHE = DiskQueryCache(
+                    QUERY_CACHE_DIR, QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES
+                )
+            else:
+                raise ValueError(
+                    f"Invalid query cache backend: {QUERY_CACHE_BACKEND}"
+                )
+        return _QUERY_CACHE
@@ -35,7 +35,7 @@ class Redshift(BaseDb):
 
     def get_db_engine(self):
         db_uri = self.get_db_uri()
-        self.engine = create_engine(db_uri)
+        self.engine = create_engine(db_uri, **self.engine_pool_options)
         return self.engine
 
     def test_connection(self):
@@ -54,7 +54,7 @@ class Redshift(BaseDb):
         return status, message
 
     def run_query(self, query, as_df=True):
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df:
             return merge_dataframe_chunks(pd.read_sql_query(query,
                                                             engine,
@@ -57,7 +57,9 @@ class SnowflakeDb(BaseDb):
 
     def get_db_engine(self):
         db_uri = self.get_db_uri()
-        self.engine = create_engine(db_uri, echo=self.debug)
+        self.engine = create_engine(
+            db_uri, echo=self.debug, **self.engine_pool_options
+        )
         return self.engine
 
     def test_connection(self):
@@ -76,7 +78,7 @@ class SnowflakeDb(BaseDb):
         return status, message
 
     def run_query(self, query, as_df=True):
-        engine = self.get_db_engine()
+        engine = self.get_shared_db_engine()
         if as_df:
             return merge_dataframe_chunks(
                 pd.read_sql_query(query, engine, chunksize=self.CHUNKSIZE)
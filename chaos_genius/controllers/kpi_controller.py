@@ -1,12 +1,20 @@
 """Logic and helpers for interaction with KPIs."""
 import logging
+import threading
+import time
 from datetime import date, datetime, timedelta
-from typing import Iterator, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from sqlalchemy import delete
+from sqlalchemy import case, delete, or_, update
 
 from chaos_genius.controllers.task_monitor import checkpoint_failure, checkpoint_success
 from chaos_genius.core.anomaly.controller import AnomalyDetectionController
+from chaos_genius.core.anomaly.models import MODEL_MAPPER
+from chaos_genius.core.anomaly.prescreen import MEDIAN_MAD_ZSCORE
+from chaos_genius.core.anomaly.processor import (
+    ZSCORE_UPPER_BOUND,
+    delete_anomaly_model_state,
+)
 from chaos_genius.core.rca.constants import TIME_RANGES_BY_KEY
 from chaos_genius.core.rca.rca_controller import RootCauseAnalysisController
 from chaos_genius.core.utils.data_loader import DataLoader
@@ -22,13 +30,77 @@ from chaos_genius.settings import (
 logger = logging.getLogger(__name__)
 
 
+# seconds for which the last date with data of a KPI is reused, so that the
+# anomaly and DeepDrills tasks of a scheduler run share a single query. KPIs
+# scheduled hourly are not cached, as their data can arrive within the TTL.
+LAST_DATA_DATE_CACHE_TTL = 10 * 60
+
+_LAST_DATA_DATE_CACHE: Dict[Tuple[int, date], Tuple[float, Optional[date]]] = {}
+_LAST_DATA_DATE_CACHE_LOCK = threading.Lock()
+
+
+def invalidate_last_data_date_cache(kpi_id: int) -> None:
+    """Forget the cached last dates with data of a KPI in this process.
+
+    :param kpi_id: ID of the KPI
+    :type kpi_id: int
+    """
+    with _LAST_DATA_DATE_CACHE_LOCK:
+        for key in [key for key in _LAST_DATA_DATE_CACHE if key[0] == kpi_id]:
+            del _LAST_DATA_DATE_CACHE[key]
+
+
+def _get_last_data_date(kpi_info: dict, end_date: date) -> Optional[date]:
+    """Return the last date with data in the slack window ending at end_date.
+
+    The window covers MAX_SUMMARY_DEEPDRILLS_SLACK_DAYS days before end_date
+    and is checked with a single query instead of one count query per day.
+    """
+    scheduler_params = kpi_info.get("scheduler_params") or {}
+    use_cache = scheduler_params.get("scheduler_frequency", "D") != "H"
+
+    key = (kpi_info["id"], end_date)
+    with _LAST_DATA_DATE_CACHE_LOCK:
+        cached = _LAST_DATA_DATE_CACHE.get(key)
+    if (
+        use_cache
+        and cached is not None
+        and time.monotonic() - cached[0] < LAST_DATA_DATE_CACHE_TTL
+    ):
+        return cached[1]
+
+    last_date = DataLoader(
+        kpi_info,
+        end_date=end_date,
+        days_before=MAX_SUMMARY_DEEPDRILLS_SLACK_DAYS,
+    ).get_last_date()
+    if last_date is not None and last_date > end_date:
+        # rows at the window boundary can fall on the next day after the
+        # conversion to the reporting timezone
+        last_date = end_date
+    if not use_cache:
+        return last_date
+
+    now = time.monotonic()
+    with _LAST_DATA_DATE_CACHE_LOCK:
+        # expired entries are dropped here, so the cache stays small
+        expired = [
+            key
+            for key, (cached_at, _) in _LAST_DATA_DATE_CACHE.items()
+            if now - cached_at >= LAST_DATA_DATE_CACHE_TTL
+        ]
+        for expired_key in expired:
+            del _LAST_DATA_DATE_CACHE[expired_key]
+        _LAST_DATA_DATE_CACHE[key] = (now, last_date)
+    return last_date
+
+
 def _is_data_present_for_end_date(
     kpi_info: dict, end_date: Optional[date] = None
 ) -> bool:
     if end_date is None:
         end_date = datetime.now().date()
-    df_count = DataLoader(kpi_info, end_date=end_date, days_before=0).get_count()
-    return df_count != 0
+    return _get_last_data_date(kpi_info, end_date) == end_date
 
 
 def get_kpi_data_from_id(n: int) -> dict:
@@ -100,18 +172,16 @@ def _get_end_date_for_rca_kpi(kpi_info: dict, end_date: Optional[date] = None) -
     if end_date is None:
         end_date = datetime.today().date() - timedelta(days=(DAYS_OFFSET_FOR_ANALTYICS))
 
-    count = 0
-    while not _is_data_present_for_end_date(kpi_info, end_date):
-        logger.info(f"Checking for end date: {end_date}.")
-        end_date = end_date - timedelta(days=1)
-        count += 1
-        if count > MAX_SUMMARY_DEEPDRILLS_SLACK_DAYS:
-            raise ValueError(
-                f"KPI has no data for the last "
-                f"{MAX_SUMMARY_DEEPDRILLS_SLACK_DAYS} days."
-            )
+    last_date = _get_last_data_date(kpi_info, end_date)
+    if last_date is None:
+        raise ValueError(
+            f"KPI has no data for the last "
+            f"{MAX_SUMMARY_DEEPDRILLS_SLACK_DAYS} days."
+        )
+    if last_date != end_date:
+        logger.info(f"No data for end date {end_date}, using {last_date}.")
 
-    return end_date
+    return last_date
 
 
 def run_rca_for_kpi(
@@ -269,12 +339,104 @@ def delete_rca_output_for_kpi(kpi_id: int):
 
 
 def delete_anomaly_output_for_kpi(kpi_id: int):
-    """Delete Anomaly output for a particular KPI."""
+    """Delete Anomaly output for a particular KPI, and its saved model state."""
     delete_kpi_query = delete(AnomalyDataOutput).where(
         AnomalyDataOutput.kpi_id == kpi_id
     )
     db.session.execute(delete_kpi_query)
     db.session.commit()
+    # the model state continues from the deleted output
+    delete_anomaly_model_state(kpi_id)
+
+
+def rescale_anomaly_output_for_kpi(
+    kpi_id: int, model_name: str, old_sensitivity: str, new_sensitivity: str
+) -> bool:
+    """Rescale the anomaly output of a KPI to a new sensitivity, in place.
+
+    The bounds of each point are rescaled around its center (yhat) and its
+    anomaly and severity are recomputed, all in a single UPDATE. Nothing is
+    updated if the model can't rescale its bounds, or if some of the output
+    was saved without a center. The anomaly needs to be run again then.
+
+    :param kpi_id: KPI to rescale the anomaly output of
+    :type kpi_id: int
+    :param model_name: model the anomaly output was computed with
+    :type model_name: str
+    :param old_sensitivity: sensitivity the anomaly output was computed with
+    :type old_sensitivity: str
+    :param new_sensitivity: sensitivity to rescale the anomaly output to
+    :type new_sensitivity: str
+    :return: whether the anomaly output was rescaled
+    :rtype: bool
+    """
+    try:
+        model = MODEL_MAPPER[model_name]
+        ratio = model.get_bounds_scale(new_sensitivity) / model.get_bounds_scale(
+            old_sensitivity
+        )
+        screened_ratio = (
+            MEDIAN_MAD_ZSCORE[new_sensitivity.lower()]
+            / MEDIAN_MAD_ZSCORE[old_sensitivity.lower()]
+        )
+    except (KeyError, NotImplementedError):
+        logger.info(f"Bounds of {model_name} can't be rescaled for KPI: {kpi_id}")
+        return False
+
+    is_kpi_output = AnomalyDataOutput.kpi_id == kpi_id
+    output_without_center = (
+        db.session.query(AnomalyDataOutput.id)
+        .filter(
+            is_kpi_output,
+            AnomalyDataOutput.yhat.is_(None),
+            AnomalyDataOutput.yhat_lower.isnot(None),
+        )
+        .first()
+    )
+    if output_without_center is not None:
+        logger.info(f"Anomaly output has no center saved for KPI: {kpi_id}")
+        return False
+
+    # screened bounds are from the pre-screen, with its own scales
+    bounds_ratio = case(
+        (AnomalyDataOutput.is_screened.is_(True), screened_ratio), else_=ratio
+    )
+    y = AnomalyDataOutput.y
+    yhat = AnomalyDataOutput.yhat
+    std_dev = AnomalyDataOutput.std_dev
+    yhat_lower = yhat - (yhat - AnomalyDataOutput.yhat_lower) * bounds_ratio
+    yhat_upper = yhat + (AnomalyDataOutput.yhat_upper - yhat) * bounds_ratio
+
+    # as in detect_anomalies and compute_severity, with the new bounds
+    is_anomaly = case((y > yhat_upper, 1), (y < yhat_lower, -1), else_=0)
+    zscore = (
+        case((y > yhat_upper, y - yhat_upper), else_=yhat_lower - y)
+        * 100
+        / (std_dev * ZSCORE_UPPER_BOUND)
+    )
+    severity = case(
+        (
+            or_(y > yhat_upper, y < yhat_lower),
+            case((std_dev == 0, 0), (zscore > 100, 100), else_=zscore),
+        ),
+        else_=0,
+    )
+
+    # the new values are all computed from the values before the update
+    rescale_query = (
+        update(AnomalyDataOutput)
+        .where(is_kpi_output)
+        .values(
+            yhat_lower=yhat_lower,
+            yhat_upper=yhat_upper,
+            is_anomaly=is_anomaly,
+            severity=severity,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(rescale_query)
+    db.session.commit()
+    return True
 
 
 def get_anomaly_count(kpi_id: int, timeline: str):
@@ -17,4 +17,5 @@ MODEL_NAME_MAPPING = {
     # "NeuralProphetModel": "NeuralProphet",
     # "GreyKiteModel": "Greykite",
     "ETSModel": "ETS",
+    "RollingMedianModel": "Rolling Median",
 }
@@ -1,30 +1,58 @@
 """Provides AnomalyDetectionController to compute Anomaly Detection."""
 
 
-import contextlib
 import json
 import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import date, datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
+from flask import has_app_context
 
+from chaos_genius.connectors.engine_registry import (
+    dispose_engine_after_fork,
+    dispose_engines_after_fork,
+)
 from chaos_genius.controllers.task_monitor import checkpoint_failure, checkpoint_success
 from chaos_genius.core.anomaly.constants import RESAMPLE_FREQUENCY
+from chaos_genius.core.anomaly.models import MODEL_MAPPER
+from chaos_genius.core.anomaly.multi_series import MultiSeriesAnomalyDetection
+from chaos_genius.core.anomaly.prescreen import prescreen_series
 from chaos_genius.core.anomaly.processor import ProcessAnomalyDetection
 from chaos_genius.core.anomaly.utils import (
     fill_data,
+    fill_resampled_series,
     get_dq_missing_data,
-    get_last_date_in_db,
+    get_fill_dates,
+    get_last_dates_in_db,
+    get_series_type_key,
+)
+from chaos_genius.core.utils.data_loader import (
+    PUSHDOWN_COUNT_COLUMN,
+    PUSHDOWN_MAX_COLUMN,
+    DataLoader,
 )
-from chaos_genius.core.utils.data_loader import DataLoader
 from chaos_genius.core.utils.end_date import load_input_data_end_date
-from chaos_genius.core.utils.utils import get_subgroup_from_df
-from chaos_genius.databases.models.anomaly_data_model import AnomalyDataOutput, db
+from chaos_genius.core.utils.utils import SubgroupIndex, is_string_column
+from chaos_genius.databases.bulk_writer import write_dataframe
+from chaos_genius.databases.models.anomaly_data_model import AnomalyDataOutput
 from chaos_genius.databases.models.data_source_model import DataSource
 from chaos_genius.databases.models.kpi_model import Kpi
+from chaos_genius.extensions import db
 from chaos_genius.settings import (
+    ANALYTICS_CATEGORICAL_DIMENSIONS,
+    ANALYTICS_PUSHDOWN_ENABLED,
+    ANALYTICS_STREAMING_AGGREGATION_ENABLED,
+    ANOMALY_MULTI_SERIES_ENABLED,
+    ANOMALY_SUBGROUP_WORKER_MEMORY_LIMIT,
+    ANOMALY_SUBGROUP_WORKERS,
+    DATA_LOADER_FETCH_PARTITIONS,
     HOURS_OFFSET_FOR_ANALTYICS,
+    KPI_DATA_CACHE_ENABLED,
     MAX_ANOMALY_SLACK_DAYS,
     MAX_FILTER_SUBGROUPS_ANOMALY,
     MAX_SUBDIM_CARDINALITY,
@@ -36,6 +64,38 @@ logger = logging.getLogger(__name__)
 
 DEBUG_MAX_SUBGROUPS = 10
 
+# controller and input data of the subgroups run in a process pool. Workers
+# are forked, so they inherit these (copy-on-write) instead of each subgroup
+# pickling the input data.
+_SUBGROUP_WORKER_STATE: dict = {}
+
+
+def _init_subgroup_worker(memory_limit: int) -> None:
+    """Set up a subgroup worker process.
+
+    Database connections inherited from the parent process are discarded, so
+    that they are never used from both processes, and the memory (in MB) the
+    worker can allocate is limited.
+    """
+    dispose_engines_after_fork()
+    if has_app_context():
+        dispose_engine_after_fork(db.engine)
+
+    if memory_limit > 0:
+        import resource
+
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _predict_subgroup(
+    subgroup: Dict[str, str], last_date: Optional[datetime]
+) -> pd.DataFrame:
+    """Return the anomaly output of a subgroup, in a worker process."""
+    controller = _SUBGROUP_WORKER_STATE["controller"]
+    input_data = _SUBGROUP_WORKER_STATE["input_data"]
+    return controller._predict_series(input_data, "subdim", subgroup, last_date)
+
 
 class AnomalyDetectionController(object):
     """Controller class for performing Anomaly Detection."""
@@ -84,6 +144,17 @@ class AnomalyDetectionController(object):
 
         self._task_id = task_id
 
+        # last dates of all series of the KPI, fetched once per run
+        self._last_dates_in_db: Optional[
+            Dict[Tuple[str, Optional[str]], datetime]
+        ] = None
+
+        # anomaly outputs waiting to be written at the end of the stage
+        self._pending_anomaly_outputs: List[pd.DataFrame] = []
+
+        # row positions of subgroups in the input data, built when first used
+        self._subgroup_index: Optional[SubgroupIndex] = None
+
         # TODO: Make this connection type agnostic.
         conn_type = DataSource.get_by_id(
             kpi_info["data_source"]
@@ -91,6 +162,22 @@ class AnomalyDetectionController(object):
         self._preaggregated = conn_type == "Druid"
         self._preaggregated_count_col = self.kpi_info["count_column"]
 
+        # sum KPIs are aggregated by hour in the data source itself, the
+        # loaded data then has the same shape as preaggregated data. Count
+        # KPIs are not, their data quality series depend on the type of the
+        # raw metric column.
+        self._pushdown = (
+            (ANALYTICS_PUSHDOWN_ENABLED or ANALYTICS_STREAMING_AGGREGATION_ENABLED)
+            and not self._preaggregated
+            and self.kpi_info["aggregation"] == "sum"
+        )
+        if self._pushdown:
+            self._preaggregated = True
+            self._preaggregated_count_col = PUSHDOWN_COUNT_COLUMN
+        # without pushdown in the database, the same aggregates are computed
+        # while streaming the raw rows in chunks.
+        self._stream_aggregation = self._pushdown and not ANALYTICS_PUSHDOWN_ENABLED
+
         logger.info(f"Anomaly controller initialized for KPI ID: {kpi_info['id']}")
 
     def _load_anomaly_data(self) -> pd.DataFrame:
@@ -107,17 +194,29 @@ class AnomalyDetectionController(object):
         if self.kpi_info["anomaly_params"]["frequency"] == "H":
             period /= 24
 
+        pushdown_frequency = "H" if self._pushdown else None
+
         if not last_date:
             return DataLoader(
                 self.kpi_info,
                 end_date=self.end_date,
                 days_before=period,
+                pushdown_frequency=pushdown_frequency,
+                use_cache=KPI_DATA_CACHE_ENABLED,
+                stream_aggregation=self._stream_aggregation,
+                fetch_partitions=DATA_LOADER_FETCH_PARTITIONS,
+                categorical_dimensions=ANALYTICS_CATEGORICAL_DIMENSIONS,
             ).get_data()
         start_date = last_date - timedelta(days=period)
         return DataLoader(
             self.kpi_info,
             end_date=self.end_date,
             start_date=start_date,
+            pushdown_frequency=pushdown_frequency,
+            use_cache=KPI_DATA_CACHE_ENABLED,
+            stream_aggregation=self._stream_aggregation,
+            fetch_partitions=DATA_LOADER_FETCH_PARTITIONS,
+            categorical_dimensions=ANALYTICS_CATEGORICAL_DIMENSIONS,
         ).get_data()
 
     def _get_last_date_in_db(self, series: str, subgroup: str = None) -> datetime:
@@ -130,7 +229,9 @@ class AnomalyDetectionController(object):
         :return: Last date for which we have data for the given series
         :rtype: datetime
         """
-        return get_last_date_in_db(self.kpi_info["id"], series, subgroup)
+        if self._last_dates_in_db is None:
+            self._last_dates_in_db = get_last_dates_in_db(self.kpi_info["id"])
+        return self._last_dates_in_db.get((series, get_series_type_key(subgroup)))
 
     def _create_hourly_input_data(self, input_data: pd.DataFrame) -> pd.DataFrame:
         """Return input data until the last complete hour minus the hourly_offset.
@@ -157,6 +258,23 @@ class AnomalyDetectionController(object):
         self.end_date = input_data[self.kpi_info["datetime_column"]].max()
         return input_data
 
+    def _get_model_kwargs(self, model_name: str) -> dict:
+        """Return the parameters to initialize the model with.
+
+        :param model_name: name of the model used for anomaly detection
+        :type model_name: str
+        :return: model_kwargs of the KPI, with its seasonality for models
+        which use it
+        :rtype: dict
+        """
+        model_kwargs = self.kpi_info.get("model_kwargs", {})
+        if MODEL_MAPPER[model_name].uses_kpi_seasonality:
+            model_kwargs = {
+                "seasonality": self.kpi_info["anomaly_params"].get("seasonality", []),
+                **model_kwargs,
+            }
+        return model_kwargs
+
     def _detect_anomaly(
         self,
         model_name: str,
@@ -197,7 +315,9 @@ class AnomalyDetectionController(object):
             self.slack,
             series,
             subgroup,
-            self.kpi_info.get("model_kwargs", {}),
+            self._get_model_kwargs(model_name),
+            self.kpi_info["id"],
+            self.kpi_info["anomaly_params"].get("prescreen", False),
         ).predict()
 
     def _save_anomaly_output(
@@ -212,27 +332,65 @@ class AnomalyDetectionController(object):
         :param subgroup: Subgroup of the KPI
         :type subgroup: dict
         """
-        if self.debug:
-            print("SAVING", series, subgroup, len(anomaly_output))
+        self._save_anomaly_outputs([(anomaly_output, subgroup)], series)
 
-        anomaly_output = anomaly_output.rename(
-            columns={"dt": "data_datetime", "anomaly": "is_anomaly"}
-        )
-        anomaly_output["kpi_id"] = self.kpi_info["id"]
-        anomaly_output["anomaly_type"] = series
+    def _save_anomaly_outputs(
+        self,
+        anomaly_outputs: List[Tuple[pd.DataFrame, Optional[dict]]],
+        series: str,
+    ) -> None:
+        """Save anomaly outputs of many subgroups to the DB at once.
 
-        if subgroup is not None:
-            subgroup = json.dumps(subgroup)
-        anomaly_output["series_type"] = subgroup
+        Outputs are buffered and written with the rest of the outputs of the
+        stage by _flush_anomaly_outputs.
 
-        anomaly_output["created_at"] = datetime.now()
+        :param anomaly_outputs: Dataframe with anomaly data and subgroup of
+        each series
+        :type anomaly_outputs: List[Tuple[pd.DataFrame, Optional[dict]]]
+        :param series: Type of series
+        :type series: str
+        """
+        created_at = datetime.now()
+        formatted_outputs = []
+        for anomaly_output, subgroup in anomaly_outputs:
+            if self.debug:
+                print("SAVING", series, subgroup, len(anomaly_output))
 
-        anomaly_output.to_sql(
-            AnomalyDataOutput.__tablename__,
-            db.engine,
-            if_exists="append",
-            chunksize=AnomalyDataOutput.__chunksize__
-        )
+            anomaly_output = anomaly_output.rename(
+                columns={"dt": "data_datetime", "anomaly": "is_anomaly"}
+            )
+            anomaly_output["kpi_id"] = self.kpi_info["id"]
+            anomaly_output["anomaly_type"] = series
+
+            if subgroup is not None:
+                subgroup = json.dumps(subgroup)
+            anomaly_output["series_type"] = subgroup
+
+            anomaly_output["created_at"] = created_at
+            formatted_outputs.append(anomaly_output)
+
+        self._pending_anomaly_outputs.extend(formatted_outputs)
+
+        # keep the prefetched last dates in line with the saved output
+        if self._last_dates_in_db is not None:
+            for anomaly_output, subgroup in anomaly_outputs:
+                if len(anomaly_output) == 0:
+                    continue
+                key = (series, get_series_type_key(subgroup))
+                last_date = anomaly_output["dt"].max().to_pydatetime()
+                if key in self._last_dates_in_db:
+                    last_date = max(last_date, self._last_dates_in_db[key])
+                self._last_dates_in_db[key] = last_date
+
+    def _flush_anomaly_outputs(self) -> None:
+        """Write all buffered anomaly outputs to the DB in one transaction."""
+        pending_outputs = self._pending_anomaly_outputs
+        self._pending_anomaly_outputs = []
+        if not pending_outputs:
+            return
+
+        # each output keeps its own index, which is stored in the index column
+        write_dataframe(pd.concat(pending_outputs), AnomalyDataOutput.__tablename__)
 
     def _querify(self, col_names, raw_combinations):
         query_list = []
@@ -277,7 +435,7 @@ class AnomalyDetectionController(object):
                 logger.warn(
                     f"skipping {dim}, cardinality over {MAX_SUBDIM_CARDINALITY}"
                 )
-            elif input_data[dim].dtype != "object":
+            elif not is_string_column(input_data[dim]):
                 logger.warn(f"skipping {dim}, non-string value found")
             else:
                 valid_subdims.append(dim)
@@ -285,7 +443,7 @@ class AnomalyDetectionController(object):
         group_list = []
         dim_comb = self._get_dimension_combinations(valid_subdims)
         for dim_list in dim_comb:
-            grouped_dims = input_data.groupby(dim_list)
+            grouped_dims = input_data.groupby(dim_list, observed=True)
             subgroups_raw = list(
                 (subgroup,) if isinstance(subgroup, str) else subgroup
                 for subgroup in grouped_dims.groups.keys()
@@ -304,189 +462,371 @@ class AnomalyDetectionController(object):
         :return: List of subgroups
         :rtype: list
         """
+        metric_col = self.kpi_info["metric"]
         if self._preaggregated:
-            grouped_input_data = input_data.groupby(
-                self.kpi_info["dimensions"]
-            ).agg({self._preaggregated_count_col: "sum"}).rename(
-                columns={self._preaggregated_count_col: self.kpi_info["metric"]}
-            )
+            data_len = input_data[self._preaggregated_count_col].fillna(0)
         else:
-            grouped_input_data = input_data.groupby(
-                self.kpi_info["dimensions"]
-            ).agg({self.kpi_info["metric"]: "count"})
+            data_len = input_data[metric_col].notna()
+        # rows with a missing value in any dimension are not in any subgroup
+        has_dimensions = input_data[self.kpi_info["dimensions"]].notna().all(axis=1)
+        data_len = data_len.where(has_dimensions, 0).to_numpy(dtype=float)
 
+        subgroup_index = self._get_subgroup_index(input_data)
         filtered_subgroups = []
 
         for subgroup in subgroups:
-            with contextlib.suppress(IndexError):
-                filter_data_len = get_subgroup_from_df(
-                    grouped_input_data.reset_index(), subgroup
-                )[
-                    self.kpi_info["metric"]
-                ].sum()
-                if filter_data_len >= MIN_DATA_IN_SUBGROUP:
-                    filtered_subgroups.append((subgroup, filter_data_len))
+            filter_data_len = data_len[subgroup_index.get_rows(subgroup)].sum()
+            if filter_data_len >= MIN_DATA_IN_SUBGROUP:
+                filtered_subgroups.append((subgroup, filter_data_len))
         filtered_subgroups.sort(key=lambda x: x[1], reverse=True)
 
         return [x[0] for x in filtered_subgroups[:MAX_FILTER_SUBGROUPS_ANOMALY]]
 
-    def _run_anomaly_for_series(
-        self, input_data: pd.DataFrame, series: str, subgroup: Dict[str, str] = None
-    ) -> None:
-        """Run anomaly detection for the given series.
+    def _get_subgroup_index(self, input_data: pd.DataFrame) -> SubgroupIndex:
+        """Return the index of subgroups in the input data, building it once."""
+        if self._subgroup_index is None or self._subgroup_index.df is not input_data:
+            self._subgroup_index = SubgroupIndex(input_data)
+        return self._subgroup_index
+
+    def _get_relevant_cols(self) -> List[str]:
+        """Return the columns of the KPI data used by the series."""
+        dt_col = self.kpi_info["datetime_column"]
+        metric_col = self.kpi_info["metric"]
+        relevant_cols = [
+            dt_col,
+            metric_col,
+            self._preaggregated_count_col
+        ] if self._preaggregated else [dt_col, metric_col]
+        if self._pushdown:
+            relevant_cols.append(PUSHDOWN_MAX_COLUMN)
+        return relevant_cols
+
+    def _get_series_data(
+        self,
+        input_data: pd.DataFrame,
+        series: str,
+        subgroup: Optional[Dict[str, str]],
+        last_date: Optional[datetime],
+    ) -> pd.DataFrame:
+        """Return the resampled series to run anomaly detection on.
 
+        :param input_data: Dataframe with all of the relevant KPI data
+        :type input_data: pd.DataFrame
         :param series: Type of series
         :type series: str
         :param subgroup: Subgroup of the KPI
-        :type subgroup: Dict[str, str]
+        :type subgroup: Optional[Dict[str, str]]
+        :param last_date: Last date for which we have output data
+        :type last_date: Optional[datetime]
+        :return: Dataframe with the metric's data, indexed by datetime
+        :rtype: pd.DataFrame
         """
-        is_overall = series == "overall"
-
-        try:
-            dt_col = self.kpi_info["datetime_column"]
-            metric_col = self.kpi_info["metric"]
-            freq = self.kpi_info["anomaly_params"]["frequency"]
-            agg = self.kpi_info["aggregation"]
-            period = self.kpi_info["anomaly_params"]["anomaly_period"]
+        dt_col = self.kpi_info["datetime_column"]
+        metric_col = self.kpi_info["metric"]
+        freq = self.kpi_info["anomaly_params"]["frequency"]
+        agg = self.kpi_info["aggregation"]
+        period = self.kpi_info["anomaly_params"]["anomaly_period"]
 
-            series_data = None
+        series_data = None
 
-            logger.info(f"Getting last date in db for {series}-{subgroup}.")
-            last_date = self._get_last_date_in_db(series, subgroup)
-            logger.info(f"Last date in db for {series}-{subgroup} is {last_date}")
+        logger.info(f"Formatting input data for {series}-{subgroup}")
 
-            logger.info(f"Formatting input data for {series}-{subgroup}")
+        relevant_cols = self._get_relevant_cols()
 
-            relevant_cols = [
+        if series == "dq":
+            subgroup_str = subgroup["dq"]
+            temp_input_data = input_data[relevant_cols]
+            temp_input_data = fill_data(
+                temp_input_data,
                 dt_col,
                 metric_col,
-                self._preaggregated_count_col
-            ] if self._preaggregated else [dt_col, metric_col]
+                last_date,
+                period,
+                self.end_date,
+                freq,
+                self._preaggregated_count_col if self._preaggregated else None,
+            )
 
-            if series == "dq":
-                subgroup_str = subgroup["dq"]
-                temp_input_data = input_data[relevant_cols]
-                temp_input_data = fill_data(
+            if subgroup_str == "missing":
+                series_data = get_dq_missing_data(
                     temp_input_data,
                     dt_col,
                     metric_col,
-                    last_date,
-                    period,
-                    self.end_date,
-                    freq,
-                    self._preaggregated_count_col if self._preaggregated else None,
+                    RESAMPLE_FREQUENCY[freq],
+                    self._preaggregated_count_col if self._preaggregated else None
                 )
 
-                if subgroup_str == "missing":
-                    series_data = get_dq_missing_data(
-                        temp_input_data,
-                        dt_col,
-                        metric_col,
-                        RESAMPLE_FREQUENCY[freq],
-                        self._preaggregated_count_col if self._preaggregated else None
-                    )
+            else:
+                series_data = self._resample_dq_aggregations(
+                    temp_input_data, [subgroup_str]
+                )[0]
+
+        elif series == "overall":
+            temp_input_data = input_data[relevant_cols]
+            temp_input_data = fill_data(
+                temp_input_data,
+                dt_col,
+                metric_col,
+                last_date,
+                period,
+                self.end_date,
+                freq,
+                self._preaggregated_count_col if self._preaggregated else None,
+            )
 
-                else:
+            if self._preaggregated:
+                if agg == "count":
                     series_data = (
                         temp_input_data.set_index(dt_col)
                         .resample(RESAMPLE_FREQUENCY[freq])
                         .agg({self._preaggregated_count_col: "sum"})
-                        .rename(columns={self._preaggregated_count_col: metric_col})
-                    ) if self._preaggregated and subgroup_str == "count" else (
+                        .rename(columns={
+                            self._preaggregated_count_col: metric_col
+                        })
+                    )
+                elif agg == "sum":
+                    series_data = (
                         temp_input_data.set_index(dt_col)
                         .resample(RESAMPLE_FREQUENCY[freq])
-                        .agg({metric_col: subgroup_str})
+                        .agg({metric_col: "sum"})
                     )
-
-            elif series == "overall":
-                temp_input_data = input_data[relevant_cols]
-                temp_input_data = fill_data(
-                    temp_input_data,
-                    dt_col,
-                    metric_col,
-                    last_date,
-                    period,
-                    self.end_date,
-                    freq,
-                    self._preaggregated_count_col if self._preaggregated else None,
+                else:
+                    raise ValueError(
+                        f"Unsupported aggregation {agg} for preaggregated data."
+                    )
+            else:
+                series_data = (
+                    temp_input_data.set_index(dt_col)
+                    .resample(RESAMPLE_FREQUENCY[freq])
+                    .agg({metric_col: agg})
                 )
 
-                if self._preaggregated:
-                    if agg == "count":
-                        series_data = (
-                            temp_input_data.set_index(dt_col)
-                            .resample(RESAMPLE_FREQUENCY[freq])
-                            .agg({self._preaggregated_count_col: "sum"})
-                            .rename(columns={
-                                self._preaggregated_count_col: metric_col
-                            })
-                        )
-                    elif agg == "sum":
-                        series_data = (
-                            temp_input_data.set_index(dt_col)
-                            .resample(RESAMPLE_FREQUENCY[freq])
-                            .agg({metric_col: "sum"})
-                        )
-                    else:
-                        raise ValueError(
-                            f"Unsupported aggregation {agg} for preaggregated data."
-                        )
-                else:
+        elif series == "subdim":
+            temp_input_data = self._get_subgroup_index(
+                input_data
+            ).get_subgroup_df(subgroup)[relevant_cols]
+            temp_input_data = fill_data(
+                temp_input_data,
+                dt_col,
+                metric_col,
+                last_date,
+                period,
+                self.end_date,
+                freq,
+                self._preaggregated_count_col if self._preaggregated else None,
+            )
+
+            if self._preaggregated:
+                if agg == "count":
                     series_data = (
                         temp_input_data.set_index(dt_col)
                         .resample(RESAMPLE_FREQUENCY[freq])
-                        .agg({metric_col: agg})
+                        .agg({self._preaggregated_count_col: "sum"})
+                        .rename(columns={
+                            self._preaggregated_count_col: metric_col
+                        })
                     )
-
-            elif series == "subdim":
-                temp_input_data = get_subgroup_from_df(
-                    input_data, subgroup
-                )[relevant_cols]
-                temp_input_data = fill_data(
-                    temp_input_data,
-                    dt_col,
-                    metric_col,
-                    last_date,
-                    period,
-                    self.end_date,
-                    freq,
-                    self._preaggregated_count_col if self._preaggregated else None,
-                )
-
-                if self._preaggregated:
-                    if agg == "count":
-                        series_data = (
-                            temp_input_data.set_index(dt_col)
-                            .resample(RESAMPLE_FREQUENCY[freq])
-                            .agg({self._preaggregated_count_col: "sum"})
-                            .rename(columns={
-                                self._preaggregated_count_col: metric_col
-                            })
-                        )
-                    elif agg == "sum":
-                        series_data = (
-                            temp_input_data.set_index(dt_col)
-                            .resample(RESAMPLE_FREQUENCY[freq])
-                            .agg({metric_col: "sum"})
-                        )
-                    else:
-                        raise ValueError(
-                            f"Unsupported aggregation {agg} for preaggregated data."
-                        )
-                else:
+                elif agg == "sum":
                     series_data = (
                         temp_input_data.set_index(dt_col)
                         .resample(RESAMPLE_FREQUENCY[freq])
-                        .agg({metric_col: agg})
+                        .agg({metric_col: "sum"})
+                    )
+                else:
+                    raise ValueError(
+                        f"Unsupported aggregation {agg} for preaggregated data."
                     )
-
             else:
-                raise ValueError(f"series {series} not in ['dq', 'subdim', 'overall']")
+                series_data = (
+                    temp_input_data.set_index(dt_col)
+                    .resample(RESAMPLE_FREQUENCY[freq])
+                    .agg({metric_col: agg})
+                )
 
-            model_name = self.kpi_info["anomaly_params"]["model_name"]
+        else:
+            raise ValueError(f"series {series} not in ['dq', 'subdim', 'overall']")
+
+        # TODO: fix missing dates/values issue more robustly
+        series_data[metric_col] = series_data[metric_col].fillna(0)
+
+        return series_data
+
+    def _get_dq_aggregations(self, dq_str: str) -> List[Tuple[str, str]]:
+        """Return the (column, aggregation) pairs of a data quality metric.
+
+        The series of the metric is the resampled first aggregate, divided by
+        the second one if there are two.
+
+        :param dq_str: data quality metric, other than missing
+        :type dq_str: str
+        :return: (column, aggregation) pairs to resample the data with
+        :rtype: List[Tuple[str, str]]
+        """
+        if self._pushdown and dq_str == "max":
+            return [(PUSHDOWN_MAX_COLUMN, "max")]
+        if self._pushdown and dq_str == "mean":
+            return [
+                (self.kpi_info["metric"], "sum"),
+                (self._preaggregated_count_col, "sum"),
+            ]
+        if self._preaggregated and dq_str == "count":
+            return [(self._preaggregated_count_col, "sum")]
+        return [(self.kpi_info["metric"], dq_str)]
+
+    def _resample_dq_aggregations(
+        self, data: pd.DataFrame, dq_strs: List[str]
+    ) -> List[pd.DataFrame]:
+        """Return the resampled series of data quality metrics of filled data.
+
+        All of the aggregations are computed in a single resample.
+
+        :param data: KPI data, filled with fill_data
+        :type data: pd.DataFrame
+        :param dq_strs: data quality metrics, other than missing
+        :type dq_strs: List[str]
+        :return: Dataframe with the metric's data, indexed by datetime, for
+        each data quality metric
+        :rtype: List[pd.DataFrame]
+        """
+        dt_col = self.kpi_info["datetime_column"]
+        metric_col = self.kpi_info["metric"]
+        freq = self.kpi_info["anomaly_params"]["frequency"]
+
+        dq_aggregations = [self._get_dq_aggregations(dq_str) for dq_str in dq_strs]
+        agg_spec: Dict[str, List[str]] = defaultdict(list)
+        for aggregations in dq_aggregations:
+            for col, col_agg in aggregations:
+                if col_agg not in agg_spec[col]:
+                    agg_spec[col].append(col_agg)
+
+        resampled = (
+            data.set_index(dt_col)
+            .resample(RESAMPLE_FREQUENCY[freq])
+            .agg(dict(agg_spec))
+        )
+
+        series_data = []
+        for aggregations in dq_aggregations:
+            values = resampled[aggregations[0]]
+            if len(aggregations) > 1:
+                values = values / resampled[aggregations[1]]
+            series_data.append(pd.DataFrame({metric_col: values}))
+        return series_data
+
+    def _get_dq_series_data(
+        self,
+        input_data: pd.DataFrame,
+        dq_list: List[Dict[str, str]],
+        last_dates: List[Optional[datetime]],
+    ) -> List[Optional[pd.DataFrame]]:
+        """Return the resampled series of all data quality metrics at once.
 
-            # TODO: fix missing dates/values issue more robustly
-            series_data[metric_col] = series_data[metric_col].fillna(0)
+        Gives the same series as _get_series_data does for each data quality
+        metric, with the data filled and resampled once for all metrics with
+        the same last date.
+
+        :param input_data: Dataframe with all of the relevant KPI data
+        :type input_data: pd.DataFrame
+        :param dq_list: List of data quality subgroups, e.g. {"dq": "max"}
+        :type dq_list: List[Dict[str, str]]
+        :param last_dates: Last date for which we have output data, for each
+        data quality metric
+        :type last_dates: List[Optional[datetime]]
+        :return: Dataframe with the metric's data, indexed by datetime, for
+        each data quality metric. Metrics which aren't supported here (e.g.
+        missing) have None.
+        :rtype: List[Optional[pd.DataFrame]]
+        """
+        metric_col = self.kpi_info["metric"]
+
+        # the fill rows depend on the last date
+        positions_by_last_date = defaultdict(list)
+        for i, (dq, last_date) in enumerate(zip(dq_list, last_dates)):
+            if dq["dq"] != "missing":
+                positions_by_last_date[last_date].append(i)
+
+        series_data: List[Optional[pd.DataFrame]] = [None] * len(dq_list)
+        for last_date, positions in positions_by_last_date.items():
+            data = fill_data(
+                input_data[self._get_relevant_cols()],
+                self.kpi_info["datetime_column"],
+                metric_col,
+                last_date,
+                self.kpi_info["anomaly_params"]["anomaly_period"],
+                self.end_date,
+                self.kpi_info["anomaly_params"]["frequency"],
+                self._preaggregated_count_col if self._preaggregated else None,
+            )
+            resampled = self._resample_dq_aggregations(
+                data, [dq_list[i]["dq"] for i in positions]
+            )
+            for i, dq_data in zip(positions, resampled):
+                # TODO: fix missing dates/values issue more robustly
+                dq_data[metric_col] = dq_data[metric_col].fillna(0)
+                series_data[i] = dq_data
+
+        return series_data
+
+    def _predict_series(
+        self,
+        input_data: pd.DataFrame,
+        series: str,
+        subgroup: Optional[Dict[str, str]],
+        last_date: Optional[datetime],
+    ) -> pd.DataFrame:
+        """Return the anomaly output of the given series, without saving it.
+
+        :param input_data: Dataframe with all of the relevant KPI data
+        :type input_data: pd.DataFrame
+        :param series: Type of series
+        :type series: str
+        :param subgroup: Subgroup of the KPI
+        :type subgroup: Optional[Dict[str, str]]
+        :param last_date: Last date for which we have output data
+        :type last_date: Optional[datetime]
+        :return: Dataframe with anomaly data
+        :rtype: pd.DataFrame
+        """
+        series_data = self._get_series_data(input_data, series, subgroup, last_date)
+        return self._detect_anomaly(
+            self.kpi_info["anomaly_params"]["model_name"],
+            series_data,
+            last_date,
+            series,
+            subgroup,
+            self.kpi_info["anomaly_params"]["frequency"],
+        )
+
+    def _run_anomaly_for_series(
+        self,
+        input_data: pd.DataFrame,
+        series: str,
+        subgroup: Dict[str, str] = None,
+        series_data: Optional[pd.DataFrame] = None,
+    ) -> None:
+        """Run anomaly detection for the given series.
+
+        :param series: Type of series
+        :type series: str
+        :param subgroup: Subgroup of the KPI
+        :type subgroup: Dict[str, str]
+        :param series_data: Resampled series, if already computed, defaults to
+        None
+        :type series_data: Optional[pd.DataFrame], optional
+        """
+        is_overall = series == "overall"
+
+        try:
+            logger.info(f"Getting last date in db for {series}-{subgroup}.")
+            last_date = self._get_last_date_in_db(series, subgroup)
+            logger.info(f"Last date in db for {series}-{subgroup} is {last_date}")
+
+            if series_data is None:
+                series_data = self._get_series_data(
+                    input_data, series, subgroup, last_date
+                )
+            freq = self.kpi_info["anomaly_params"]["frequency"]
+            model_name = self.kpi_info["anomaly_params"]["model_name"]
 
             # Fix end_date for hourly anomaly alerts
             if self.kpi_info["scheduler_params"]["scheduler_frequency"] == "H":
@@ -515,12 +855,303 @@ class AnomalyDetectionController(object):
         try:
             logger.info(f"Saving Anomaly output for {series}-{subgroup}")
             self._save_anomaly_output(overall_anomaly_output, series, subgroup)
+            if is_overall:
+                self._flush_anomaly_outputs()
         except Exception as e:  # noqa B902
             self._checkpoint_failure("Overall KPI - Result Ingestor", e, is_overall)
             raise e
         else:
             self._checkpoint_success("Overall KPI - Result Ingestor", is_overall)
 
+    def _get_subgroup_series_data(
+        self,
+        input_data: pd.DataFrame,
+        subgroups: List[Dict[str, str]],
+        last_dates: List[Optional[datetime]],
+    ) -> pd.DataFrame:
+        """Return the resampled series of all subgroups, one per column.
+
+        Gives the same series as filtering, filling and resampling the data of
+        each subgroup as in _run_anomaly_for_series, with one groupby per set
+        of dimensions instead. Columns are NaN outside of their series.
+
+        :param input_data: Dataframe with all of the relevant KPI data
+        :type input_data: pd.DataFrame
+        :param subgroups: List of subgroups
+        :type subgroups: List[Dict[str, str]]
+        :param last_dates: Last date for which we have output data, for each
+        subgroup
+        :type last_dates: List[Optional[datetime]]
+        :return: Dataframe indexed by the resampled datetime
+        :rtype: pd.DataFrame
+        """
+        dt_col = self.kpi_info["datetime_column"]
+        metric_col = self.kpi_info["metric"]
+        freq = self.kpi_info["anomaly_params"]["frequency"]
+        agg = self.kpi_info["aggregation"]
+        period = self.kpi_info["anomaly_params"]["anomaly_period"]
+        resample_freq = RESAMPLE_FREQUENCY[freq]
+
+        if self._preaggregated:
+            if agg == "count":
+                value_col, value_agg = self._preaggregated_count_col, "sum"
+            elif agg == "sum":
+                value_col, value_agg = metric_col, "sum"
+            else:
+                raise ValueError(
+                    f"Unsupported aggregation {agg} for preaggregated data."
+                )
+        else:
+            value_col, value_agg = metric_col, agg
+
+        fill_dates = [
+            get_fill_dates(last_date, period, self.end_date, freq)
+            for last_date in last_dates
+        ]
+
+        subgroups_by_dims = defaultdict(list)
+        for i, subgroup in enumerate(subgroups):
+            subgroups_by_dims[tuple(subgroup)].append(i)
+
+        aggregated: List[Optional[pd.DataFrame]] = [None] * len(subgroups)
+        for dims, positions in subgroups_by_dims.items():
+            data = input_data[list(dims) + [dt_col, value_col]].copy()
+            data[dt_col] = pd.to_datetime(data[dt_col])
+            grouped = (
+                data.groupby(
+                    list(dims) + [pd.Grouper(key=dt_col, freq=resample_freq)],
+                    observed=True,
+                )[value_col]
+                .agg([value_agg, "size"])
+                .unstack(list(range(len(dims))))
+            )
+            for i in positions:
+                key = tuple(subgroups[i][dim] for dim in dims)
+                if len(dims) == 1:
+                    key = key[0]
+                aggregated[i] = pd.DataFrame(
+                    {
+                        "value": grouped[value_agg][key],
+                        "size": grouped["size"][key].fillna(0),
+                    }
+                )
+
+        all_dates = [
+            date
+            for subgroup_data in aggregated
+            for date in subgroup_data.index[subgroup_data["size"] > 0]
+        ] + [
+            pd.Timestamp(date).floor(resample_freq)
+            for fill_date_list in fill_dates
+            for date in fill_date_list
+            if date is not None
+        ]
+        index = pd.date_range(min(all_dates), max(all_dates), freq=resample_freq)
+
+        series_data = {}
+        for i, subgroup_data in enumerate(aggregated):
+            subgroup_data = subgroup_data.reindex(index)
+            series_data[i] = fill_resampled_series(
+                subgroup_data["value"],
+                subgroup_data["size"].fillna(0) > 0,
+                fill_dates[i],
+                value_agg,
+                resample_freq,
+            )
+
+        return pd.DataFrame(series_data, index=index)
+
+    def _run_anomaly_for_subgroups(
+        self, input_data: pd.DataFrame, subgroups: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """Run anomaly detection for all subgroups in a single vectorized pass.
+
+        :param input_data: Dataframe with all of the relevant KPI data
+        :type input_data: pd.DataFrame
+        :param subgroups: List of subgroups
+        :type subgroups: List[Dict[str, str]]
+        :return: subgroups which still need to be run one at a time
+        :rtype: List[Dict[str, str]]
+        """
+        try:
+            last_dates = [
+                self._get_last_date_in_db("subdim", subgroup)
+                for subgroup in subgroups
+            ]
+            series_data = self._get_subgroup_series_data(
+                input_data, subgroups, last_dates
+            )
+
+            # Fix end_date for hourly anomaly alerts
+            if self.kpi_info["scheduler_params"]["scheduler_frequency"] == "H":
+                self.end_date = self.end_date.floor(freq="H")
+
+            anomaly_outputs = MultiSeriesAnomalyDetection(
+                self.kpi_info["anomaly_params"]["model_name"],
+                series_data,
+                last_dates,
+                self.kpi_info["anomaly_params"]["anomaly_period"],
+                self.kpi_info["anomaly_params"]["frequency"],
+                self.kpi_info["anomaly_params"].get("sensitivity", "medium"),
+                self.slack,
+                self._get_model_kwargs(
+                    self.kpi_info["anomaly_params"]["model_name"]
+                ),
+            ).predict()
+        except Exception:  # noqa: B902
+            logger.exception(
+                "Exception occurred running subgroups at once, "
+                + "running them one at a time"
+            )
+            return subgroups
+
+        try:
+            self._save_anomaly_outputs(
+                [
+                    (anomaly_output, subgroup)
+                    for anomaly_output, subgroup in zip(anomaly_outputs, subgroups)
+                    if anomaly_output is not None
+                ],
+                "subdim",
+            )
+        except Exception:  # noqa: B902
+            logger.exception("Exception occurred saving output for subgroups")
+
+        return [
+            subgroup
+            for anomaly_output, subgroup in zip(anomaly_outputs, subgroups)
+            if anomaly_output is None
+        ]
+
+    def _prescreen_subgroups(
+        self, input_data: pd.DataFrame, subgroups: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """Screen the new points of all subgroups at once, saving quiet ones.
+
+        :param input_data: Dataframe with all of the relevant KPI data
+        :type input_data: pd.DataFrame
+        :param subgroups: List of subgroups
+        :type subgroups: List[Dict[str, str]]
+        :return: subgroups which need to be run through the model
+        :rtype: List[Dict[str, str]]
+        """
+        try:
+            last_dates = [
+                self._get_last_date_in_db("subdim", subgroup)
+                for subgroup in subgroups
+            ]
+            series_data = self._get_subgroup_series_data(
+                input_data, subgroups, last_dates
+            )
+            anomaly_outputs = prescreen_series(
+                series_data,
+                last_dates,
+                self.kpi_info["anomaly_params"]["anomaly_period"],
+                self.kpi_info["anomaly_params"]["frequency"],
+                self.kpi_info["anomaly_params"].get("sensitivity", "medium"),
+            )
+        except Exception:  # noqa: B902
+            logger.exception(
+                "Exception occurred screening subgroups, running all of them"
+            )
+            return subgroups
+
+        screened = [
+            (anomaly_output, subgroup)
+            for anomaly_output, subgroup in zip(anomaly_outputs, subgroups)
+            if anomaly_output is not None
+        ]
+        logger.info(f"Screened {len(screened)} of {len(subgroups)} subgroups.")
+        try:
+            self._save_anomaly_outputs(screened, "subdim")
+        except Exception:  # noqa: B902
+            logger.exception("Exception occurred saving output for subgroups")
+
+        return [
+            subgroup
+            for anomaly_output, subgroup in zip(anomaly_outputs, subgroups)
+            if anomaly_output is None
+        ]
+
+    def _run_anomaly_for_subgroups_in_pool(
+        self, input_data: pd.DataFrame, subgroups: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """Run anomaly detection for subgroups in parallel worker processes.
+
+        Workers only compute the anomaly output of each subgroup. Last dates
+        are read and the outputs are saved in bulk from this process.
+
+        :param input_data: Dataframe with all of the relevant KPI data
+        :type input_data: pd.DataFrame
+        :param subgroups: List of subgroups
+        :type subgroups: List[Dict[str, str]]
+        :return: subgroups which still need to be run one at a time
+        :rtype: List[Dict[str, str]]
+        """
+        if multiprocessing.current_process().daemon:
+            # e.g. a worker of the celery prefork pool
+            logger.warning(
+                "ANOMALY_SUBGROUP_WORKERS is set, but daemonic processes cannot "
+                "start worker processes. Run the anomaly celery worker with a "
+                "non-prefork pool (e.g. --pool=threads). Running subgroups one "
+                "at a time"
+            )
+            return subgroups
+
+        try:
+            mp_context = multiprocessing.get_context("fork")
+        except ValueError:
+            logger.warning("Fork is unavailable, running subgroups one at a time")
+            return subgroups
+
+        last_dates = [
+            self._get_last_date_in_db("subdim", subgroup) for subgroup in subgroups
+        ]
+
+        # Fix end_date for hourly anomaly alerts
+        if self.kpi_info["scheduler_params"]["scheduler_frequency"] == "H":
+            self.end_date = self.end_date.floor(freq="H")
+
+        anomaly_outputs = []
+        finished_subgroups = []
+        remaining_subgroups = []
+        _SUBGROUP_WORKER_STATE.update(controller=self, input_data=input_data)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(ANOMALY_SUBGROUP_WORKERS, len(subgroups)),
+                mp_context=mp_context,
+                initializer=_init_subgroup_worker,
+                initargs=(ANOMALY_SUBGROUP_WORKER_MEMORY_LIMIT,),
+            ) as executor:
+                futures = [
+                    executor.submit(_predict_subgroup, subgroup, last_date)
+                    for subgroup, last_date in zip(subgroups, last_dates)
+                ]
+                for future, subgroup in zip(futures, subgroups):
+                    try:
+                        anomaly_outputs.append((future.result(), subgroup))
+                    except BrokenProcessPool:
+                        # a worker was killed (e.g. out of memory), the
+                        # subgroups it did not get to are run inline
+                        remaining_subgroups.append(subgroup)
+                    except Exception:  # noqa: B902
+                        logger.exception(
+                            f"Exception occurred for: subdim - {subgroup}"
+                        )
+                    finished_subgroups.append(subgroup)
+        except Exception:  # noqa: B902
+            logger.exception("Exception occurred running subgroups in processes")
+            remaining_subgroups += subgroups[len(finished_subgroups):]
+        finally:
+            _SUBGROUP_WORKER_STATE.clear()
+
+        try:
+            self._save_anomaly_outputs(anomaly_outputs, "subdim")
+        except Exception:  # noqa: B902
+            logger.exception("Exception occurred saving output for subgroups")
+
+        return remaining_subgroups
+
     def _detect_subdimensions(self, input_data: pd.DataFrame) -> None:
         """Perform anomaly detection for subdimensions.
 
@@ -555,11 +1186,31 @@ class AnomalyDetectionController(object):
 
         try:
             logger.info("Running anomaly for filtered subgroups.")
+            model_name = self.kpi_info["anomaly_params"]["model_name"]
+            if (
+                ANOMALY_MULTI_SERIES_ENABLED
+                and MultiSeriesAnomalyDetection.is_supported(model_name)
+            ):
+                filtered_subgroups = self._run_anomaly_for_subgroups(
+                    input_data, filtered_subgroups
+                )
+            if self.kpi_info["anomaly_params"].get("prescreen", False):
+                filtered_subgroups = self._prescreen_subgroups(
+                    input_data, filtered_subgroups
+                )
+            if ANOMALY_SUBGROUP_WORKERS > 1 and len(filtered_subgroups) > 1:
+                filtered_subgroups = self._run_anomaly_for_subgroups_in_pool(
+                    input_data, filtered_subgroups
+                )
             for subgroup in filtered_subgroups:
                 try:
                     self._run_anomaly_for_series(input_data, "subdim", subgroup)
                 except Exception:  # noqa: B902
                     logger.exception(f"Exception occurred for: subdim - {subgroup}")
+            try:
+                self._flush_anomaly_outputs()
+            except Exception:  # noqa: B902
+                logger.exception("Exception occurred saving output for subdims")
         except Exception as e:  # noqa B902
             self._checkpoint_failure("Subdimensions - Anomaly Detector", e)
             raise e
@@ -575,7 +1226,9 @@ class AnomalyDetectionController(object):
         try:
             agg = self.kpi_info["aggregation"]
 
-            if self._preaggregated:
+            if self._pushdown:
+                dq_list = ["max", "count", "mean"]
+            elif self._preaggregated:
                 dq_list = ["count"]
             else:
                 dq_list = [
@@ -595,11 +1248,27 @@ class AnomalyDetectionController(object):
 
         try:
             logger.info("Running anomaly for data quality subgroups.")
-            for dq in dq_list:
+            try:
+                dq_series_data = self._get_dq_series_data(
+                    input_data,
+                    dq_list,
+                    [self._get_last_date_in_db("dq", dq) for dq in dq_list],
+                )
+            except Exception:  # noqa: B902
+                logger.exception(
+                    "Exception occurred resampling data quality metrics at once, "
+                    "resampling each one."
+                )
+                dq_series_data = [None] * len(dq_list)
+            for dq, series_data in zip(dq_list, dq_series_data):
                 try:
-                    self._run_anomaly_for_series(input_data, "dq", dq)
+                    self._run_anomaly_for_series(input_data, "dq", dq, series_data)
                 except Exception:  # noqa: B902
                     logger.exception(f"Exception occurred for: data quality - {dq}")
+            try:
+                self._flush_anomaly_outputs()
+            except Exception:  # noqa: B902
+                logger.exception("Exception occurred saving output for data quality")
         except Exception as e:  # noqa B902
             self._checkpoint_failure("Data Quality - Anomaly Detector", e)
             raise e
@@ -663,6 +1332,8 @@ class AnomalyDetectionController(object):
         model_name = self.kpi_info["anomaly_params"]["model_name"]
         logger.debug(f"Anomaly Model is {model_name}")
 
+        self._last_dates_in_db = None
+
         logger.info(f"Loading Input Data for KPI {kpi_id}")
         try:
             input_data = self._load_anomaly_data()
@@ -1,23 +1,79 @@
-"""Provides models for anomaly detection."""
+"""Provides models for anomaly detection.
+
+Model modules import heavy libraries (prophet, statsmodels), so they are only
+imported when a model is first looked up in MODEL_MAPPER, or first imported
+from this package by name.
+"""
+
+import importlib
+from collections.abc import Mapping
+from typing import Dict, Iterator, Tuple, Type
 
 from chaos_genius.core.anomaly.models.anomaly_model import AnomalyModel  # noqa
-from chaos_genius.core.anomaly.models.ets_model import ExpTSModel
-from chaos_genius.core.anomaly.models.ewstd_model import EWSTDModel
-from chaos_genius.core.anomaly.models.ewma_model import EWMAModel
-# from chaos_genius.core.anomaly.models.greykite_model import GreyKiteModel
-# from chaos_genius.core.anomaly.models.neuralprophet_model import \
-#     NeuralProphetModel
-from chaos_genius.core.anomaly.models.prophet_model import ProphetModel
-from chaos_genius.core.anomaly.models.standard_deviation_model import (
-    StandardDeviationModel,
-)
-
-MODEL_MAPPER = {
-    "StandardDeviationModel": StandardDeviationModel,
-    "ProphetModel": ProphetModel,
-    "EWSTDModel": EWSTDModel,
-    "EWMAModel": EWMAModel,
-    # "NeuralProphetModel": NeuralProphetModel,
-    # "GreyKiteModel": GreyKiteModel,
-    "ETSModel": ExpTSModel,
+
+# model name -> (module, class name) of the model
+MODEL_PATHS: Dict[str, Tuple[str, str]] = {
+    "StandardDeviationModel": (
+        "chaos_genius.core.anomaly.models.standard_deviation_model",
+        "StandardDeviationModel",
+    ),
+    "ProphetModel": ("chaos_genius.core.anomaly.models.prophet_model", "ProphetModel"),
+    "EWSTDModel": ("chaos_genius.core.anomaly.models.ewstd_model", "EWSTDModel"),
+    "EWMAModel": ("chaos_genius.core.anomaly.models.ewma_model", "EWMAModel"),
+    # "NeuralProphetModel": (
+    #     "chaos_genius.core.anomaly.models.neuralprophet_model",
+    #     "NeuralProphetModel",
+    # ),
+    # "GreyKiteModel": (
+    #     "chaos_genius.core.anomaly.models.greykite_model",
+    #     "GreyKiteModel",
+    # ),
+    "ETSModel": ("chaos_genius.core.anomaly.models.ets_model", "ExpTSModel"),
+    "RollingMedianModel": (
+        "chaos_genius.core.anomaly.models.rolling_median_model",
+        "RollingMedianModel",
+    ),
 }
+
+
+class LazyModelMapper(Mapping):
+    """Mapping of model names to model classes, importing each on first use."""
+
+    def __init__(self, model_paths: Dict[str, Tuple[str, str]]):
+        """Initialize the mapper.
+
+        :param model_paths: module and class name of each model
+        :type model_paths: Dict[str, Tuple[str, str]]
+        """
+        self._model_paths = model_paths
+        self._models: Dict[str, Type[AnomalyModel]] = {}
+
+    def __getitem__(self, model_name: str) -> Type[AnomalyModel]:
+        if model_name not in self._models:
+            module_name, class_name = self._model_paths[model_name]
+            module = importlib.import_module(module_name)
+            self._models[model_name] = getattr(module, class_name)
+        return self._models[model_name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._model_paths)
+
+    def __len__(self) -> int:
+        return len(self._model_paths)
+
+    def __contains__(self, model_name) -> bool:
+        return model_name in self._model_paths
+
+
+MODEL_MAPPER = LazyModelMapper(MODEL_PATHS)
+
+# class name -> model name, for imports of the classes from this package
+_MODEL_NAMES_BY_CLASS = {
+    class_name: model_name for model_name, (_, class_name) in MODEL_PATHS.items()
+}
+
+
+def __getattr__(name: str):
+    if name in _MODEL_NAMES_BY_CLASS:
+        return MODEL_MAPPER[_MODEL_NAMES_BY_CLASS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,111 @@
 """Provides base class for anomaly detection models."""
 
+import json
 import os
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from chaos_genius.core.anomaly.utils import get_preceding_windows, get_timedelta
 
 
 class AnomalyModel(object):
     """Base class for anomaly detection models."""
 
+    # whether the KPI's seasonality is passed in model_kwargs["seasonality"]
+    uses_kpi_seasonality = False
+
     def __init__(self, *args, **kwargs) -> None:
         """Initialize model for anomaly detection."""
         pass
 
+    @classmethod
+    def get_bounds_scale(cls, sensitivity: str) -> float:
+        """Return the distance of the bounds from the center at a sensitivity.
+
+        The distance is in units of the model's spread (e.g. the std dev of
+        its forecast), so the ratio of the scales of two sensitivities
+        rescales bounds from one to the other. Models whose bounds can't be
+        rescaled exactly, e.g. sampled or asymmetric forecast intervals, raise
+        NotImplementedError.
+
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :return: distance in units of the model's spread
+        :rtype: float
+        """
+        raise NotImplementedError
+
+    def predict_rolling(
+        self, df: pd.DataFrame, window: int, sensitivity: str, frequency: str
+    ) -> pd.DataFrame:
+        """Predict the bounds of each data point from the points before it.
+
+        Gives the same bounds as calling predict (with pred_df as None) on
+        every window of the data, but in a single pass. Models which don't
+        implement predict_window_bounds raise NotImplementedError.
+
+        :param df: Input Dataframe with dt, y columns
+        :type df: pd.DataFrame
+        :param window: number of data points to predict each data point from
+        :type window: int
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: Dataframe with yhat_lower, yhat_upper columns for every row
+        of df after the first window rows, with the index of df
+        :rtype: pd.DataFrame
+        """
+        windows = get_preceding_windows(df["y"].to_numpy(dtype=float), window)
+        yhat_lower, yhat_upper = self.predict_window_bounds(
+            windows, sensitivity, frequency
+        )
+        return pd.DataFrame(
+            {"yhat_lower": yhat_lower, "yhat_upper": yhat_upper},
+            index=df.index[window:],
+        )
+
+    def predict_window_bounds(
+        self, windows: np.ndarray, sensitivity: str, frequency: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict the bounds of the point following each window of points.
+
+        :param windows: array whose last axis holds windows of consecutive
+        points (oldest first), without missing values
+        :type windows: np.ndarray
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of windows without its
+        last axis
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        raise NotImplementedError
+
+    def predict_columns(
+        self, df: pd.DataFrame, sensitivity: str, frequency: str
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Predict the bounds of every point of each column of df.
+
+        Gives the same bounds as calling predict with pred_df on each column
+        as a series. Columns may have missing values before and after their
+        series, which are ignored.
+
+        :param df: Dataframe with one series per column, indexed by time
+        :type df: pd.DataFrame
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of df
+        :rtype: Tuple[pd.DataFrame, pd.DataFrame]
+        """
+        raise NotImplementedError
+
     def save(self, *args, **kwargs):
         """Save model."""
         raise NotImplementedError
@@ -29,3 +125,115 @@ class AnomalyModel(object):
             os.makedirs(dir_path)
         except FileExistsError:
             pass
+
+
+class WindowStateModel(AnomalyModel):
+    """Base class for models which predict from a fixed window of points.
+
+    The model state is the window of points ending at the last predicted date
+    of a series. With it saved, the next run can predict its new points
+    without the series' earlier history.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize the model without a window state."""
+        super().__init__(*args, **kwargs)
+        self.window_state: Optional[dict] = None
+
+    def update_window_state(
+        self, df: pd.DataFrame, last_date: datetime, window: int, frequency: str
+    ) -> None:
+        """Keep the window of points of df ending at last_date as the state.
+
+        The state is cleared if the window has gaps or missing values.
+
+        :param df: Input Dataframe with dt, y columns
+        :type df: pd.DataFrame
+        :param last_date: last date predicted for the series
+        :type last_date: datetime
+        :param window: number of data points each data point is predicted from
+        :type window: int
+        :param frequency: frequency of the data
+        :type frequency: str
+        """
+        window_df = df[df["dt"] <= last_date].iloc[-window:]
+        expected_dates = pd.date_range(
+            end=last_date, periods=window, freq=get_timedelta(frequency, 1)
+        )
+        if (
+            len(window_df) != window
+            or window_df["y"].isna().any()
+            or (pd.DatetimeIndex(window_df["dt"]) != expected_dates).any()
+        ):
+            self.window_state = None
+            return
+
+        self.window_state = {
+            "last_date": pd.Timestamp(last_date).isoformat(),
+            "frequency": frequency,
+            "values": window_df["y"].astype(float).to_list(),
+        }
+
+    def get_window_state_data(
+        self, last_date: datetime, window: int, frequency: str
+    ) -> Optional[pd.DataFrame]:
+        """Return the points of the window state, if it ends at last_date.
+
+        :param last_date: last date predicted for the series
+        :type last_date: datetime
+        :param window: number of data points each data point is predicted from
+        :type window: int
+        :param frequency: frequency of the data
+        :type frequency: str
+        :return: Dataframe with dt, y columns, None if there is no state for
+        this last date, window and frequency
+        :rtype: Optional[pd.DataFrame]
+        """
+        state = self.window_state
+        if (
+            state is None
+            or pd.Timestamp(state["last_date"]) != pd.Timestamp(last_date)
+            or state["frequency"] != frequency
+            or len(state["values"]) != window
+        ):
+            return None
+
+        return pd.DataFrame(
+            {
+                "dt": pd.date_range(
+                    end=pd.Timestamp(state["last_date"]),
+                    periods=window,
+                    freq=get_timedelta(frequency, 1),
+                ),
+                "y": state["values"],
+            }
+        )
+
+    def save(self, path: str) -> None:
+        """Save the window state to the given path as json.
+
+        :param path: Path to save the model state to
+        :type path: str
+        """
+        self.check_and_make_path(path)
+        with open(path, "w") as f:
+            json.dump(self.window_state, f)
+
+    @classmethod
+    def load(cls, path: str, *args, **kwargs) -> "WindowStateModel":
+        """Return a model with the window state saved at the given path.
+
+        The model has no state if nothing was saved at the path.
+
+        :param path: Path to load the model state from
+        :type path: str
+        :return: model with the saved window state
+        :rtype: WindowStateModel
+        """
+        model = cls(*args, **kwargs)
+        try:
+            with open(path) as f:
+                model.window_state = json.load(f)
+        except FileNotFoundError:
+            pass
+        return model
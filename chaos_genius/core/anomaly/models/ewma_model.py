@@ -1,9 +1,12 @@
 """Provides the EWMADModel for anomaly detection."""
 
+from typing import Tuple
+
+import numpy as np
 import pandas as pd
 
-from chaos_genius.core.anomaly.models import AnomalyModel
-from chaos_genius.core.anomaly.utils import get_timedelta
+from chaos_genius.core.anomaly.models.anomaly_model import WindowStateModel
+from chaos_genius.core.anomaly.utils import get_ewm_weights, get_timedelta
 
 EWMASENS = {
     "high": 0.1,
@@ -17,7 +20,7 @@ EWMAFREQ = {
 }
 
 
-class EWMAModel(AnomalyModel):
+class EWMAModel(WindowStateModel):
     """EWSTD model for anomaly detection."""
 
     def __init__(self, *args, model_kwargs={}, **kwargs):
@@ -29,6 +32,17 @@ class EWMAModel(AnomalyModel):
         super().__init__(*args, **kwargs)
         self.model_kwargs = model_kwargs
 
+    @classmethod
+    def get_bounds_scale(cls, sensitivity: str) -> float:
+        """Return the distance of the bounds from the center at a sensitivity.
+
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :return: distance in exponentially weighted means of the points
+        :rtype: float
+        """
+        return EWMASENS[sensitivity.lower()]
+
     def predict(
         self,
         df: pd.DataFrame,
@@ -78,3 +92,48 @@ class EWMAModel(AnomalyModel):
             'yhat_lower': 'yhat_lower',
             'yhat_upper': 'yhat_upper'
         })
+
+    def predict_window_bounds(
+        self, windows: np.ndarray, sensitivity: str, frequency: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict the bounds of the point following each window of points.
+
+        :param windows: array whose last axis holds windows of consecutive
+        points (oldest first), without missing values
+        :type windows: np.ndarray
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of windows without its
+        last axis
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        weights = get_ewm_weights(EWMAFREQ[frequency], windows.shape[-1])
+        # the forecast appended by predict is the ew mean, so it doesn't move it
+        ew_mean = (windows @ weights) / weights.sum()
+
+        num_dev = EWMASENS[sensitivity.lower()]
+
+        return ew_mean - (num_dev * ew_mean), ew_mean + (num_dev * ew_mean)
+
+    def predict_columns(
+        self, df: pd.DataFrame, sensitivity: str, frequency: str
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Predict the bounds of every point of each column of df.
+
+        :param df: Dataframe with one series per column, indexed by time
+        :type df: pd.DataFrame
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of df
+        :rtype: Tuple[pd.DataFrame, pd.DataFrame]
+        """
+        # ewm starts at the first value of each column, same as for a series
+        ew_mean = df.ewm(span=EWMAFREQ[frequency]).mean()
+
+        num_dev = EWMASENS[sensitivity.lower()]
+
+        return ew_mean - (num_dev * ew_mean), ew_mean + (num_dev * ew_mean)
@@ -1,9 +1,12 @@
 """Provides the EWSTDModel for anomaly detection."""
 
+from typing import Tuple
+
+import numpy as np
 import pandas as pd
 
-from chaos_genius.core.anomaly.models import AnomalyModel
-from chaos_genius.core.anomaly.utils import get_timedelta
+from chaos_genius.core.anomaly.models.anomaly_model import WindowStateModel
+from chaos_genius.core.anomaly.utils import get_ewm_weights, get_timedelta
 
 EWSTDSENS = {
     "high": 0.1,
@@ -17,7 +20,7 @@ EWSTDFREQ = {
 }
 
 
-class EWSTDModel(AnomalyModel):
+class EWSTDModel(WindowStateModel):
     """EWSTD model for anomaly detection."""
 
     def __init__(self, *args, model_kwargs={}, **kwargs):
@@ -29,6 +32,18 @@ class EWSTDModel(AnomalyModel):
         super().__init__(*args, **kwargs)
         self.model_kwargs = model_kwargs
 
+    @classmethod
+    def get_bounds_scale(cls, sensitivity: str) -> float:
+        """Return the distance of the bounds from the center at a sensitivity.
+
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :return: distance in exponentially weighted std devs of the
+        points
+        :rtype: float
+        """
+        return EWSTDSENS[sensitivity.lower()]
+
     def predict(
         self,
         df: pd.DataFrame,
@@ -82,3 +97,59 @@ class EWSTDModel(AnomalyModel):
                 "yhat_upper": "yhat_upper",
             }
         )
+
+    def predict_window_bounds(
+        self, windows: np.ndarray, sensitivity: str, frequency: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict the bounds of the point following each window of points.
+
+        :param windows: array whose last axis holds windows of consecutive
+        points (oldest first), without missing values
+        :type windows: np.ndarray
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of windows without its
+        last axis
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        weights = get_ewm_weights(EWSTDFREQ[frequency], windows.shape[-1] + 1)
+        # the forecast appended by predict is the ew mean (and has the last
+        # weight), so it moves the ew std but not the ew mean
+        ew_mean = (windows @ weights[1:]) / weights[1:].sum()
+        sum_wt = weights.sum()
+        sum_wt2 = (weights ** 2).sum()
+        ew_var = (((windows - ew_mean[..., None]) ** 2) @ weights[:-1]) / sum_wt
+        # bias correction as done by pandas
+        denominator = sum_wt ** 2 - sum_wt2
+        if denominator > 0:
+            ew_std_dev = np.sqrt(ew_var * sum_wt ** 2 / denominator)
+        else:
+            ew_std_dev = np.zeros_like(ew_mean)
+
+        num_dev = EWSTDSENS[sensitivity.lower()]
+
+        return ew_mean - (num_dev * ew_std_dev), ew_mean + (num_dev * ew_std_dev)
+
+    def predict_columns(
+        self, df: pd.DataFrame, sensitivity: str, frequency: str
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Predict the bounds of every point of each column of df.
+
+        :param df: Dataframe with one series per column, indexed by time
+        :type df: pd.DataFrame
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of df
+        :rtype: Tuple[pd.DataFrame, pd.DataFrame]
+        """
+        # ewm starts at the first value of each column, same as for a series
+        ew_mean = df.ewm(span=EWSTDFREQ[frequency]).mean()
+        ew_std_dev = df.ewm(span=EWSTDFREQ[frequency]).std().fillna(0)
+
+        num_dev = EWSTDSENS[sensitivity.lower()]
+
+        return ew_mean - (num_dev * ew_std_dev), ew_mean + (num_dev * ew_std_dev)
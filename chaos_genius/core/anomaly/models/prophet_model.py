@@ -1,12 +1,23 @@
 """Provides the Prophet model for anomaly detection."""
 
+import json
+import logging
+from typing import Tuple
+
 import pandas as pd
 
 from chaos_genius.core.anomaly.models import AnomalyModel
 from chaos_genius.core.utils.supress_output import suppress_stdout_stderr
+from chaos_genius.settings import (
+    ANOMALY_PROPHET_REFIT_STRIDE,
+    ANOMALY_PROPHET_WARM_START_ENABLED,
+)
 
 with suppress_stdout_stderr():
     import prophet as pt
+    from prophet.serialize import model_from_json, model_to_json
+
+logger = logging.getLogger(__name__)
 
 PROPHETSENS = {"high": 0.8, "medium": 0.9, "low": 0.95}
 
@@ -26,6 +37,10 @@ class ProphetModel(AnomalyModel):
         self.model = None
         self.prevModel = None
         self.model_kwargs = model_kwargs
+        # frequency of the data self.model was fit on and number of points
+        # predicted with it since
+        self.frequency = None
+        self.points_since_fit = 0
 
     def predict(
         self,
@@ -36,7 +51,9 @@ class ProphetModel(AnomalyModel):
     ) -> pd.DataFrame:
         """Predict anomalies on data.
 
-        If pred_df is None, will predict on the last data point.
+        If pred_df is None, will predict on the last data point. The model is
+        then only refit every ANOMALY_PROPHET_REFIT_STRIDE points, the points
+        in between are predicted with the last fit.
 
         :param df: Input Dataframe with dt, y columns
         :type df: pd.DataFrame
@@ -51,25 +68,24 @@ class ProphetModel(AnomalyModel):
         :rtype: pd.DataFrame
         """
         df = df.rename(columns={"dt": "ds", "y": "y"})
+        interval_width = PROPHETSENS[sensitivity.lower()]
 
-        # TODO: Add seasonality to model kwargs
-        with suppress_stdout_stderr():
-            self.model = pt.Prophet(
-                yearly_seasonality=False,
-                daily_seasonality=True,
-                interval_width=PROPHETSENS[sensitivity.lower()],
-                **self.model_kwargs
-            ).fit(df)
+        if pred_df is None and self._can_reuse_fit(df, interval_width, frequency):
+            self.points_since_fit += 1
+        else:
+            self._fit(df, interval_width)
+            self.frequency = frequency
+            self.points_since_fit = 0
 
+        future = df[["ds"]].reset_index(drop=True)
         if pred_df is None:
-            future = self.model.make_future_dataframe(
-                periods=1,
-                freq=PROPHETFREQ[frequency.lower()],
-            )
-        else:
-            future = self.model.make_future_dataframe(
-                periods=0,
+            next_ds = pd.date_range(
+                start=future["ds"].iloc[-1],
+                periods=2,
                 freq=PROPHETFREQ[frequency.lower()],
+            )[1:]
+            future = pd.concat(
+                [future, pd.DataFrame({"ds": next_ds})], ignore_index=True
             )
 
         forecast = self.model.predict(future)
@@ -84,6 +100,87 @@ class ProphetModel(AnomalyModel):
             }
         )
 
+    def _can_reuse_fit(
+        self, df: pd.DataFrame, interval_width: float, frequency: str
+    ) -> bool:
+        """Return whether the last fit can predict the point after df."""
+        return (
+            self.model is not None
+            and self.points_since_fit + 1 < ANOMALY_PROPHET_REFIT_STRIDE
+            and self.frequency == frequency
+            and self.model.interval_width == interval_width
+            and df["ds"].iloc[-1] > self.model.history["ds"].iloc[-1]
+        )
+
+    def _fit(self, df: pd.DataFrame, interval_width: float) -> None:
+        """Fit a new model.
+
+        If ANOMALY_PROPHET_WARM_START_ENABLED is set, the fit is warm-started
+        from the parameters of the last one.
+
+        :param df: Input Dataframe with ds, y columns
+        :type df: pd.DataFrame
+        :param interval_width: width of the uncertainty intervals
+        :type interval_width: float
+        """
+
+        def get_prophet():
+            # TODO: Add seasonality to model kwargs
+            return pt.Prophet(
+                yearly_seasonality=False,
+                daily_seasonality=True,
+                interval_width=interval_width,
+                **self.model_kwargs
+            )
+
+        init = None
+        if ANOMALY_PROPHET_WARM_START_ENABLED and self.model is not None:
+            init = self.stan_init(self.model)
+            # the number of changepoints and seasonality features depend on
+            # the data, the parameters can only be reused if they match
+            if self._get_param_shapes(get_prophet(), df) != (
+                len(init["delta"]),
+                len(init["beta"]),
+            ):
+                init = None
+
+        model = None
+        with suppress_stdout_stderr():
+            if init is not None:
+                try:
+                    model = get_prophet().fit(df, init=init)
+                except RuntimeError:
+                    logger.warning(
+                        "Warm-started Prophet fit failed, fitting from scratch",
+                        exc_info=True,
+                    )
+            if model is None:
+                model = get_prophet().fit(df)
+
+        self.prevModel = self.model
+        self.model = model
+
+    def _get_param_shapes(self, model, df: pd.DataFrame) -> Tuple[int, int]:
+        """Return the number of changepoints and seasonality features of a fit.
+
+        These are set up the same way as in Prophet.fit, without fitting.
+
+        :param model: An unfit model of the Prophet class
+        :type model: Prophet model
+        :param df: Input Dataframe with ds, y columns
+        :type df: pd.DataFrame
+        :return: lengths of the delta and beta parameters
+        :rtype: Tuple[int, int]
+        """
+        history = df[df["y"].notnull()].copy()
+        model.history = model.setup_dataframe(history, initialize_scales=True)
+        model.set_auto_seasonalities()
+        seasonal_features, _, _, _ = model.make_all_seasonality_features(
+            model.history
+        )
+        model.set_changepoints()
+        return len(model.changepoints_t), seasonal_features.shape[1]
+
     def stan_init(self, model):
         """Retrieve parameters from a trained model.
 
@@ -100,22 +197,54 @@ class ProphetModel(AnomalyModel):
 
         return {**res1, **res2}
 
-    # def save(self, path: str) -> None:
-    #     """Saves the model to the given path as json
-
-    #     :param path: Path to save the model
-    #     :type path: str
-    #     """
-    #     with open(path, 'w') as fout:
-    #         json.dump(model_to_json(self.model), fout)
-
-    # @classmethod
-    # def load(self, path: str) -> None:
-    #     """Loads the model from the given path to json
-
-    #     :param path: Path to load the model
-    #     :type path: str
-    #     """
-    #     with open(path, 'r') as fin:
-    #         self.model = model_from_json(json.load(fin))
-    #     return self.model
+    def save(self, path: str) -> None:
+        """Save the last fit model to the given path as json.
+
+        :param path: Path to save the model
+        :type path: str
+        """
+        if self.model is None:
+            return
+
+        self.check_and_make_path(path)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "model": model_to_json(self.model),
+                    "model_kwargs": self.model_kwargs,
+                    "frequency": self.frequency,
+                    "points_since_fit": self.points_since_fit,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str, *args, model_kwargs={}, **kwargs) -> "ProphetModel":
+        """Return a ProphetModel with the model saved at the given path.
+
+        The saved model is not used if it was fit with other model_kwargs.
+
+        :param path: Path to load the model from
+        :type path: str
+        :param model_kwargs: model specific configuration, defaults to {}
+        :type model_kwargs: dict, optional
+        :return: model to predict with, a new model if nothing valid is saved
+        :rtype: ProphetModel
+        """
+        model = cls(*args, model_kwargs=model_kwargs, **kwargs)
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            if saved["model_kwargs"] == model_kwargs:
+                model.model = model_from_json(saved["model"])
+                model.frequency = saved["frequency"]
+                model.points_since_fit = saved["points_since_fit"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError):
+            logger.warning(
+                f"Could not load Prophet model from {path}, using a new model",
+                exc_info=True,
+            )
+            return cls(*args, model_kwargs=model_kwargs, **kwargs)
+        return model
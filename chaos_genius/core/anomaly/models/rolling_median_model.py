@@ -0,0 +1,209 @@
+"""Provides the RollingMedianModel for anomaly detection."""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from chaos_genius.core.anomaly.models.anomaly_model import WindowStateModel
+from chaos_genius.core.anomaly.utils import get_median_mad_bounds, get_timedelta
+
+# number of robust std devs between the median and the bounds
+ROLLMEDSENS = {
+    "high": 1.28,
+    "medium": 1.64,
+    "low": 1.96,
+}
+
+# number of seasonal buckets for each seasonality, by frequency. Weekly
+# buckets of hourly data are by day of week and hour of day.
+ROLLMEDBUCKETS = {
+    "W": {"D": 7, "H": 168},
+    "D": {"H": 24},
+}
+
+# buckets with fewer points than this use all of the points for their bounds
+MIN_BUCKET_POINTS = 3
+
+
+class RollingMedianModel(WindowStateModel):
+    """Rolling median model for anomaly detection.
+
+    The bounds are robust (median and MAD) bounds of the points before each
+    point. With seasonality, only the points in the same day of week or hour
+    of day as the predicted point are used.
+    """
+
+    uses_kpi_seasonality = True
+
+    def __init__(self, *args, model_kwargs={}, **kwargs):
+        """Initialize the RollingMedianModel.
+
+        :param model_kwargs: model specific configuration, defaults to {}.
+        "seasonality" is a list of seasonalities ("W" for weekly, "D" for
+        daily) to bucket the points by.
+        :type model_kwargs: dict, optional
+        """
+        super().__init__(*args, **kwargs)
+        self.model_kwargs = model_kwargs
+
+    @classmethod
+    def get_bounds_scale(cls, sensitivity: str) -> float:
+        """Return the distance of the bounds from the center at a sensitivity.
+
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :return: distance in robust std devs of the points
+        :rtype: float
+        """
+        return ROLLMEDSENS[sensitivity.lower()]
+
+    def _get_num_buckets(self, frequency: str) -> Optional[int]:
+        """Return the number of seasonal buckets, None without seasonality."""
+        seasonality = self.model_kwargs.get("seasonality") or []
+        for season in ["W", "D"]:
+            if season in seasonality and frequency in ROLLMEDBUCKETS[season]:
+                return ROLLMEDBUCKETS[season][frequency]
+        return None
+
+    @staticmethod
+    def _get_buckets(dts: pd.Series, num_buckets: int) -> np.ndarray:
+        """Return the seasonal bucket of each datetime."""
+        dts = pd.DatetimeIndex(dts)
+        if num_buckets == 7:
+            return dts.dayofweek.to_numpy()
+        if num_buckets == 24:
+            return dts.hour.to_numpy()
+        return (dts.dayofweek * 24 + dts.hour).to_numpy()
+
+    def predict(
+        self,
+        df: pd.DataFrame,
+        sensitivity: str,
+        frequency: str,
+        pred_df: pd.DataFrame = None,
+    ) -> pd.DataFrame:
+        """Predict anomalies on data.
+
+        If pred_df is None, will predict on the last data point.
+
+        :param df: Input Dataframe with dt, y columns
+        :type df: pd.DataFrame
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :param pred_df: dataframe to predict on, defaults to None
+        :type pred_df: pd.DataFrame, optional
+        :return: Output Dataframe with dt, y, yhat_lower, yhat_upper
+        columns
+        :rtype: pd.DataFrame
+        """
+        df = df[["dt", "y"]].reset_index(drop=True)
+        if pred_df is None:
+            forecast_time = df["dt"].iloc[-1] + get_timedelta(frequency, 1)
+            pred_dts = pd.Series([forecast_time])
+        else:
+            pred_dts = pred_df["dt"].reset_index(drop=True)
+
+        yhat_lower, yhat_upper = self.predict_columns(
+            df.set_index("dt")[["y"]], sensitivity, frequency, pred_dts
+        )
+        yhat_lower = yhat_lower["y"].to_numpy()
+        yhat_upper = yhat_upper["y"].to_numpy()
+
+        if pred_df is None:
+            # every row gets the bounds of the forecast, as in the other models
+            df = pd.DataFrame(
+                {"dt": pd.concat([df["dt"], pred_dts], ignore_index=True)}
+            )
+            yhat_lower = np.full(len(df), yhat_lower[0])
+            yhat_upper = np.full(len(df), yhat_upper[0])
+        else:
+            df = pd.DataFrame({"dt": pred_dts})
+
+        df["yhat_lower"] = yhat_lower
+        df["yhat_upper"] = yhat_upper
+        df["y"] = (df["yhat_lower"] + df["yhat_upper"]) / 2
+
+        return df[["dt", "y", "yhat_lower", "yhat_upper"]]
+
+    def predict_window_bounds(
+        self, windows: np.ndarray, sensitivity: str, frequency: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict the bounds of the point following each window of points.
+
+        :param windows: array whose last axis holds windows of consecutive
+        points (oldest first), without missing values
+        :type windows: np.ndarray
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of windows without its
+        last axis
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        window = windows.shape[-1]
+        num_buckets = self._get_num_buckets(frequency)
+        if num_buckets is not None:
+            # points in the same bucket as the predicted point are a
+            # multiple of num_buckets points before it
+            bucket_points = windows[..., window % num_buckets::num_buckets]
+            if bucket_points.shape[-1] >= MIN_BUCKET_POINTS:
+                windows = bucket_points
+
+        return get_median_mad_bounds(windows, ROLLMEDSENS[sensitivity.lower()])
+
+    def predict_columns(
+        self,
+        df: pd.DataFrame,
+        sensitivity: str,
+        frequency: str,
+        pred_dts: pd.Series = None,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Predict the bounds of every point of each column of df.
+
+        :param df: Dataframe with one series per column, indexed by time
+        :type df: pd.DataFrame
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :param pred_dts: datetimes to predict the bounds of, defaults to None
+        (the index of df)
+        :type pred_dts: pd.Series, optional
+        :return: lower and upper bounds, with the columns of df and a row per
+        predicted datetime
+        :rtype: Tuple[pd.DataFrame, pd.DataFrame]
+        """
+        values = df.to_numpy(dtype=float)
+        pred_index = df.index if pred_dts is None else pd.Index(pred_dts)
+        zscore = ROLLMEDSENS[sensitivity.lower()]
+
+        # bounds from all points of each column, missing values are outside of
+        # the series of the column
+        lower, upper = get_median_mad_bounds(values.T, zscore, skipna=True)
+        yhat_lower = np.tile(lower, (len(pred_index), 1))
+        yhat_upper = np.tile(upper, (len(pred_index), 1))
+
+        num_buckets = self._get_num_buckets(frequency)
+        if num_buckets is not None:
+            buckets = self._get_buckets(df.index, num_buckets)
+            pred_buckets = self._get_buckets(pred_index, num_buckets)
+            for bucket in np.unique(pred_buckets):
+                bucket_values = values[buckets == bucket]
+                bucket_lower, bucket_upper = get_median_mad_bounds(
+                    bucket_values.T, zscore, skipna=True
+                )
+                has_points = (~np.isnan(bucket_values)).sum(
+                    axis=0
+                ) >= MIN_BUCKET_POINTS
+                rows = pred_buckets == bucket
+                yhat_lower[rows] = np.where(has_points, bucket_lower, lower)
+                yhat_upper[rows] = np.where(has_points, bucket_upper, upper)
+
+        return (
+            pd.DataFrame(yhat_lower, index=pred_index, columns=df.columns),
+            pd.DataFrame(yhat_upper, index=pred_index, columns=df.columns),
+        )
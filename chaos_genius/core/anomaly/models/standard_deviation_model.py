@@ -1,5 +1,8 @@
 """Provides the Standard Deviation model for anomaly detection."""
 
+from typing import Tuple
+
+import numpy as np
 import pandas as pd
 
 from chaos_genius.core.anomaly.models import AnomalyModel
@@ -20,6 +23,17 @@ class StandardDeviationModel(AnomalyModel):
         super().__init__(*args, **kwargs)
         self.model_kwargs = model_kwargs
 
+    @classmethod
+    def get_bounds_scale(cls, sensitivity: str) -> float:
+        """Return the distance of the bounds from the center at a sensitivity.
+
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :return: distance in std devs of the points
+        :rtype: float
+        """
+        return STDSENS[sensitivity.lower()]
+
     def predict(
         self,
         df: pd.DataFrame,
@@ -83,6 +97,59 @@ class StandardDeviationModel(AnomalyModel):
             }
         )
 
+    def predict_window_bounds(
+        self, windows: np.ndarray, sensitivity: str, frequency: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict the bounds of the point following each window of points.
+
+        :param windows: array whose last axis holds windows of consecutive
+        points (oldest first), without missing values
+        :type windows: np.ndarray
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of windows without its
+        last axis
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        mean = windows.mean(axis=-1)
+        std_dev = windows.std(axis=-1, ddof=1)
+
+        num_dev = STDSENS[sensitivity.lower()]
+
+        return mean - (num_dev * std_dev), mean + (num_dev * std_dev)
+
+    def predict_columns(
+        self, df: pd.DataFrame, sensitivity: str, frequency: str
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Predict the bounds of every point of each column of df.
+
+        :param df: Dataframe with one series per column, indexed by time
+        :type df: pd.DataFrame
+        :param sensitivity: sensitivity to use for anomaly detection
+        :type sensitivity: str
+        :param frequency: frequency to use in the model
+        :type frequency: str
+        :return: lower and upper bounds, with the shape of df
+        :rtype: Tuple[pd.DataFrame, pd.DataFrame]
+        """
+        mean = df.mean()
+        std_dev = df.std()
+
+        num_dev = STDSENS[sensitivity.lower()]
+
+        # every point of a column has the same bounds
+        yhat_lower, yhat_upper = (
+            pd.DataFrame(
+                np.broadcast_to(bound.to_numpy(dtype=float), df.shape).copy(),
+                index=df.index,
+                columns=df.columns,
+            )
+            for bound in (mean - (num_dev * std_dev), mean + (num_dev * std_dev))
+        )
+        return yhat_lower, yhat_upper
+
     def _detect_anomalies(self, forecast):
         forecasted = forecast[["ds", "yhat", "yhat_lower", "yhat_upper", "y"]].copy()
         forecasted["anomaly"] = 0
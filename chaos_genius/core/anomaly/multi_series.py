@@ -0,0 +1,249 @@
+"""Provides anomaly detection for many series at once, one series per column."""
+
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from chaos_genius.core.anomaly.models import MODEL_MAPPER, AnomalyModel
+from chaos_genius.core.anomaly.processor import compute_severity, detect_anomalies
+from chaos_genius.core.anomaly.utils import get_timedelta
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_COLUMNS = [
+    "dt",
+    "y",
+    "yhat",
+    "yhat_lower",
+    "yhat_upper",
+    "anomaly",
+    "severity",
+    "std_dev",
+]
+
+# max number of values in the windows predicted at once
+MAX_WINDOW_VALUES = 4_000_000
+
+
+class MultiSeriesAnomalyDetection:
+    """Anomaly detection for a matrix of series with closed-form models.
+
+    Gives the same output as running ProcessAnomalyDetection on each series,
+    but runs the model on all series at once with pandas and NumPy.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        data: pd.DataFrame,
+        last_dates: List[Optional[datetime]],
+        period: int,
+        freq: str,
+        sensitivity: str,
+        slack: int,
+        model_kwargs={},
+    ):
+        """Initialize the detector.
+
+        :param model_name: model to use, must be supported (see is_supported)
+        :type model_name: str
+        :param data: dataframe with a regular datetime index at freq and one
+        series per column. Each column has missing values only before and
+        after its series.
+        :type data: pd.DataFrame
+        :param last_dates: last date for which anomaly was run, for each series
+        :type last_dates: List[Optional[datetime]]
+        :param period: period of data points to train model on
+        :type period: int
+        :param freq: frequency of data
+        :type freq: str
+        :param sensitivity: sensitivity to use for anomaly bounds
+        :type sensitivity: str
+        :param slack: slack in data points for computing anomaly
+        :type slack: int
+        :param model_kwargs: parameters to initialize the model with, defaults
+        to {}
+        :type model_kwargs: dict, optional
+        """
+        self.model_name = model_name
+        self.data = data
+        self.last_dates = last_dates
+        self.period = period
+        self.freq = freq
+        self.sensitivity = sensitivity
+        self.slack = slack
+        self.model_kwargs = model_kwargs
+
+    @staticmethod
+    def is_supported(model_name: str) -> bool:
+        """Return whether a model can be run on many series at once."""
+        model = MODEL_MAPPER[model_name]
+        return (
+            model.predict_columns is not AnomalyModel.predict_columns
+            and model.predict_window_bounds is not AnomalyModel.predict_window_bounds
+        )
+
+    def predict(self) -> List[Optional[pd.DataFrame]]:
+        """Run the prediction for anomalies of all series.
+
+        :return: anomaly output of each series, in the format of
+        ProcessAnomalyDetection.predict. Series which can't be run here (e.g.
+        with a last date not aligned to the data) have None.
+        :rtype: List[Optional[pd.DataFrame]]
+        """
+        model = MODEL_MAPPER[self.model_name](model_kwargs=self.model_kwargs)
+
+        values = self.data.to_numpy(dtype=float)
+        has_value = ~np.isnan(values)
+        starts = has_value.argmax(axis=0)
+        ends = len(values) - 1 - has_value[::-1].argmax(axis=0)
+
+        outputs: List[Optional[pd.DataFrame]] = [None] * values.shape[1]
+
+        new_series = []
+        old_series = []
+        for i, last_date in enumerate(self.last_dates):
+            if not has_value[:, i].any():
+                continue
+            if last_date is None:
+                new_series.append(i)
+            else:
+                old_series.append(i)
+
+        if new_series:
+            self._predict_new_series(model, new_series, starts, ends, outputs)
+        if old_series:
+            self._predict_old_series(
+                model, values, old_series, starts, ends, outputs
+            )
+
+        return outputs
+
+    def _predict_new_series(
+        self,
+        model: AnomalyModel,
+        series: List[int],
+        starts: np.ndarray,
+        ends: np.ndarray,
+        outputs: List[Optional[pd.DataFrame]],
+    ) -> None:
+        """Predict every point of series with no previous anomaly output."""
+        eligible = []
+        for i in series:
+            if self.period - (ends[i] - starts[i] + 1) <= self.slack:
+                eligible.append(i)
+            else:
+                logger.warning(f"Insufficient slack for {self.data.columns[i]}")
+                outputs[i] = pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+        if not eligible:
+            return
+
+        data = self.data.iloc[:, eligible]
+        yhat_lower, yhat_upper = model.predict_columns(
+            data, self.sensitivity, self.freq
+        )
+        std_dev = data.std().to_numpy()
+
+        for j, i in enumerate(eligible):
+            rows = slice(starts[i], ends[i] + 1)
+            pred_series = pd.DataFrame(
+                {
+                    "dt": data.index[rows],
+                    "y": data.iloc[rows, j].to_numpy(),
+                    "yhat": (
+                        yhat_lower.iloc[rows, j] + yhat_upper.iloc[rows, j]
+                    ).to_numpy()
+                    / 2,
+                    "yhat_lower": yhat_lower.iloc[rows, j].to_numpy(),
+                    "yhat_upper": yhat_upper.iloc[rows, j].to_numpy(),
+                }
+            )
+            pred_series = detect_anomalies(pred_series)
+            pred_series["severity"] = compute_severity(pred_series, std_dev[j])
+            pred_series["std_dev"] = std_dev[j]
+            outputs[i] = pred_series
+
+    def _predict_old_series(
+        self,
+        model: AnomalyModel,
+        values: np.ndarray,
+        series: List[int],
+        starts: np.ndarray,
+        ends: np.ndarray,
+        outputs: List[Optional[pd.DataFrame]],
+    ) -> None:
+        """Predict the points after the last date, each from the period before it."""
+        index = self.data.index
+        delta = pd.Timedelta(get_timedelta(self.freq, 1))
+
+        predicted_rows = {}
+        for i in series:
+            last_date = pd.Timestamp(self.last_dates[i])
+            if (last_date - index[0]) % delta != pd.Timedelta(0):
+                # dates to predict would not be on the data's grid
+                continue
+            first_row = max(
+                index.searchsorted(last_date, side="right"),
+                starts[i] + self.period,
+            )
+            predicted_rows[i] = np.arange(first_row, ends[i] + 1)
+
+        columns = list(predicted_rows)
+        if not columns:
+            return
+
+        rows = np.unique(np.concatenate([predicted_rows[i] for i in columns]))
+        if len(rows) == 0:
+            for i in columns:
+                outputs[i] = pd.DataFrame(columns=OUTPUT_COLUMNS)
+            return
+
+        yhat_lower = np.full((len(rows), len(columns)), np.nan)
+        yhat_upper = np.full((len(rows), len(columns)), np.nan)
+        std_dev = np.full((len(rows), len(columns)), np.nan)
+
+        # windows[k] holds the points values[k:k + period + 1], the last of
+        # which is predicted from the ones before it
+        windows = sliding_window_view(values[:, columns], self.period + 1, axis=0)
+        chunk_size = max(1, MAX_WINDOW_VALUES // (len(columns) * (self.period + 1)))
+        for chunk_start in range(0, len(rows), chunk_size):
+            chunk = slice(chunk_start, chunk_start + chunk_size)
+            chunk_windows = windows[rows[chunk] - self.period]
+            # windows of series which are not predicted at a row can have
+            # missing values, their (NaN) output is not used
+            with np.errstate(invalid="ignore"):
+                yhat_lower[chunk], yhat_upper[chunk] = model.predict_window_bounds(
+                    chunk_windows[..., :-1], self.sensitivity, self.freq
+                )
+                # severity is relative to the std dev of all points in the window
+                std_dev[chunk] = chunk_windows.std(axis=-1, ddof=1)
+
+        for j, i in enumerate(columns):
+            series_rows = predicted_rows[i]
+            if len(series_rows) == 0:
+                outputs[i] = pd.DataFrame(columns=OUTPUT_COLUMNS)
+                continue
+            row_positions = np.searchsorted(rows, series_rows)
+            pred_series = pd.DataFrame(
+                {
+                    "dt": index[series_rows],
+                    "y": values[series_rows, i],
+                    "yhat": (
+                        yhat_lower[row_positions, j] + yhat_upper[row_positions, j]
+                    )
+                    / 2,
+                    "yhat_lower": yhat_lower[row_positions, j],
+                    "yhat_upper": yhat_upper[row_positions, j],
+                }
+            )
+            pred_series = detect_anomalies(pred_series)
+            pred_series["severity"] = compute_severity(
+                pred_series, std_dev[row_positions, j]
+            )
+            pred_series["std_dev"] = std_dev[row_positions, j]
+            outputs[i] = pred_series
@@ -0,0 +1,145 @@
+"""Provides a cheap screen of series before running an expensive model.
+
+Series whose new points are all well within robust (median and MAD) bounds
+of the points before them are not run through the configured model. They
+get the screen's bounds as output instead, with is_screened set.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from chaos_genius.core.anomaly.utils import get_median_mad_bounds, get_timedelta
+
+# number of robust std devs in the bounds, matching the two-sided normal
+# intervals (80%, 90%, 95%) used by Prophet and ETS at each sensitivity
+MEDIAN_MAD_ZSCORE = {"high": 1.28, "medium": 1.64, "low": 1.96}
+
+# fraction of the bounds a new point must be within for its series to be
+# screened. Points closer to the bounds are left to the model.
+PRESCREEN_MARGIN = 0.5
+
+# max number of values in the windows screened at once
+MAX_WINDOW_VALUES = 4_000_000
+
+OUTPUT_COLUMNS = [
+    "dt",
+    "y",
+    "yhat",
+    "yhat_lower",
+    "yhat_upper",
+    "anomaly",
+    "severity",
+    "std_dev",
+    "is_screened",
+]
+
+
+def prescreen_series(
+    data: pd.DataFrame,
+    last_dates: List[Optional[datetime]],
+    period: int,
+    freq: str,
+    sensitivity: str,
+) -> List[Optional[pd.DataFrame]]:
+    """Screen the points after the last date of many series at once.
+
+    :param data: dataframe with a regular datetime index at freq and one
+    series per column. Each column has missing values only before and after
+    its series.
+    :type data: pd.DataFrame
+    :param last_dates: last date for which anomaly was run, for each series
+    :type last_dates: List[Optional[datetime]]
+    :param period: period of data points the model is trained on
+    :type period: int
+    :param freq: frequency of data
+    :type freq: str
+    :param sensitivity: sensitivity to use for anomaly bounds
+    :type sensitivity: str
+    :return: output of each quiet series, in the format of
+    ProcessAnomalyDetection.predict plus an is_screened column. Series which
+    need the model (or can't be screened, e.g. with no previous output) have
+    None.
+    :rtype: List[Optional[pd.DataFrame]]
+    """
+    values = data.to_numpy(dtype=float)
+    index = data.index
+    outputs: List[Optional[pd.DataFrame]] = [None] * values.shape[1]
+    if len(index) == 0:
+        return outputs
+
+    has_value = ~np.isnan(values)
+    starts = has_value.argmax(axis=0)
+    ends = len(values) - 1 - has_value[::-1].argmax(axis=0)
+    delta = pd.Timedelta(get_timedelta(freq, 1))
+
+    predicted_rows = {}
+    for i, last_date in enumerate(last_dates):
+        if last_date is None or not has_value[:, i].any():
+            continue
+        last_date = pd.Timestamp(last_date)
+        if (last_date - index[0]) % delta != pd.Timedelta(0):
+            continue
+        first_row = max(
+            index.searchsorted(last_date, side="right"), starts[i] + period
+        )
+        if first_row <= ends[i]:
+            predicted_rows[i] = np.arange(first_row, ends[i] + 1)
+
+    columns = list(predicted_rows)
+    if not columns:
+        return outputs
+
+    rows = np.unique(np.concatenate([predicted_rows[i] for i in columns]))
+    yhat_lower = np.full((len(rows), len(columns)), np.nan)
+    yhat_upper = np.full((len(rows), len(columns)), np.nan)
+    std_dev = np.full((len(rows), len(columns)), np.nan)
+    zscore = MEDIAN_MAD_ZSCORE[sensitivity.lower()]
+
+    # windows[k] holds the points values[k:k + period + 1], the last of
+    # which is screened with the ones before it
+    windows = sliding_window_view(values[:, columns], period + 1, axis=0)
+    chunk_size = max(1, MAX_WINDOW_VALUES // (len(columns) * (period + 1)))
+    for chunk_start in range(0, len(rows), chunk_size):
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        chunk_windows = windows[rows[chunk] - period]
+        # windows of series which are not screened at a row can have missing
+        # values, their (NaN) bounds are not used
+        with np.errstate(invalid="ignore"):
+            yhat_lower[chunk], yhat_upper[chunk] = get_median_mad_bounds(
+                chunk_windows[..., :-1], zscore
+            )
+            # severity is relative to the std dev of all points in the
+            # window, as in the models, if the bounds are rescaled later
+            std_dev[chunk] = chunk_windows.std(axis=-1, ddof=1)
+
+    for j, i in enumerate(columns):
+        row_positions = np.searchsorted(rows, predicted_rows[i])
+        y = values[predicted_rows[i], i]
+        lower = yhat_lower[row_positions, j]
+        upper = yhat_upper[row_positions, j]
+
+        center = (lower + upper) / 2
+        half_width = PRESCREEN_MARGIN * (upper - lower) / 2
+        if (np.abs(y - center) > half_width).any():
+            continue
+
+        outputs[i] = pd.DataFrame(
+            {
+                "dt": index[predicted_rows[i]],
+                "y": y,
+                "yhat": center,
+                "yhat_lower": lower,
+                "yhat_upper": upper,
+                "anomaly": 0,
+                "severity": 0.0,
+                "std_dev": std_dev[row_positions, j],
+                "is_screened": True,
+            },
+            columns=OUTPUT_COLUMNS,
+        )
+
+    return outputs
@@ -1,18 +1,81 @@
 """Provides processor class which computes anomaly detection."""
 import datetime
+import hashlib
 import logging
+import os
+import shutil
+from typing import Optional
 
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 
 from chaos_genius.core.anomaly.constants import FREQUENCY_DELTA
 from chaos_genius.core.anomaly.models import MODEL_MAPPER, AnomalyModel
-from chaos_genius.core.anomaly.utils import bound_between, get_timedelta
+from chaos_genius.core.anomaly.models.anomaly_model import WindowStateModel
+from chaos_genius.core.anomaly.prescreen import prescreen_series
+from chaos_genius.core.anomaly.utils import get_series_type_key, get_timedelta
+from chaos_genius.settings import ANOMALY_MODEL_STATE_DIR, ANOMALY_MODEL_STATE_ENABLED
 
 logger = logging.getLogger(__name__)
 
 ZSCORE_UPPER_BOUND = 3
 
 
+def delete_anomaly_model_state(kpi_id: int) -> None:
+    """Delete the saved anomaly model states of all series of a KPI.
+
+    :param kpi_id: ID of the KPI
+    :type kpi_id: int
+    """
+    shutil.rmtree(
+        os.path.join(ANOMALY_MODEL_STATE_DIR, str(kpi_id)), ignore_errors=True
+    )
+    logger.info(f"Deleted anomaly model state for KPI {kpi_id}")
+
+
+def detect_anomalies(pred_series: pd.DataFrame) -> pd.DataFrame:
+    """Flag points above the upper bound with 1 and below the lower with -1."""
+    pred_series["anomaly"] = 0
+    high_sel = pred_series["y"] > pred_series["yhat_upper"]
+    low_sel = pred_series["y"] < pred_series["yhat_lower"]
+    pred_series.loc[high_sel, "anomaly"] = 1
+    pred_series.loc[low_sel, "anomaly"] = -1
+
+    return pred_series
+
+
+def compute_severity(anomaly_prediction: pd.DataFrame, std_dev) -> np.ndarray:
+    """Compute severity of each row from its deviation from the bounds.
+
+    :param anomaly_prediction: dataframe with y, yhat_lower, yhat_upper
+    and anomaly columns
+    :type anomaly_prediction: pd.DataFrame
+    :param std_dev: std dev to scale deviations with, a scalar or one value
+    per row
+    :type std_dev: float or np.ndarray
+    :return: severity of each row, between 0 and 100
+    :rtype: np.ndarray
+    """
+    anomaly = anomaly_prediction["anomaly"].to_numpy()
+    y = anomaly_prediction["y"].to_numpy(dtype=float)
+
+    # Check num deviations from upper bound of CI for high anomalies and
+    # from lower bound of CI for low anomalies
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscore = np.where(
+            anomaly == 1,
+            y - anomaly_prediction["yhat_upper"].to_numpy(dtype=float),
+            y - anomaly_prediction["yhat_lower"].to_numpy(dtype=float),
+        ) / std_dev
+
+    # Map zscore of 0-3 to 0-100, bounded between 0 and 100
+    severity = np.clip(np.abs(zscore * 100 / ZSCORE_UPPER_BOUND), 0, 100)
+
+    # No anomaly (or no deviation in the data). Severity is 0
+    return np.where((anomaly == 0) | (std_dev == 0), 0, severity)
+
+
 class ProcessAnomalyDetection:
     """Processor class for computing anomaly detection."""
 
@@ -29,6 +92,8 @@ class ProcessAnomalyDetection:
         series: str,
         subgroup: str = None,
         model_kwargs={},
+        kpi_id: Optional[int] = None,
+        prescreen: bool = False,
     ):
         """Initialize the processor.
 
@@ -55,7 +120,15 @@ class ProcessAnomalyDetection:
         :param model_kwargs: parameters to initialize the model with, defaults
         to {}
         :type model_kwargs: dict, optional
+        :param kpi_id: KPI of the series, models are only saved and loaded
+        when given, defaults to None
+        :type kpi_id: int, optional
+        :param prescreen: whether to screen the new points with robust
+        bounds first, and only run the model if one of them is not well
+        within them, defaults to False
+        :type prescreen: bool, optional
         """
+        self.kpi_id = kpi_id
         self.model_name = model_name
         self.input_data = data
         self.last_date = last_date
@@ -68,6 +141,7 @@ class ProcessAnomalyDetection:
         self.freq = freq
         self.sensitivity = sensitivity
         self.slack = slack
+        self.prescreen = prescreen
 
     def predict(self) -> pd.DataFrame:
         """Run the prediction for anomalies.
@@ -79,7 +153,13 @@ class ProcessAnomalyDetection:
 
         logger.debug(f"Running Prediction and Detecting Severity for {self.series}-{self.subgroup}")
         anomaly_df = self._predict(model)
+        if self.prescreen and "is_screened" not in anomaly_df.columns:
+            anomaly_df["is_screened"] = False
 
+        if isinstance(model, WindowStateModel) and len(anomaly_df) > 0:
+            model.update_window_state(
+                self.input_data, anomaly_df["dt"].iloc[-1], self.period, self.freq
+            )
         self._save_model(model)
 
         return anomaly_df
@@ -90,7 +170,18 @@ class ProcessAnomalyDetection:
 
         input_data = self.input_data
 
-        pred_series = pd.DataFrame(columns=["dt", "y", "yhat_lower", "yhat_upper", "anomaly", "severity"])
+        pred_series = pd.DataFrame(
+            columns=[
+                "dt",
+                "y",
+                "yhat",
+                "yhat_lower",
+                "yhat_upper",
+                "anomaly",
+                "severity",
+                "std_dev",
+            ]
+        )
 
         input_last_date = input_data["dt"].iloc[-1]
         input_first_date = input_data["dt"].iloc[0]
@@ -116,6 +207,10 @@ class ProcessAnomalyDetection:
                     pred_df=input_data,
                 )
 
+                # predict gives the model's center as y
+                prediction.insert(
+                    prediction.columns.get_loc("yhat_lower"), "yhat", prediction["y"]
+                )
                 prediction["y"] = input_data["y"]
                 prediction_with_severity = self._detect_severity(self._detect_anomalies(prediction))
                 pred_series = prediction_with_severity
@@ -123,6 +218,17 @@ class ProcessAnomalyDetection:
                 logger.warning(f"Insufficient slack for {self.series}-{self.subgroup}")
 
         else:
+            if self.prescreen:
+                screened_prediction = self._predict_prescreen()
+                if screened_prediction is not None:
+                    return screened_prediction
+
+            rolling_prediction = self._predict_from_window_state(model)
+            if rolling_prediction is None:
+                rolling_prediction = self._predict_rolling(model)
+            if rolling_prediction is not None:
+                return rolling_prediction
+
             date_to_predict = self.last_date + datetime.timedelta(**FREQUENCY_DELTA[self.freq])
             while date_to_predict <= input_last_date:
                 curr_period = date_to_predict - input_first_date
@@ -136,6 +242,7 @@ class ProcessAnomalyDetection:
                     prediction = model.predict(
                         df.iloc[:-1], self.sensitivity, self.freq
                     )
+                    prediction["yhat"] = prediction["y"]
                     prediction["y"] = df["y"].to_list()
                     prediction_with_severity = self._detect_severity(self._detect_anomalies(prediction))
                     to_append = prediction_with_severity.iloc[-1].copy()
@@ -146,50 +253,156 @@ class ProcessAnomalyDetection:
 
         return pred_series
 
-    def _detect_anomalies(self, pred_series):
-        pred_series["anomaly"] = 0
-        high_sel = pred_series["y"] > pred_series["yhat_upper"]
-        low_sel = pred_series["y"] < pred_series["yhat_lower"]
-        pred_series.loc[high_sel, "anomaly"] = 1
-        pred_series.loc[low_sel, "anomaly"] = -1
+    def _predict_prescreen(self) -> Optional[pd.DataFrame]:
+        """Return the screened output of the points after last_date.
+
+        Returns None if one of the points is not well within the screen's
+        bounds and needs the model, or if the data can't be screened (it has
+        gaps or missing values).
+        """
+        input_data = self.input_data
+        if len(input_data) < 2 or input_data["y"].isna().any():
+            return None
+
+        dts = pd.DatetimeIndex(input_data["dt"])
+        delta = pd.Timedelta(get_timedelta(self.freq, 1))
+        if (dts[1:] - dts[:-1] != delta).any():
+            return None
+
+        return prescreen_series(
+            pd.DataFrame({"y": input_data["y"].to_numpy()}, index=dts),
+            [self.last_date],
+            self.period,
+            self.freq,
+            self.sensitivity,
+        )[0]
+
+    def _predict_from_window_state(
+        self, model: AnomalyModel
+    ) -> Optional[pd.DataFrame]:
+        """Predict the points after last_date from the model's saved window.
+
+        Only used when the input data doesn't reach back to the start of the
+        window, the input data is used otherwise so that restated or late
+        points are not ignored. Only the points after last_date are used from
+        the input data. Returns None if the model has no window state ending
+        at last_date, or if the input data covers the window.
+        """
+        if not isinstance(model, WindowStateModel):
+            return None
+
+        window_data = model.get_window_state_data(
+            self.last_date, self.period, self.freq
+        )
+        if (
+            window_data is None
+            or self.input_data["dt"].iloc[0] <= window_data["dt"].iloc[0]
+        ):
+            return None
+
+        new_data = self.input_data[self.input_data["dt"] > self.last_date]
+        return self._predict_rolling(
+            model, pd.concat([window_data, new_data[["dt", "y"]]], ignore_index=True)
+        )
+
+    def _predict_rolling(
+        self, model: AnomalyModel, input_data: Optional[pd.DataFrame] = None
+    ) -> Optional[pd.DataFrame]:
+        """Predict all points after last_date with a single batch prediction.
+
+        Gives the same output as predicting each point from the points in the
+        period before it, one point at a time. Returns None if the model does
+        not support batch prediction, or if the data has gaps or missing
+        values (so that windows don't all have the same number of points).
+        """
+        if input_data is None:
+            input_data = self.input_data
+        if input_data["y"].isna().any():
+            return None
+
+        delta = datetime.timedelta(**FREQUENCY_DELTA[self.freq])
+        max_period = get_timedelta(self.freq, self.period)
+        dates_to_predict = pd.date_range(
+            start=self.last_date + delta,
+            end=input_data["dt"].iloc[-1],
+            freq=delta,
+        )
+        dates_to_predict = dates_to_predict[
+            dates_to_predict - input_data["dt"].iloc[0] >= max_period
+        ]
+        if len(dates_to_predict) == 0:
+            return None
+
+        # the points used for each date are the ones in
+        # [date - max_period, date], the last of them is the one predicted
+        dts = input_data["dt"].to_numpy()
+        window_starts = np.searchsorted(
+            dts, (dates_to_predict - max_period).to_numpy(), side="left"
+        )
+        window_ends = np.searchsorted(dts, dates_to_predict.to_numpy(), side="right")
+        window_sizes = window_ends - window_starts
+        window_size = window_sizes[0]
+        if window_size < 2 or (window_sizes != window_size).any():
+            return None
+
+        first_start = window_starts[0]
+        df = input_data.iloc[first_start:window_ends[-1]][["dt", "y"]]
+        try:
+            bounds = model.predict_rolling(
+                df, window_size - 1, self.sensitivity, self.freq
+            )
+        except NotImplementedError:
+            return None
+
+        # each date is predicted at the last point of its window
+        predicted = window_ends - 1
+        bounds = bounds.iloc[predicted - first_start - (window_size - 1)]
+        y = input_data["y"].to_numpy(dtype=float)
+
+        pred_series = pd.DataFrame(
+            {
+                # predict labels its output one step after the points used
+                "dt": dts[predicted - 1] + np.timedelta64(get_timedelta(self.freq, 1)),
+                "y": y[predicted],
+                "yhat": (bounds["yhat_lower"] + bounds["yhat_upper"]).to_numpy() / 2,
+                "yhat_lower": bounds["yhat_lower"].to_numpy(),
+                "yhat_upper": bounds["yhat_upper"].to_numpy(),
+            }
+        )
+
+        # severity is relative to the std dev of all points in the window
+        std_dev = (
+            pd.DataFrame(
+                sliding_window_view(y[first_start:], window_size)[
+                    window_starts - first_start
+                ]
+            )
+            .std(axis=1)
+            .to_numpy()
+        )
 
+        pred_series = self._detect_anomalies(pred_series)
+        pred_series["severity"] = compute_severity(pred_series, std_dev)
+        pred_series["std_dev"] = std_dev
         return pred_series
 
+    def _detect_anomalies(self, pred_series):
+        return detect_anomalies(pred_series)
+
     def _detect_severity(self, anomaly_prediction):
         std_dev = anomaly_prediction["y"].std()
-
-        anomaly_prediction["severity"] = 0
-        if std_dev == 0:
-            return anomaly_prediction
-
-        anomaly_prediction["severity"] = anomaly_prediction.apply(
-            lambda x: self._compute_severity(x, std_dev), axis=1
+        anomaly_prediction["severity"] = compute_severity(
+            anomaly_prediction, std_dev
         )
+        # kept to recompute the severity with different bounds
+        anomaly_prediction["std_dev"] = std_dev
 
         return anomaly_prediction
 
-    def _compute_severity(self, row, std_dev):
-        # TODO: Create docstring for these comments
-        if row["anomaly"] == 0:
-            # No anomaly. Severity is 0
-            return 0
-        elif row["anomaly"] == 1:
-            # Check num deviations from upper bound of CI
-            zscore = (row["y"] - row["yhat_upper"]) / std_dev
-        elif row["anomaly"] == -1:
-            # Check num deviations from lower bound of CI
-            zscore = (row["y"] - row["yhat_lower"]) / std_dev
-
-        # Map zscore of 0-3 to 0-100
-        severity = zscore * 100 / ZSCORE_UPPER_BOUND
-        severity = abs(severity)
-
-        # Bound between min and max score
-        # If above 100, we return 100; If below -100, we return -100
-        return bound_between(0, severity, 100)
-
     def _get_model(self) -> AnomalyModel:
         model = MODEL_MAPPER[self.model_name]
+        if self.model_path is None:
+            return model(model_kwargs=self.model_kwargs)
         try:
             return model.load(self.model_path, model_kwargs=self.model_kwargs)
         except NotImplementedError:
@@ -199,13 +412,20 @@ class ProcessAnomalyDetection:
         self,
         model: AnomalyModel,
     ) -> None:
+        if self.model_path is None:
+            return
         try:
             model.save(self.model_path)
         except NotImplementedError:
             pass
 
-    def _gen_model_save_path(self):
-        if self.series == "overall":
-            return f"./{self.table_name}/{self.subgroup}.mdl"
-        else:
-            return f"./{self.table_name}/{self.subgroup}_{self.series}.mdl"
+    def _gen_model_save_path(self) -> Optional[str]:
+        if not ANOMALY_MODEL_STATE_ENABLED or self.kpi_id is None:
+            return None
+        subgroup_key = get_series_type_key(self.subgroup) or ""
+        subgroup_hash = hashlib.sha1(subgroup_key.encode()).hexdigest()
+        return os.path.join(
+            ANOMALY_MODEL_STATE_DIR,
+            str(self.kpi_id),
+            f"{self.model_name}_{self.series}_{subgroup_hash}.json",
+        )
@@ -1,12 +1,16 @@
 """Provides utility functions for anomaly detection."""
 
 import json
+import warnings
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import func
 
-from chaos_genius.databases.models.anomaly_data_model import AnomalyDataOutput
+from chaos_genius.databases.models.anomaly_data_model import AnomalyDataOutput, db
 
 
 def bound_between(min_val, val, max_val):
@@ -42,6 +46,50 @@ def get_last_date_in_db(kpi_id: int, series: str, subgroup: dict = None) -> Any
     return results.data_datetime if results else None
 
 
+def get_series_type_key(series_type: Optional[Union[dict, str]]) -> Optional[str]:
+    """Return the subgroup of a series as a canonical JSON string.
+
+    Keys are sorted, as JSONB (used to store the subgroup) does not keep their
+    order and compares subgroups regardless of it.
+
+    :param series_type: subgroup as a dict or JSON string, None for overall
+    :type series_type: Optional[Union[dict, str]]
+    :return: JSON string with sorted keys, None for overall
+    :rtype: Optional[str]
+    """
+    if series_type is None:
+        return None
+    if isinstance(series_type, str):
+        series_type = json.loads(series_type)
+    return json.dumps(series_type, sort_keys=True)
+
+
+def get_last_dates_in_db(kpi_id: int) -> Dict[Tuple[str, Optional[str]], datetime]:
+    """Get last date for which anomaly was computed, for all series of a KPI.
+
+    :param kpi_id: kpi id to check for
+    :type kpi_id: int
+    :return: last date for each anomaly type and subgroup (see
+    get_series_type_key) which has anomaly output
+    :rtype: Dict[Tuple[str, Optional[str]], datetime]
+    """
+    results = (
+        db.session.query(
+            AnomalyDataOutput.anomaly_type,
+            AnomalyDataOutput.series_type,
+            func.max(AnomalyDataOutput.data_datetime),
+        )
+        .filter(AnomalyDataOutput.kpi_id == kpi_id)
+        .group_by(AnomalyDataOutput.anomaly_type, AnomalyDataOutput.series_type)
+        .all()
+    )
+
+    return {
+        (anomaly_type, get_series_type_key(series_type)): last_date
+        for anomaly_type, series_type, last_date in results
+    }
+
+
 def get_dq_missing_data(
     input_data: pd.DataFrame,
     dt_col: str,
@@ -105,22 +153,138 @@ def get_timedelta(freq, diff):
     return timedelta(**offset)
 
 
+def get_preceding_windows(values: np.ndarray, window: int) -> np.ndarray:
+    """Return the window of values before each value after the first window.
+
+    :param values: 1-D array of values
+    :type values: np.ndarray
+    :param window: number of values in each window
+    :type window: int
+    :return: read-only view where row i holds values[i:i + window], the
+    window preceding values[i + window]
+    :rtype: np.ndarray
+    """
+    return sliding_window_view(values, window)[:-1]
+
+
+def get_ewm_weights(span: int, length: int) -> np.ndarray:
+    """Return the weights of pandas' (adjusted) ewm over length values.
+
+    :param span: span of the exponentially weighted window
+    :type span: int
+    :param length: number of values
+    :type length: int
+    :return: weights of the values, oldest first
+    :rtype: np.ndarray
+    """
+    alpha = 2 / (span + 1)
+    return (1 - alpha) ** np.arange(length - 1, -1, -1)
+
+
+# scales the MAD to the std dev for normally distributed data
+MAD_SCALE = 1.4826
+
+
+def get_median_mad_bounds(
+    windows: np.ndarray, zscore: float, skipna: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return robust bounds of the point following each window of points.
+
+    :param windows: array whose last axis holds windows of consecutive
+    points
+    :type windows: np.ndarray
+    :param zscore: number of robust std devs between the median and bounds
+    :type zscore: float
+    :param skipna: whether to ignore missing values in the windows, defaults
+    to False (windows with missing values get NaN bounds)
+    :type skipna: bool, optional
+    :return: lower and upper bounds, with the shape of windows without its
+    last axis
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    # nanmedian is much slower than median, only use it with missing values
+    median_func = (
+        np.nanmedian if skipna and np.isnan(windows).any() else np.median
+    )
+    with warnings.catch_warnings():
+        # windows with only missing values get NaN bounds
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = median_func(windows, axis=-1)
+        mad = median_func(np.abs(windows - median[..., None]), axis=-1)
+    deviation = zscore * MAD_SCALE * mad
+    return median - deviation, median + deviation
+
+
+# floor of each frequency, for comparing datetimes at the frequency's precision
+DATETIME_FLOOR_FREQUENCY = {"D": "D", "daily": "D", "H": "H", "hourly": "H"}
+
+
+def _get_floored_datetimes(dt_values, freq: str) -> np.ndarray:
+    """Return the sorted unique datetimes floored to freq, as int64 nanoseconds."""
+    dt_values = pd.DatetimeIndex(dt_values)
+    if dt_values.tz is not None:
+        # compare wall times, like naive datetimes do
+        dt_values = dt_values.tz_localize(None)
+    return np.unique(dt_values.floor(DATETIME_FLOOR_FREQUENCY[freq]).asi8)
+
+
+def _is_datetime_missing(
+    floored_datetimes: np.ndarray, datetime_obj: datetime, freq: str
+) -> bool:
+    """Return whether datetime_obj is missing from the floored datetimes."""
+    target = _get_floored_datetimes([datetime_obj], freq)[0]
+    pos = np.searchsorted(floored_datetimes, target)
+    return pos == len(floored_datetimes) or floored_datetimes[pos] != target
+
+
 def date_time_checker(input_data, datetime_obj, dt_col, freq):
-    if freq in {"D", "daily"}:
-        temp_dt = input_data[dt_col].apply(
-            lambda val: datetime(val.year, val.month, val.day)
+    """Return whether datetime_obj is missing from dt_col at freq precision."""
+    if freq in DATETIME_FLOOR_FREQUENCY:
+        return bool(
+            _is_datetime_missing(
+                _get_floored_datetimes(input_data[dt_col], freq), datetime_obj, freq
+            )
         )
-        dt_obj = datetime(datetime_obj.year, datetime_obj.month, datetime_obj.day)
-        return dt_obj not in temp_dt.to_list()
 
-    if freq in {"H", "hourly"}:
-        temp_dt = input_data[dt_col].apply(
-            lambda val: datetime(val.year, val.month, val.day, val.hour)
-        )
-        dt_obj = datetime(
-            datetime_obj.year, datetime_obj.month, datetime_obj.day, datetime_obj.hour
+
+def _get_fill_row(
+    dt_col: str, metric_col: str, fill_date: datetime, preagg_count_col: str = None
+) -> pd.DataFrame:
+    """Return a row with a 0 value at fill_date, for filling missing dates."""
+    fill_row = {dt_col: [fill_date], metric_col: [0]}
+    if preagg_count_col:
+        fill_row[preagg_count_col] = [0]
+    return pd.DataFrame(fill_row)
+
+
+def get_fill_dates(
+    last_date: Optional[datetime], period: int, end_date: Optional[datetime], freq: str
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Return the dates fill_data fills with a 0 value if the data misses them.
+
+    :param last_date: last date for which anomaly was computed
+    :type last_date: Optional[datetime]
+    :param period: period of data points to use for training
+    :type period: int
+    :param end_date: end date for anomaly computation
+    :type end_date: Optional[datetime]
+    :param freq: frequency of data
+    :type freq: str
+    :return: start of the training period after last_date and the day of
+    end_date, None if last_date or end_date is None
+    :rtype: Tuple[Optional[datetime], Optional[datetime]]
+    """
+    start_fill_date = None
+    if last_date is not None:
+        start_fill_date = (
+            last_date - get_timedelta(freq, period) + get_timedelta(freq, 1)
         )
-        return dt_obj not in temp_dt.to_list()
+
+    end_fill_date = None
+    if end_date is not None:
+        end_fill_date = datetime(end_date.year, end_date.month, end_date.day)
+
+    return start_fill_date, end_fill_date
 
 
 def fill_data(
@@ -154,43 +318,81 @@ def fill_data(
     :return: filled dataframe
     :rtype: pd.DataFrame
     """
-    input_data = input_data.copy()
-    input_data.loc[:, dt_col] = pd.to_datetime(input_data[dt_col])
+    # a shallow copy, so converting the datetime column doesn't modify the input
+    input_data = input_data.copy(deep=False)
+    if not pd.api.types.is_datetime64_any_dtype(input_data[dt_col]):
+        input_data[dt_col] = pd.to_datetime(input_data[dt_col])
 
-    if last_date is not None:
-        last_date_diff_period = (
-            last_date - get_timedelta(freq, period) + get_timedelta(freq, 1)
-        )
+    if freq not in DATETIME_FLOOR_FREQUENCY or (last_date is None and end_date is None):
+        return input_data
 
-        if date_time_checker(input_data, last_date_diff_period, dt_col, freq):
-            if preagg_count_col:
-                t_df = pd.DataFrame({
-                    dt_col: [last_date_diff_period],
-                    metric_col: [0],
-                    preagg_count_col: [0]
-                })
-            else:
-                t_df = pd.DataFrame({
-                    dt_col: [last_date_diff_period],
-                    metric_col: [0]
-                })
-            input_data = pd.concat([t_df, input_data])
+    floored_datetimes = _get_floored_datetimes(input_data[dt_col], freq)
+    start_fill_date, end_fill_date = get_fill_dates(last_date, period, end_date, freq)
+    start_fill = []
+    end_fill = []
 
-    if end_date is not None:
-        end_datetime = datetime(end_date.year, end_date.month, end_date.day)
-
-        if date_time_checker(input_data, end_datetime, dt_col, freq):
-            if preagg_count_col:
-                t_df = pd.DataFrame({
-                    dt_col: [end_datetime],
-                    metric_col: [0],
-                    preagg_count_col: [0]
-                })
-            else:
-                t_df = pd.DataFrame({
-                    dt_col: [end_datetime],
-                    metric_col: [0]
-                })
-            input_data = pd.concat([input_data, t_df])
-
-    return input_data
+    if start_fill_date is not None:
+        if _is_datetime_missing(floored_datetimes, start_fill_date, freq):
+            start_fill.append(
+                _get_fill_row(dt_col, metric_col, start_fill_date, preagg_count_col)
+            )
+            floored_datetimes = np.union1d(
+                floored_datetimes,
+                _get_floored_datetimes([start_fill_date], freq),
+            )
+
+    if end_fill_date is not None:
+        if _is_datetime_missing(floored_datetimes, end_fill_date, freq):
+            end_fill.append(
+                _get_fill_row(dt_col, metric_col, end_fill_date, preagg_count_col)
+            )
+
+    if not start_fill and not end_fill:
+        return input_data
+    # the whole frame is copied once, with both fill rows
+    return pd.concat([*start_fill, input_data, *end_fill])
+
+
+def fill_resampled_series(
+    values: pd.Series,
+    present: pd.Series,
+    fill_dates: List[Optional[datetime]],
+    agg: str,
+    resample_freq: str,
+) -> pd.Series:
+    """Fill resampled data the same way as fill_data and resampling would.
+
+    Fill dates without data get the aggregate of a 0 value, the series then
+    spans from its first to its last date with data, with missing values in
+    between set to 0.
+
+    :param values: aggregated values, indexed by the resampled datetime
+    :type values: pd.Series
+    :param present: whether the data has points at each datetime of values
+    :type present: pd.Series
+    :param fill_dates: dates to fill if the data misses them, see
+    get_fill_dates
+    :type fill_dates: List[Optional[datetime]]
+    :param agg: aggregation the values were resampled with
+    :type agg: str
+    :param resample_freq: frequency the values were resampled to
+    :type resample_freq: str
+    :return: filled values, NaN outside of the series
+    :rtype: pd.Series
+    """
+    values = values.astype(float)
+    present = present.copy()
+    fill_value = pd.Series([0]).agg(agg)
+    for fill_date in fill_dates:
+        if fill_date is None:
+            continue
+        fill_date = pd.Timestamp(fill_date).floor(resample_freq)
+        if not present[fill_date]:
+            values[fill_date] = fill_value
+            present[fill_date] = True
+
+    present_dates = values.index[present.to_numpy()]
+    in_series = (values.index >= present_dates[0]) & (
+        values.index <= present_dates[-1]
+    )
+    return values.fillna(0).where(in_series)
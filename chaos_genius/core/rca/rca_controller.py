@@ -15,16 +15,25 @@ from chaos_genius.core.rca.constants import (
     TIME_RANGES_BY_KEY,
 )
 from chaos_genius.core.rca.root_cause_analysis import RootCauseAnalysis
-from chaos_genius.core.utils.data_loader import DataLoader
+from chaos_genius.core.utils.data_loader import (
+    PUSHDOWN_COUNT_COLUMN,
+    DataLoader,
+)
 from chaos_genius.core.utils.end_date import load_input_data_end_date
 from chaos_genius.core.utils.round import round_series
+from chaos_genius.databases.bulk_writer import write_dataframe
 from chaos_genius.databases.models.data_source_model import DataSource
-from chaos_genius.databases.models.rca_data_model import RcaData, db
+from chaos_genius.databases.models.rca_data_model import RcaData
 from chaos_genius.settings import (
+    ANALYTICS_CATEGORICAL_DIMENSIONS,
+    ANALYTICS_PUSHDOWN_ENABLED,
+    ANALYTICS_STREAMING_AGGREGATION_ENABLED,
+    DATA_LOADER_FETCH_PARTITIONS,
     DEEPDRILLS_ENABLED,
     DEEPDRILLS_HTABLE_MAX_CHILDREN,
     DEEPDRILLS_HTABLE_MAX_DEPTH,
     DEEPDRILLS_HTABLE_MAX_PARENTS,
+    KPI_DATA_CACHE_ENABLED,
     SUMMARY_DEEPDRILLS_ENABLED_TIME_RANGES,
 )
 
@@ -60,6 +69,20 @@ class RootCauseAnalysisController:
         self._preaggregated = conn_type == "Druid"
         self._preaggregated_count_col = self.kpi_info["count_column"]
 
+        # sum and count KPIs are aggregated in the data source itself, the
+        # loaded data then has the same shape as preaggregated data.
+        self._pushdown = (
+            (ANALYTICS_PUSHDOWN_ENABLED or ANALYTICS_STREAMING_AGGREGATION_ENABLED)
+            and not self._preaggregated
+            and self.kpi_info["aggregation"] in {"sum", "count"}
+        )
+        if self._pushdown:
+            self._preaggregated = True
+            self._preaggregated_count_col = PUSHDOWN_COUNT_COLUMN
+        # without pushdown in the database, the same aggregates are computed
+        # while streaming the raw rows in chunks.
+        self._stream_aggregation = self._pushdown and not ANALYTICS_PUSHDOWN_ENABLED
+
         self.end_date = load_input_data_end_date(kpi_info, end_date)
         logger.info(f"RCA Controller end date: {self.end_date}")
 
@@ -90,16 +113,30 @@ class RootCauseAnalysisController:
             curr_end_date,
         ) = TIME_RANGES_BY_KEY[timeline]["function"](self.end_date)
 
+        # the time ranges are filtered in the query and RCA does not use the
+        # datetime column, so daily rollups are sufficient here.
+        pushdown_frequency = "D" if self._pushdown else None
+
         base_df = DataLoader(
             self.kpi_info,
             end_date=prev_end_date,
             start_date=prev_start_date,
+            pushdown_frequency=pushdown_frequency,
+            use_cache=KPI_DATA_CACHE_ENABLED,
+            stream_aggregation=self._stream_aggregation,
+            fetch_partitions=DATA_LOADER_FETCH_PARTITIONS,
+            categorical_dimensions=ANALYTICS_CATEGORICAL_DIMENSIONS,
         ).get_data(return_empty=True)
 
         rca_df = DataLoader(
             self.kpi_info,
             end_date=curr_end_date,
             start_date=curr_start_date,
+            pushdown_frequency=pushdown_frequency,
+            use_cache=KPI_DATA_CACHE_ENABLED,
+            stream_aggregation=self._stream_aggregation,
+            fetch_partitions=DATA_LOADER_FETCH_PARTITIONS,
+            categorical_dimensions=ANALYTICS_CATEGORICAL_DIMENSIONS,
         ).get_data(return_empty=True)
 
         if base_df.empty and rca_df.empty:
@@ -152,10 +189,16 @@ class RootCauseAnalysisController:
         :return: dictionary with line data
         :rtype: dict
         """
+        # hourly rollups are resampled to days in the reporting timezone below
         rca_df = DataLoader(
             self.kpi_info,
             end_date=self.end_date,
             days_before=days,
+            pushdown_frequency="H" if self._pushdown else None,
+            use_cache=KPI_DATA_CACHE_ENABLED,
+            stream_aggregation=self._stream_aggregation,
+            fetch_partitions=DATA_LOADER_FETCH_PARTITIONS,
+            categorical_dimensions=ANALYTICS_CATEGORICAL_DIMENSIONS,
         ).get_data()
 
         if self._preaggregated:
@@ -211,6 +254,7 @@ class RootCauseAnalysisController:
             num_dim_combs=self.num_dim_combs,
             preaggregated=self._preaggregated,
             preaggregated_count_col=self._preaggregated_count_col,
+            pushdown=self._pushdown,
         )
 
     def _get_aggregation(self, rca: RootCauseAnalysis) -> dict:
@@ -407,7 +451,7 @@ class RootCauseAnalysisController:
                 continue
 
             try:
-                if self._preaggregated:
+                if self._preaggregated and not self._pushdown:
                     dims = self.kpi_info["dimensions"]
                 else:
                     dims = [None] + self.dimensions
@@ -460,13 +504,7 @@ class RootCauseAnalysisController:
             logger.info(f"Storing output for KPI {kpi_id}")
             output = pd.DataFrame(output)
             output["created_at"] = datetime.now()
-            output.to_sql(
-                RcaData.__tablename__,
-                db.engine,
-                if_exists="append",
-                index=False,
-                chunksize=RcaData.__chunksize__,
-            )
+            write_dataframe(output, RcaData.__tablename__, index=False)
             self._checkpoint_success("Output Storage")
         except Exception as e:  # noqa E722
             logger.error("Error in storing output.", exc_info=e)
@@ -1,12 +1,14 @@
 """Provides utility functions for generating waterfalls."""
 
 from itertools import combinations
-from typing import Tuple
+from typing import TYPE_CHECKING, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
 
 def get_best_subgroups_using_superset_algo(
     df_subgroups: pd.DataFrame,
@@ -92,7 +94,7 @@ def get_waterfall_ylims(trans: pd.DataFrame, col: str) -> Tuple[float, float]:
 
 def waterfall_plot_mpl(
     data_df: pd.DataFrame, col: str, y_lims: Tuple[float, float] = None, rot: int = 0
-) -> plt.Axes:
+) -> "plt.Axes":
     """Plot waterfall and returns a plt.Axes object.
 
     :param data_df: Input Data for plotting
@@ -106,6 +108,9 @@ def waterfall_plot_mpl(
     :return: Waterfall chart
     :rtype: plt.Axes
     """
+    # matplotlib is slow to import and only needed for plotting
+    import matplotlib.pyplot as plt
+
     waterfall_bottom = data_df[col].cumsum().shift(1).fillna(0)
 
     # The steps graphically show the levels
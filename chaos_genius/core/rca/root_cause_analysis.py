@@ -6,9 +6,9 @@ from math import isclose
 from textwrap import wrap
 from typing import Dict, List, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from pandas.api.types import CategoricalDtype, is_categorical_dtype, union_categoricals
 
 from chaos_genius.core.rca.constants import TIME_RANGES_BY_KEY
 from chaos_genius.core.rca.rca_utils.waterfall_utils import (
@@ -20,6 +20,7 @@ from chaos_genius.core.utils.round import round_df, round_number
 from chaos_genius.core.utils.utils import (
     get_subgroup_from_df,
     get_user_string_from_subgroup_dict,
+    is_string_column,
 )
 
 SUPPORTED_AGGREGATIONS = ["mean", "sum", "count"]
@@ -39,6 +40,7 @@ class RootCauseAnalysis:
         agg: str = "mean",
         preaggregated: bool = False,
         preaggregated_count_col: str = "count",
+        pushdown: bool = False,
     ) -> None:
         """Initialize the RCA class.
 
@@ -61,6 +63,10 @@ class RootCauseAnalysis:
         :param preaggregated_count_col: name of the column containing the
         count of the aggregated dataframe, defaults to "count"
         :type preaggregated_count_col: str, optional
+        :param pushdown: whether the dataframes were aggregated by the data
+        loader (sum and count KPIs only), rather than preaggregated in the
+        data source, defaults to False
+        :type pushdown: bool, optional
         """
         self._grp1_df = grp1_df
         self._grp2_df = grp2_df
@@ -99,6 +105,7 @@ class RootCauseAnalysis:
 
         self._preaggregated = preaggregated
         self._preaggregated_count_col = preaggregated_count_col
+        self._pushdown = pushdown
 
     def _initialize_impact_table(self):
         self._create_binned_columns()
@@ -211,6 +218,20 @@ class RootCauseAnalysis:
         self._grp2_df = self._grp2_df.reset_index(drop=True)
         self._grp2_df.index = self._grp2_df.index + len(self._grp1_df)
 
+        # categoricals with different categories are concatenated as objects,
+        # so both groups use the union of their categories
+        for col in self._grp1_df.columns.intersection(self._grp2_df.columns):
+            col1, col2 = self._grp1_df[col], self._grp2_df[col]
+            if is_categorical_dtype(col1) or is_categorical_dtype(col2):
+                dtype = CategoricalDtype(
+                    union_categoricals(
+                        [col1.astype("category"), col2.astype("category")],
+                        sort_categories=True,
+                    ).categories
+                )
+                self._grp1_df[col] = col1.astype(dtype)
+                self._grp2_df[col] = col2.astype(dtype)
+
     def _check_columns(self, cols):
         if isinstance(cols, str):
             cols = [cols]
@@ -219,11 +240,11 @@ class RootCauseAnalysis:
                 raise ValueError(f"Column {col} not in data.")
 
     def _create_binned_columns(self):
-        non_cat_cols = self._full_df.dtypes[self._dims][
-            self._full_df.dtypes[self._dims] != object
+        non_cat_cols = [
+            col for col in self._dims if not is_string_column(self._full_df[col])
         ]
 
-        for col in non_cat_cols.index:
+        for col in non_cat_cols:
             binned_values = pd.qcut(
                 self._full_df[col], 4, duplicates="drop"
             ).astype(str)
@@ -268,22 +289,22 @@ class RootCauseAnalysis:
             if self._agg == "count":
                 # if agg is count, sum across the count column
                 # to get the correct count
-                grp1_df = self._grp1_df.groupby(dim_comb)[
+                grp1_df = self._grp1_df.groupby(dim_comb, observed=True)[
                     self._preaggregated_count_col
                 ].agg(["sum"]).reset_index().rename(columns={"sum": "count"})
-                grp2_df = self._grp2_df.groupby(dim_comb)[
+                grp2_df = self._grp2_df.groupby(dim_comb, observed=True)[
                     self._preaggregated_count_col
                 ].agg(["sum"]).reset_index().rename(columns={"sum": "count"})
             elif self._agg == "sum":
                 # if agg is sum, sum across the sum and count column
                 # to get the correct values
-                grp1_df = self._grp1_df.groupby(dim_comb)[
+                grp1_df = self._grp1_df.groupby(dim_comb, observed=True)[
                     [self._metric, self._preaggregated_count_col]
                 ].sum().reset_index().rename(columns={
                     self._metric: "sum",
                     self._preaggregated_count_col: "count"
                 })
-                grp2_df = self._grp2_df.groupby(dim_comb)[
+                grp2_df = self._grp2_df.groupby(dim_comb, observed=True)[
                     [self._metric, self._preaggregated_count_col]
                 ].sum().reset_index().rename(columns={
                     self._metric: "sum",
@@ -297,17 +318,27 @@ class RootCauseAnalysis:
             agg_list = [self._agg, "count"] if self._agg != "count" else ["count"]
 
             grp1_df = (
-                self._grp1_df.groupby(dim_comb)[self._metric]
+                self._grp1_df.groupby(dim_comb, observed=True)[self._metric]
                 .agg(agg_list)
                 .reset_index()
             )
 
             grp2_df = (
-                self._grp2_df.groupby(dim_comb)[self._metric]
+                self._grp2_df.groupby(dim_comb, observed=True)[self._metric]
                 .agg(agg_list)
                 .reset_index()
             )
 
+        # observed=True groupbys on mixed keys are not sorted and outer merges
+        # order categorical keys differently than object keys, so the (small)
+        # grouped frames are converted to the same shape as for object dims
+        cat_cols = [col for col in dim_comb if is_categorical_dtype(grp1_df[col])]
+        if cat_cols:
+            grp1_df[cat_cols] = grp1_df[cat_cols].astype(object)
+            grp2_df[cat_cols] = grp2_df[cat_cols].astype(object)
+            grp1_df = grp1_df.sort_values(dim_comb, ignore_index=True)
+            grp2_df = grp2_df.sort_values(dim_comb, ignore_index=True)
+
         combined_df = grp1_df.merge(
             grp2_df, how="outer", on=dim_comb, suffixes=["_g1", "_g2"]
         ).fillna(0)
@@ -329,10 +360,13 @@ class RootCauseAnalysis:
 
             combined_df["val" + suffix] = value
             combined_df["size" + suffix] = combined_df[count_name] * 100
-            if i == 0:
-                combined_df["size" + suffix] /= len(self._grp1_df) + EPSILON
-            elif i == 1:
-                combined_df["size" + suffix] /= len(self._grp2_df) + EPSILON
+            grp_df = self._grp1_df if i == 0 else self._grp2_df
+            if self._pushdown:
+                # each row holds the count of many rows of the actual data
+                grp_len = grp_df[self._preaggregated_count_col].sum()
+            else:
+                grp_len = len(grp_df)
+            combined_df["size" + suffix] /= grp_len + EPSILON
 
         (
             combined_df["val_g1"],
@@ -408,6 +442,9 @@ class RootCauseAnalysis:
                     elif self._agg == "sum":
                         grp1_val = t_d1[self._metric].sum()
                         grp2_val = t_d2[self._metric].sum()
+                    elif self._agg == "count" and self._pushdown:
+                        grp1_val = t_d1[self._preaggregated_count_col].sum()
+                        grp2_val = t_d2[self._preaggregated_count_col].sum()
                     elif self._agg == "count":
                         grp1_val = t_d1[self._metric].count()
                         grp2_val = t_d2[self._metric].count()
@@ -503,6 +540,8 @@ class RootCauseAnalysis:
         )
 
         if plot_in_mpl:
+            import matplotlib.pyplot as plt
+
             print("plot")
             waterfall_plot_mpl(
                 pd.DataFrame(
@@ -0,0 +1,135 @@
+"""Provides incremental aggregation of KPI data loaded in chunks."""
+
+from typing import List, Optional
+
+import pandas as pd
+
+# minimum number of partially aggregated rows after which they are folded
+# together. They are only folded once they are also twice as many as the rows
+# left by the last fold, so large aggregates are not regrouped for every chunk.
+COMPACT_THRESHOLD = 200000
+
+
+class ChunkAggregator:
+    """Fold dataframe chunks into running per-timestamp, per-subgroup aggregates.
+
+    Each chunk is aggregated by the floored datetime column and the group
+    columns as soon as it is added, so only the aggregates (and never all the
+    raw rows) are held in memory.
+    """
+
+    def __init__(
+        self,
+        dt_col: str,
+        metric_col: str,
+        group_cols: List[str],
+        frequency: str,
+        count_col: str,
+        min_col: Optional[str] = None,
+        max_col: Optional[str] = None,
+    ):
+        """Initialize the aggregator.
+
+        :param dt_col: datetime column, floored to the frequency
+        :type dt_col: str
+        :param metric_col: metric column to aggregate
+        :type metric_col: str
+        :param group_cols: columns to group by along with the datetime column
+        :type group_cols: List[str]
+        :param frequency: frequency to floor the datetime column to
+        :type frequency: str
+        :param count_col: output column for the count of the metric
+        :type count_col: str
+        :param min_col: output column for the min of the metric. If min_col and
+        max_col are None, only counts are computed (and the metric column
+        holds the count as well), defaults to None
+        :type min_col: str, optional
+        :param max_col: output column for the max of the metric, defaults to
+        None
+        :type max_col: str, optional
+        """
+        self.dt_col = dt_col
+        self.metric_col = metric_col
+        self.group_cols = [dt_col] + [col for col in group_cols if col != dt_col]
+        self.frequency = frequency
+        self.count_col = count_col
+        self.min_col = min_col
+        self.max_col = max_col
+        self.count_only = min_col is None and max_col is None
+
+        self._partials: List[pd.DataFrame] = []
+        self._partial_rows = 0
+        self._compacted_rows = 0
+
+    def _aggregate(self, df: pd.DataFrame, agg_dict: dict) -> pd.DataFrame:
+        return (
+            df.groupby(self.group_cols, dropna=False, sort=False)
+            .agg(**agg_dict)
+            .reset_index()
+        )
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """Fold a chunk of (preprocessed) data into the aggregates.
+
+        :param chunk: chunk with the datetime, group and metric columns
+        :type chunk: pd.DataFrame
+        """
+        if len(chunk) == 0:
+            return
+
+        chunk = chunk[
+            list(dict.fromkeys(self.group_cols + [self.metric_col]))
+        ].copy()
+        chunk[self.dt_col] = chunk[self.dt_col].dt.floor(self.frequency)
+
+        if self.count_only:
+            agg_dict = {self.count_col: (self.metric_col, "count")}
+        else:
+            agg_dict = {
+                self.metric_col: (self.metric_col, "sum"),
+                self.count_col: (self.metric_col, "count"),
+                self.min_col: (self.metric_col, "min"),
+                self.max_col: (self.metric_col, "max"),
+            }
+        partial = self._aggregate(chunk, agg_dict)
+
+        self._partials.append(partial)
+        self._partial_rows += len(partial)
+        if self._partial_rows > max(COMPACT_THRESHOLD, 2 * self._compacted_rows):
+            self._compact()
+
+    def _compact(self) -> None:
+        if len(self._partials) <= 1:
+            return
+
+        combined = pd.concat(self._partials, ignore_index=True)
+        if self.count_only:
+            agg_dict = {self.count_col: (self.count_col, "sum")}
+        else:
+            agg_dict = {
+                self.metric_col: (self.metric_col, "sum"),
+                self.count_col: (self.count_col, "sum"),
+                self.min_col: (self.min_col, "min"),
+                self.max_col: (self.max_col, "max"),
+            }
+        compacted = self._aggregate(combined, agg_dict)
+
+        self._partials = [compacted]
+        self._partial_rows = len(compacted)
+        self._compacted_rows = len(compacted)
+
+    def result(self) -> pd.DataFrame:
+        """Return the aggregates of all chunks added so far.
+
+        :return: one row per floored timestamp and subgroup, empty if no rows
+        were added
+        :rtype: pd.DataFrame
+        """
+        if not self._partials:
+            return pd.DataFrame()
+
+        self._compact()
+        df = self._partials[0]
+        if self.count_only:
+            df[self.metric_col] = df[self.count_col]
+        return df
@@ -0,0 +1,244 @@
+"""Provides a local Parquet cache of KPI data, partitioned by date."""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import pandas as pd
+
+from chaos_genius.settings import (
+    KPI_DATA_CACHE_DIR,
+    KPI_DATA_CACHE_RESTATEMENT_DAYS,
+    KPI_DATA_CACHE_RETENTION_DAYS,
+    TIMEZONE,
+)
+
+logger = logging.getLogger(__name__)
+
+# KPI fields which change the data returned by the data loader
+FINGERPRINT_FIELDS = [
+    "data_source",
+    "kpi_type",
+    "kpi_query",
+    "schema_name",
+    "table_name",
+    "metric",
+    "aggregation",
+    "datetime_column",
+    "count_column",
+    "dimensions",
+    "filters",
+    "timezone_aware",
+]
+
+META_FILE_NAME = "meta.json"
+
+
+def _to_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _get_kpi_cache_dir(kpi_id: int) -> str:
+    return os.path.join(KPI_DATA_CACHE_DIR, str(kpi_id))
+
+
+def invalidate_kpi_data_cache(kpi_id: int) -> None:
+    """Delete all cached data of a KPI.
+
+    :param kpi_id: ID of the KPI
+    :type kpi_id: int
+    """
+    shutil.rmtree(_get_kpi_cache_dir(kpi_id), ignore_errors=True)
+    logger.info(f"Invalidated data cache for KPI {kpi_id}")
+
+
+class KpiDataCache:
+    """Local cache of (preprocessed) KPI data with one Parquet file per day.
+
+    The cache covers a contiguous range of days, from its low-water mark to
+    its high-water mark. Days are in the reporting timezone, same as the
+    datetime column of the data loader output.
+    """
+
+    def __init__(self, kpi_info: dict, pushdown_frequency: Optional[str] = None):
+        """Initialize the cache for a KPI.
+
+        If the KPI definition (or the reporting timezone) changed since the
+        cache was written, the cached data is discarded.
+
+        :param kpi_info: kpi info to cache data for
+        :type kpi_info: dict
+        :param pushdown_frequency: pushdown frequency of the data loader, data
+        with different frequencies is cached separately, defaults to None
+        :type pushdown_frequency: str, optional
+        """
+        self.dt_col = kpi_info["datetime_column"]
+        self.path = os.path.join(
+            _get_kpi_cache_dir(kpi_info["id"]), pushdown_frequency or "raw"
+        )
+
+        fingerprint = {field: kpi_info.get(field) for field in FINGERPRINT_FIELDS}
+        fingerprint["reporting_timezone"] = TIMEZONE
+        self.fingerprint = hashlib.sha256(
+            json.dumps(fingerprint, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        self.low_date: Optional[date] = None
+        self.high_date: Optional[date] = None
+
+        meta = self._read_meta()
+        if meta.get("fingerprint") == self.fingerprint:
+            self.low_date = date.fromisoformat(meta["low_date"])
+            self.high_date = date.fromisoformat(meta["high_date"])
+        elif os.path.exists(self.path):
+            logger.info(f"Discarding outdated data cache at {self.path}")
+            self.clear()
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.path, META_FILE_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self):
+        meta_path = os.path.join(self.path, META_FILE_NAME)
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "low_date": self.low_date.isoformat(),
+                    "high_date": self.high_date.isoformat(),
+                },
+                f,
+            )
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def _get_partition_path(self, day: date) -> str:
+        return os.path.join(self.path, f"{day.isoformat()}.parquet")
+
+    def clear(self):
+        """Delete all partitions and reset the cached range."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.low_date = None
+        self.high_date = None
+
+    def get_fetch_start(self, start_date: date, end_date: date) -> date:
+        """Return the date from which data needs to be fetched from the source.
+
+        Data in [start_date, fetch start) can be read from the cache. The last
+        KPI_DATA_CACHE_RESTATEMENT_DAYS days of the cache are always fetched
+        again, since the source might have restated or appended to them.
+
+        :param start_date: start of the requested range (inclusive)
+        :type start_date: date
+        :param end_date: end of the requested range (exclusive)
+        :type end_date: date
+        :return: start of the range to fetch, end_date if nothing is to be
+        fetched
+        :rtype: date
+        """
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        if (
+            self.low_date is None
+            or start_date < self.low_date
+            or start_date > self.high_date
+        ):
+            return start_date
+
+        restated_from = self.high_date - timedelta(
+            days=KPI_DATA_CACHE_RESTATEMENT_DAYS - 1
+        )
+        return min(max(start_date, restated_from), end_date)
+
+    def read(self, start_date: date, end_date: date) -> pd.DataFrame:
+        """Return the cached data in [start_date, end_date).
+
+        :param start_date: start date (inclusive)
+        :type start_date: date
+        :param end_date: end date (exclusive)
+        :type end_date: date
+        :return: cached data, empty if no cached day has data
+        :rtype: pd.DataFrame
+        """
+        day, end_date = _to_date(start_date), _to_date(end_date)
+        dfs = []
+        while day < end_date:
+            partition_path = self._get_partition_path(day)
+            if os.path.exists(partition_path):
+                dfs.append(pd.read_parquet(partition_path))
+            day += timedelta(days=1)
+
+        if not dfs:
+            return pd.DataFrame()
+        return pd.concat(dfs, ignore_index=True)
+
+    def write(self, df: pd.DataFrame, start_date: date, end_date: date):
+        """Replace the cached data in [start_date, end_date) with df.
+
+        Days in the range without any rows in df are marked as fetched, but
+        have no partition.
+
+        :param df: preprocessed data fetched for the range
+        :type df: pd.DataFrame
+        :param start_date: start date (inclusive)
+        :type start_date: date
+        :param end_date: end date (exclusive)
+        :type end_date: date
+        :raises ValueError: Raises error if df has rows outside of the range,
+        the cache would otherwise lose or duplicate them on read
+        """
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        if start_date >= end_date:
+            return
+
+        day_groups = {}
+        if len(df) != 0:
+            days = df[self.dt_col].dt.date
+            if days.min() < start_date or days.max() >= end_date:
+                raise ValueError(
+                    f"Data from {days.min()} to {days.max()} is outside of the "
+                    + f"fetched range [{start_date}, {end_date})"
+                )
+            day_groups = dict(list(df.groupby(days)))
+
+        last_date = end_date - timedelta(days=1)
+        if self.low_date is None or (
+            start_date > self.high_date + timedelta(days=1)
+            or last_date < self.low_date - timedelta(days=1)
+        ):
+            # the cache only tracks a contiguous range of days
+            self.clear()
+            self.low_date, self.high_date = start_date, last_date
+        else:
+            self.low_date = min(self.low_date, start_date)
+            self.high_date = max(self.high_date, last_date)
+
+        os.makedirs(self.path, exist_ok=True)
+
+        day = start_date
+        while day < end_date:
+            partition_path = self._get_partition_path(day)
+            if day in day_groups:
+                day_groups[day].to_parquet(f"{partition_path}.tmp", index=False)
+                os.replace(f"{partition_path}.tmp", partition_path)
+            elif os.path.exists(partition_path):
+                os.remove(partition_path)
+            day += timedelta(days=1)
+
+        self._prune()
+        self._write_meta()
+
+    def _prune(self):
+        retention_start = self.high_date - timedelta(
+            days=KPI_DATA_CACHE_RETENTION_DAYS
+        )
+        while self.low_date < retention_start:
+            partition_path = self._get_partition_path(self.low_date)
+            if os.path.exists(partition_path):
+                os.remove(partition_path)
+            self.low_date += timedelta(days=1)
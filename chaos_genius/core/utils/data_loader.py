@@ -1,22 +1,44 @@
 """Provides utilties for loading data from KPIs."""
 
-import contextlib
+import copy
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 import pytz
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
 
 from chaos_genius.connectors import get_sqla_db_conn
+from chaos_genius.core.utils.chunk_aggregator import ChunkAggregator
 from chaos_genius.core.utils.constants import SUPPORTED_TIMEZONES
-from chaos_genius.core.utils.utils import randomword
+from chaos_genius.core.utils.data_cache import KpiDataCache
 from chaos_genius.databases.models.data_source_model import DataSource
-from chaos_genius.settings import TIMEZONE
+from chaos_genius.settings import DATA_SOURCE_MAX_CONCURRENT_QUERIES, TIMEZONE
+from chaos_genius.utils.datetime_helper import get_tz_from_offset_str
 
 logger = logging.getLogger(__name__)
 
+PUSHDOWN_COUNT_COLUMN = "cg_pushdown_count"
+PUSHDOWN_MIN_COLUMN = "cg_pushdown_min"
+PUSHDOWN_MAX_COLUMN = "cg_pushdown_max"
+KPI_QUERY_ALIAS = "cg_kpi_query"
+
+# caps the partitioned fetches running in parallel against a data source
+_DATA_SOURCE_SEMAPHORES: Dict[int, threading.BoundedSemaphore] = {}
+_DATA_SOURCE_SEMAPHORES_LOCK = threading.Lock()
+
+
+def _get_data_source_semaphore(data_source_id: int) -> threading.BoundedSemaphore:
+    with _DATA_SOURCE_SEMAPHORES_LOCK:
+        if data_source_id not in _DATA_SOURCE_SEMAPHORES:
+            _DATA_SOURCE_SEMAPHORES[data_source_id] = threading.BoundedSemaphore(
+                DATA_SOURCE_MAX_CONCURRENT_QUERIES
+            )
+        return _DATA_SOURCE_SEMAPHORES[data_source_id]
+
 
 class DataLoader:
     """Data Loader Class."""
@@ -29,6 +51,11 @@ class DataLoader:
         days_before: Optional[int] = None,
         tail: Optional[int] = None,
         validation: bool = False,
+        pushdown_frequency: Optional[str] = None,
+        use_cache: bool = False,
+        stream_aggregation: bool = False,
+        fetch_partitions: int = 1,
+        categorical_dimensions: bool = False,
     ):
         """Initialize Data Loader for KPI.
 
@@ -52,12 +79,43 @@ class DataLoader:
         :type tail: int, optional
         :param validation: if validation is True, we do not perform preprocessing
         :type validation: bool, optional
+        :param pushdown_frequency: if set to "H" or "D", the data is aggregated
+        in the database by the truncated datetime column and the KPI dimensions.
+        The metric column then holds the sum of the metric (or the count for
+        count KPIs), and the count, min and max are returned in the
+        PUSHDOWN_*_COLUMN columns, defaults to None
+        :type pushdown_frequency: str, optional
+        :param use_cache: if use_cache is True, data is read from the local KPI
+        data cache and only the days missing from it (and the restated days)
+        are fetched from the data source. Only used when both start and end
+        date are known, defaults to False
+        :type use_cache: bool, optional
+        :param stream_aggregation: if stream_aggregation is True, the
+        pushdown_frequency aggregates are computed while streaming the raw
+        rows from the data source in chunks, instead of in the database. The
+        raw data then never has to fit into memory, defaults to False
+        :type stream_aggregation: bool, optional
+        :param fetch_partitions: if greater than 1, the date range is split into
+        (at most) this many sub-ranges of whole days, which are fetched in
+        parallel and concatenated in order. At most
+        DATA_SOURCE_MAX_CONCURRENT_QUERIES of these fetches run at once per
+        data source, defaults to 1
+        :type fetch_partitions: int, optional
+        :param categorical_dimensions: if True, string dimension columns are
+        converted to pandas categoricals, so each distinct value is stored
+        once and groupbys work on integer codes, defaults to False
+        :type categorical_dimensions: bool, optional
         :raises ValueError: Raises error if start_date, end_date and days_before
         not in accepted combinations
         """
         self.kpi_info = kpi_info
         self.tail = tail
         self.validation = validation
+        self.pushdown_frequency = pushdown_frequency
+        self.use_cache = use_cache
+        self.stream_aggregation = stream_aggregation
+        self.fetch_partitions = fetch_partitions
+        self.categorical_dimensions = categorical_dimensions
 
         self.end_date = end_date
         self.start_date = start_date
@@ -113,6 +171,19 @@ class DataLoader:
         )
         self.identifier = self.db_connection.sql_identifier
 
+        if (
+            self.pushdown_frequency is not None
+            and not self.stream_aggregation
+            and not self._is_database_truncation_exact()
+        ):
+            # the aggregates are computed after converting to the reporting
+            # timezone instead, as the database's buckets would be off
+            logger.info(
+                f"Aggregating KPI {self.kpi_info['id']} data while streaming, "
+                + "as the database can't truncate it in the reporting timezone"
+            )
+            self.stream_aggregation = True
+
     def _get_id_string(self, value):
         value = self.db_connection.resolve_identifier(value)
         return f"{self.identifier}{value}{self.identifier}"
@@ -165,29 +236,63 @@ class DataLoader:
 
         return filters
 
+    def _get_reporting_timezone(self):
+        # TODO: Deprecate SUPPORTED_TIMEZONES over releases.
+        # maps the abbreviations to respective tz regions
+        if TIMEZONE in SUPPORTED_TIMEZONES:
+            return self._get_tz_from_offset_str(SUPPORTED_TIMEZONES[TIMEZONE])
+        return TIMEZONE
+
+    def _is_database_truncation_exact(self) -> bool:
+        """Check if the database truncates datetimes to the reporting buckets.
+
+        Unaware datetimes are truncated in the database timezone, but the
+        buckets must be hours or days of the reporting timezone. The two
+        agree when the UTC offsets of the timezones differ by whole buckets
+        (whole hours for "H", none for "D") over the whole date range, with
+        some margin. Data sources which truncate timestamp columns in UTC
+        return them as unaware UTC datetimes, so they also need a database
+        timezone at UTC.
+        """
+        if self.kpi_info.get("timezone_aware"):
+            # aware datetimes are truncated in the database session's timezone
+            return False
+        if self.start_date is None or self.end_date is None:
+            return False
+
+        instants = pd.date_range(
+            pd.Timestamp(self.start_date) - timedelta(days=2),
+            pd.Timestamp(self.end_date) + timedelta(days=2),
+            freq="15min",
+            tz="UTC",
+        )
+        database_times = instants.tz_convert(
+            self.connection_info["database_timezone"]
+        ).tz_localize(None)
+        if self.db_connection.sql_date_trunc_in_utc and (
+            database_times != instants.tz_localize(None)
+        ).any():
+            return False
+
+        reporting_times = instants.tz_convert(
+            self._get_reporting_timezone()
+        ).tz_localize(None)
+        bucket = pd.Timedelta(1, unit=self.pushdown_frequency)
+        return bool(
+            ((database_times - reporting_times) % bucket == pd.Timedelta(0)).all()
+        )
+
     def _get_tz_from_offset_str(self, utc_offset_str="GMT+00:00"):
-        # TODO: Move to utils file
-        # TODO: Write tests for this
-        sign = -1 if utc_offset_str[-6] == "-" else 1
-        utc_offset_mins = int(utc_offset_str[-2:]) * sign
-        utc_offset_hrs = int(utc_offset_str[-5:-3]) * sign
-
-        utc_offset = timedelta(hours=utc_offset_hrs, minutes=utc_offset_mins)
-
-        timezones = pytz.all_timezones
-        for tz_name in timezones:
-            # TODO: use getattr here with a default value instead of supressing
-            with contextlib.suppress(AttributeError):
-                tz = pytz.timezone(tz_name)
-                tz_offset = tz._transition_info[-1][0]
-                if utc_offset == tz_offset:
-                    return tz
-        raise ValueError(f"No timezone found for offset {utc_offset_str}")
+        tz = get_tz_from_offset_str(utc_offset_str)
+        if tz is None:
+            raise ValueError(f"No timezone found for offset {utc_offset_str}")
+        return tz
 
     def _get_table_name(self):
         if self.kpi_info["kpi_type"] != "table":
+            # a fixed alias keeps the query (and so its cache key) deterministic
             return f"({self.kpi_info['kpi_query']}) as " \
-                + f"{self._get_id_string(randomword(10))}"
+                + f"{self._get_id_string(KPI_QUERY_ALIAS)}"
         table_name = self._get_id_string(self.kpi_info["table_name"])
         schema_name = self.kpi_info.get("schema_name", None)
         if schema_name:
@@ -195,29 +300,86 @@ class DataLoader:
             return f"{schema_name}.{table_name}"
         return table_name
 
-    def _build_query(self, count=False):
+    def _build_projection(self) -> str:
+        # validation checks for missing columns, so it needs all of them
+        if self.validation:
+            return "*"
+
+        columns = [self.dt_col, self.kpi_info["metric"]]
+        columns.extend(self.kpi_info.get("dimensions") or [])
+        if self.kpi_info.get("count_column"):
+            columns.append(self.kpi_info["count_column"])
+
+        # dict.fromkeys removes duplicates while keeping the order
+        return ", ".join(
+            self._get_id_string(column) for column in dict.fromkeys(columns)
+        )
+
+    def _build_pushdown_columns(self):
+        dt_col_str = self._get_id_string(self.dt_col)
+        dt_trunc = self.db_connection.sql_date_trunc[
+            self.pushdown_frequency
+        ].format(dt_col_str)
+
+        group_by = [dt_trunc] + [
+            self._get_id_string(dim)
+            for dim in self.kpi_info.get("dimensions", [])
+        ]
+
+        metric_str = self._get_id_string(self.kpi_info["metric"])
+        count_str = self._get_id_string(PUSHDOWN_COUNT_COLUMN)
+        if self.kpi_info["aggregation"] == "count":
+            # metric can be categorical for count KPIs, so we only count it
+            aggregations = [
+                f"count({metric_str}) as {metric_str}",
+                f"count({metric_str}) as {count_str}",
+            ]
+        else:
+            min_str = self._get_id_string(PUSHDOWN_MIN_COLUMN)
+            max_str = self._get_id_string(PUSHDOWN_MAX_COLUMN)
+            aggregations = [
+                f"sum({metric_str}) as {metric_str}",
+                f"count({metric_str}) as {count_str}",
+                f"min({metric_str}) as {min_str}",
+                f"max({metric_str}) as {max_str}",
+            ]
+
+        select = [f"{dt_trunc} as {dt_col_str}"] + group_by[1:] + aggregations
+        return select, group_by
+
+    def _build_query(self, count=False, last_date=False):
         table_name = self._get_table_name()
 
         all_filters = []
 
         all_filters.extend(self._build_date_filter())
 
+        group_by = []
         if count:
             query = f"select count(*) from {table_name}"
+        elif last_date:
+            dt_col_str = self._get_id_string(self.dt_col)
+            query = f"select max({dt_col_str}) as {dt_col_str} from {table_name}"
+        elif self.pushdown_frequency is not None and not self.stream_aggregation:
+            select, group_by = self._build_pushdown_columns()
+            query = f"select {', '.join(select)} from {table_name}"
         else:
-            query = f"select * from {table_name}"
+            query = f"select {self._build_projection()} from {table_name}"
 
         if all_filters:
             query += " where "
             query += " and ".join(all_filters)
 
+        if group_by:
+            query += " group by " + ", ".join(group_by)
+
         if self.tail is not None:
             query += f" limit {self.tail}"
 
         return query
 
-    def _run_query(self, query):
-        return self.db_connection.run_query(query)
+    def _run_query(self, query, use_cache=True):
+        return self.db_connection.run_cached_query(query, use_cache=use_cache)
 
     def _prepare_date_column(self, df):
         if is_datetime(df[self.dt_col]):
@@ -243,23 +405,21 @@ class DataLoader:
                 self.connection_info["database_timezone"]
             )
 
-        # TODO: Deprecate SUPPORTED_TIMEZONES over releases.
-        # maps the abbreviations to respective tz regions
-        if TIMEZONE in SUPPORTED_TIMEZONES:
-            tz_to_convert_to = self._get_tz_from_offset_str(
-                SUPPORTED_TIMEZONES[TIMEZONE]
-            )
-        else:
-            tz_to_convert_to = TIMEZONE
-
         # convert to reporting timezone
         # and then strip tz information
         df[self.dt_col] = (
             df[self.dt_col]
-            .dt.tz_convert(tz_to_convert_to)
+            .dt.tz_convert(self._get_reporting_timezone())
             .dt.tz_localize(None)
         )
 
+    def _encode_dimensions(self, df: pd.DataFrame) -> None:
+        for dim in self.kpi_info.get("dimensions") or []:
+            if dim in (self.dt_col, self.kpi_info["metric"]):
+                continue
+            if df[dim].dtype == object:
+                df[dim] = df[dim].astype("category")
+
     def get_count(self) -> int:
         """Return count of rows in KPI data."""
         query = self._build_query(count=True)
@@ -270,6 +430,29 @@ class DataLoader:
         df = self._run_query(query)
         return df.iloc[0, 0]
 
+    def get_last_date(self) -> Optional[date]:
+        """Return the last date (in the reporting timezone) with KPI data.
+
+        Runs a single max() query over the date range of the data loader.
+
+        :return: last date with data, None if there is no data in the range
+        :rtype: Optional[date]
+        """
+        query = self._build_query(last_date=True)
+        logger.info(
+            f"Created query for KPI {self.kpi_info['id']}",
+            extra={"data_query": query},
+        )
+        # newly arrived data must be seen, so this is never read from the cache
+        df = self._run_query(query, use_cache=False)
+        if len(df) == 0 or pd.isna(df.iloc[0, 0]):
+            return None
+
+        df.columns = [self.dt_col]
+        self._prepare_date_column(df)
+        self._preprocess_df(df)
+        return df[self.dt_col].iloc[0].date()
+
     def _get_data_stats(self, df: pd.DataFrame) -> None:
         return {
             "total_rows": len(df),
@@ -281,6 +464,159 @@ class DataLoader:
             ],
         }
 
+    def _get_partition_ranges(self) -> List[Tuple[date, date]]:
+        if (
+            self.fetch_partitions <= 1
+            or self.validation
+            or self.tail is not None
+            or self.start_date is None
+            or self.end_date is None
+        ):
+            return []
+
+        # the date filters only use the date part of start and end date
+        start_date = pd.Timestamp(self.start_date).date()
+        end_date = pd.Timestamp(self.end_date).date()
+        num_days = (end_date - start_date).days
+        num_partitions = min(self.fetch_partitions, num_days)
+        if num_partitions <= 1:
+            return []
+
+        bounds = [
+            start_date + timedelta(days=num_days * i // num_partitions)
+            for i in range(num_partitions + 1)
+        ]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _load_partition(self, date_range: Tuple[date, date]) -> pd.DataFrame:
+        loader = copy.copy(self)
+        loader.start_date, loader.end_date = date_range
+        loader.fetch_partitions = 1
+        with _get_data_source_semaphore(self.connection_info["id"]):
+            return loader._load_data()
+
+    def _load_partitioned_data(
+        self, date_ranges: List[Tuple[date, date]]
+    ) -> pd.DataFrame:
+        max_workers = min(len(date_ranges), DATA_SOURCE_MAX_CONCURRENT_QUERIES)
+        logger.info(
+            f"Loading KPI {self.kpi_info['id']} data in {len(date_ranges)} "
+            + f"partitions with {max_workers} workers"
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map returns the results in the order of the date ranges
+            dfs = [
+                df
+                for df in executor.map(self._load_partition, date_ranges)
+                if len(df) != 0
+            ]
+
+        if not dfs:
+            return pd.DataFrame()
+        return pd.concat(dfs, ignore_index=True)
+
+    def _load_data(self) -> pd.DataFrame:
+        date_ranges = self._get_partition_ranges()
+        if date_ranges:
+            return self._load_partitioned_data(date_ranges)
+
+        query = self._build_query()
+        logger.info(
+            f"Created query for KPI {self.kpi_info['id']}",
+            extra={"data_query": query},
+        )
+
+        if self.pushdown_frequency is not None and self.stream_aggregation:
+            return self._load_aggregated_data(query)
+
+        df = self._run_query(query)
+
+        if len(df) != 0:
+            self._prepare_date_column(df)
+            if not self.validation:
+                self._preprocess_df(df)
+
+        return df
+
+    def _load_aggregated_data(self, query: str) -> pd.DataFrame:
+        if self.kpi_info["aggregation"] == "count":
+            min_col, max_col = None, None
+        else:
+            min_col, max_col = PUSHDOWN_MIN_COLUMN, PUSHDOWN_MAX_COLUMN
+
+        aggregator = ChunkAggregator(
+            dt_col=self.dt_col,
+            metric_col=self.kpi_info["metric"],
+            group_cols=self.kpi_info.get("dimensions") or [],
+            frequency=self.pushdown_frequency,
+            count_col=PUSHDOWN_COUNT_COLUMN,
+            min_col=min_col,
+            max_col=max_col,
+        )
+        for chunk in self.db_connection.iter_query_chunks(query):
+            if len(chunk) == 0:
+                continue
+            self._prepare_date_column(chunk)
+            self._preprocess_df(chunk)
+            aggregator.add(chunk)
+
+        return aggregator.result()
+
+    def _load_range(self, start_date: date, end_date: date) -> pd.DataFrame:
+        # the copy shares the db connection, end_date is exclusive here
+        loader = copy.copy(self)
+        loader.start_date = start_date
+        loader.end_date = end_date
+        loader.use_cache = False
+        return loader._load_data()
+
+    def _load_data_with_cache(self) -> pd.DataFrame:
+        # the date filters only use the date part of start and end date
+        start_date = pd.Timestamp(self.start_date).date()
+        end_date = pd.Timestamp(self.end_date).date()
+
+        cache = KpiDataCache(self.kpi_info, self.pushdown_frequency)
+        fetch_start = cache.get_fetch_start(start_date, end_date)
+
+        try:
+            cached_df = cache.read(start_date, fetch_start)
+        except Exception:  # noqa: B902
+            logger.warning(
+                f"Could not read data cache for KPI {self.kpi_info['id']}",
+                exc_info=True,
+            )
+            cache.clear()
+            fetch_start = start_date
+            cached_df = pd.DataFrame()
+
+        if fetch_start >= end_date:
+            fetched_df = pd.DataFrame()
+        else:
+            fetched_df = self._load_range(fetch_start, end_date)
+            try:
+                cache.write(fetched_df, fetch_start, end_date)
+            except Exception:  # noqa: B902
+                # caching must never fail the analytics, we just refetch later
+                logger.warning(
+                    f"Could not write data cache for KPI {self.kpi_info['id']}",
+                    exc_info=True,
+                )
+                cache.clear()
+
+        logger.info(
+            f"Loaded KPI {self.kpi_info['id']} data with cache",
+            extra={
+                "cached_rows": len(cached_df),
+                "fetched_rows": len(fetched_df),
+            },
+        )
+
+        if len(cached_df) == 0:
+            return fetched_df
+        if len(fetched_df) == 0:
+            return cached_df
+        return pd.concat([cached_df, fetched_df], ignore_index=True)
+
     def get_data(self, return_empty=False) -> pd.DataFrame:
         """Return dataframe with KPI data.
 
@@ -289,12 +625,16 @@ class DataLoader:
         """
         kpi_id = self.kpi_info["id"]
 
-        query = self._build_query()
-        logger.info(
-            f"Created query for KPI {kpi_id}", extra={"data_query": query}
-        )
-
-        df = self._run_query(query)
+        if (
+            self.use_cache
+            and not self.validation
+            and self.tail is None
+            and self.start_date is not None
+            and self.end_date is not None
+        ):
+            df = self._load_data_with_cache()
+        else:
+            df = self._load_data()
 
         if len(df) == 0:
             if return_empty:
@@ -302,10 +642,9 @@ class DataLoader:
                 return df
             raise ValueError("Dataframe is empty.")
 
-        self._prepare_date_column(df)
-
         if not self.validation:
-            self._preprocess_df(df)
+            if self.categorical_dimensions:
+                self._encode_dimensions(df)
 
             data_stats = self._get_data_stats(df)
             logger.info(
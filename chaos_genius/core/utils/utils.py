@@ -2,9 +2,11 @@
 
 import random
 import string
-from typing import Dict
+from typing import Dict, Tuple
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_categorical_dtype
 
 
 def randomword(length: int) -> str:
@@ -13,6 +15,13 @@ def randomword(length: int) -> str:
     return "".join(random.choice(letters) for _ in range(length))
 
 
+def is_string_column(series: pd.Series) -> bool:
+    """Return True for object columns and categorical columns of objects."""
+    if is_categorical_dtype(series):
+        return series.cat.categories.dtype == object
+    return series.dtype == object
+
+
 def get_subgroup_from_df(df: pd.DataFrame, d: Dict[str, str]) -> pd.DataFrame:
     """Return the rows of a dataframe that match the given dictionary.
 
@@ -21,6 +30,48 @@ def get_subgroup_from_df(df: pd.DataFrame, d: Dict[str, str]) -> pd.DataFrame:
     return df[(df.loc[:, d.keys()] == d.values()).all(axis=1)]
 
 
+class SubgroupIndex:
+    """Row positions of the subgroups of a dataframe.
+
+    The dataframe is grouped once for each set of dimensions, instead of
+    comparing all of its rows with each subgroup as get_subgroup_from_df does.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """Initialize the index.
+
+        :param df: dataframe to find the subgroups in
+        :type df: pd.DataFrame
+        """
+        self.df = df
+        self._indices: Dict[Tuple[str, ...], dict] = {}
+
+    def get_rows(self, subgroup: Dict[str, str]) -> np.ndarray:
+        """Return the positions of the rows that match the given subgroup.
+
+        :param subgroup: dictionary of the form {column_name1: value1, ...}
+        :type subgroup: Dict[str, str]
+        :return: sorted row positions, usable with df.iloc
+        :rtype: np.ndarray
+        """
+        dims = tuple(subgroup)
+        if not dims:
+            return np.arange(len(self.df))
+
+        if dims not in self._indices:
+            self._indices[dims] = self.df.groupby(
+                list(dims), observed=True, sort=False
+            ).indices
+
+        values = tuple(subgroup.values())
+        key = values[0] if len(values) == 1 else values
+        return self._indices[dims].get(key, np.array([], dtype=np.intp))
+
+    def get_subgroup_df(self, subgroup: Dict[str, str]) -> pd.DataFrame:
+        """Return the rows of the dataframe that match the given subgroup."""
+        return self.df.iloc[self.get_rows(subgroup)]
+
+
 def get_user_string_from_subgroup_dict(subgroup_dict: Dict[str, str]) -> str:
     """Return a user readable string from a subgroup dictionary.
 
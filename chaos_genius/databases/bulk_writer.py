@@ -0,0 +1,81 @@
+"""Bulk writes of dataframes to the metadata database."""
+
+import io
+from typing import Any, Iterable, List
+
+import pandas as pd
+from pandas.io.sql import SQLTable
+from sqlalchemy.engine import Connection, Engine
+
+from chaos_genius.databases.base_model import db
+
+# rows per batch of INSERTs on databases which don't support COPY
+INSERT_CHUNKSIZE = 1000
+
+
+def _to_csv_value(value: Any) -> str:
+    """Return a value as a CSV field for COPY.
+
+    COPY reads unquoted empty fields as NULL, so None is written as one and
+    strings are always quoted, which keeps empty strings as they are.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def _copy_insert(
+    table: SQLTable, conn: Connection, keys: List[str], data_iter: Iterable
+) -> None:
+    """Insert rows with COPY FROM STDIN, as a DataFrame.to_sql method."""
+    buffer = io.StringIO()
+    for row in data_iter:
+        buffer.write(",".join(_to_csv_value(value) for value in row) + "\n")
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{key}"' for key in keys)
+    table_name = (
+        f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+    )
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT CSV)", buffer
+        )
+
+
+def write_dataframe(
+    df: pd.DataFrame, table_name: str, index: bool = True, engine: Engine = None
+) -> None:
+    """Append the rows of a dataframe to a table, in a single transaction.
+
+    Rows are sent with a single COPY on Postgres and in batches of INSERTs
+    otherwise.
+
+    :param df: rows to write
+    :type df: pd.DataFrame
+    :param table_name: name of the table to append to
+    :type table_name: str
+    :param index: whether to write the index as the "index" column, defaults
+    to True
+    :type index: bool, optional
+    :param engine: engine to write with, defaults to the metadata DB's
+    :type engine: Engine, optional
+    """
+    if engine is None:
+        engine = db.engine
+
+    if engine.dialect.name == "postgresql":
+        method, chunksize = _copy_insert, None
+    else:
+        method, chunksize = None, INSERT_CHUNKSIZE
+
+    df.to_sql(
+        table_name,
+        engine,
+        if_exists="append",
+        index=index,
+        chunksize=chunksize,
+        method=method,
+    )
@@ -11,14 +11,19 @@ class AnomalyDataOutput(PkModel):
     """Anomaly Data."""
 
     __tablename__ = "anomaly_data_output"
-    __chunksize__ = 5
 
     data_datetime = Column(db.DateTime, default=dt.datetime.utcnow)
     y = Column(db.Float)
+    # center of the bounds and std dev the severity is relative to, to
+    # rescale the bounds when the sensitivity is changed
+    yhat = Column(db.Float, nullable=True)
+    std_dev = Column(db.Float, nullable=True)
     yhat_upper = Column(db.Float)
     yhat_lower = Column(db.Float)
     is_anomaly = Column(db.BigInteger)
     severity = Column(db.Float)
+    # set when the bounds are from the pre-screen instead of the model
+    is_screened = Column(db.Boolean, nullable=True)
     kpi_id = Column(db.Integer, nullable=False)
     # overall, drilldown, data_quality
     anomaly_type = Column(db.String(80), nullable=False)
@@ -47,10 +52,13 @@ class AnomalyDataOutput(PkModel):
         return {
             "data_datetime": self.data_datetime,
             "y": self.y,
+            "yhat": self.yhat,
             "yhat_upper": self.yhat_upper,
             "yhat_lower": self.yhat_lower,
             "is_anomaly": self.is_anomaly,
             "severity": self.severity,
+            "std_dev": self.std_dev,
+            "is_screened": self.is_screened,
             "kpi_id": self.kpi_id,
             "anomaly_type": self.anomaly_type,
             "series_type": self.series_type,
@@ -10,7 +10,6 @@ class RcaData(PkModel):
     """RCA Data"""
 
     __tablename__ = "rca_data"
-    __chunksize__ = 5
 
     kpi_id = Column(db.Integer, nullable=False)
     end_date = Column(db.DateTime, nullable=False)
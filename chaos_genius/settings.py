@@ -76,6 +76,68 @@ HOURS_OFFSET_FOR_ANALTYICS = int(
     os.getenv("HOURS_OFFSET_FOR_ANALTYICS", default=0)
 )
 
+ANALYTICS_PUSHDOWN_ENABLED = _make_bool(
+    os.getenv("ANALYTICS_PUSHDOWN_ENABLED", default=False)
+)
+"""Aggregate KPIs in the data source instead of loading raw rows
+
+Only sum KPIs are aggregated for anomaly detection and sum and count KPIs for
+DeepDrills. Other KPIs (e.g. mean) and Druid data sources load rows as before.
+"""
+ANALYTICS_STREAMING_AGGREGATION_ENABLED = _make_bool(
+    os.getenv("ANALYTICS_STREAMING_AGGREGATION_ENABLED", default=False)
+)
+"""Aggregate the KPIs above while streaming raw rows, if not pushed down"""
+ANALYTICS_CATEGORICAL_DIMENSIONS = _make_bool(
+    os.getenv("ANALYTICS_CATEGORICAL_DIMENSIONS", default=False)
+)
+"""Load string dimension columns as pandas categoricals for anomaly and RCA"""
+
+KPI_DATA_CACHE_ENABLED = _make_bool(
+    os.getenv("KPI_DATA_CACHE_ENABLED", default=False)
+)
+"""Keep a local Parquet copy of KPI data and only fetch new days from the source"""
+KPI_DATA_CACHE_DIR = os.getenv(
+    "KPI_DATA_CACHE_DIR", default=f"{CWD}/.kpi_data_cache"
+)
+KPI_DATA_CACHE_RESTATEMENT_DAYS = int(
+    os.getenv("KPI_DATA_CACHE_RESTATEMENT_DAYS", default=2)
+)
+"""Number of most recent cached days that are always re-fetched from the source"""
+KPI_DATA_CACHE_RETENTION_DAYS = int(
+    os.getenv("KPI_DATA_CACHE_RETENTION_DAYS", default=180)
+)
+
+DATA_SOURCE_ENGINE_POOL_SIZE = int(
+    os.getenv("DATA_SOURCE_ENGINE_POOL_SIZE", default=5)
+)
+"""Connections kept open per data source, engines are shared within a process"""
+DATA_SOURCE_ENGINE_MAX_OVERFLOW = int(
+    os.getenv("DATA_SOURCE_ENGINE_MAX_OVERFLOW", default=5)
+)
+DATA_SOURCE_MAX_CONCURRENT_QUERIES = int(
+    os.getenv("DATA_SOURCE_MAX_CONCURRENT_QUERIES", default=4)
+)
+"""Max parallel partition fetches per data source, in each process"""
+DATA_LOADER_FETCH_PARTITIONS = int(
+    os.getenv("DATA_LOADER_FETCH_PARTITIONS", default=1)
+)
+"""Number of date ranges KPI data is split into, to be fetched in parallel"""
+
+QUERY_CACHE_ENABLED = _make_bool(os.getenv("QUERY_CACHE_ENABLED", default=False))
+"""Cache results of data source queries, keyed by data source and query"""
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", default="disk")
+"""Where query results are cached, either disk or redis"""
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR", default=f"{CWD}/.query_cache")
+QUERY_CACHE_REDIS_URL = os.getenv(
+    "QUERY_CACHE_REDIS_URL", default="redis://localhost:6379/2"
+)
+"""Redis database for cached query results, kept apart from the celery broker"""
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", default=3600))
+"""Seconds for which a cached query result is valid"""
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", default=256))
+"""Max number of cached query results, least recently used ones are evicted"""
+
 TIMEZONE = os.getenv("TIMEZONE", default="UTC")
 # TODO : Deprecate SUPPORTED_TIMEZONES over releases.
 if TIMEZONE in SUPPORTED_TIMEZONES:
@@ -114,6 +176,36 @@ MAX_FILTER_SUBGROUPS_ANOMALY = int(
     os.getenv("MAX_FILTER_SUBGROUPS_ANOMALY", default=100)
 )
 MAX_ANOMALY_SLACK_DAYS = int(os.getenv("MAX_ANOMALY_SLACK_DAYS", default=14))
+ANOMALY_MULTI_SERIES_ENABLED = _make_bool(
+    os.getenv("ANOMALY_MULTI_SERIES_ENABLED", default=False)
+)
+"""Run subdimension anomaly for closed-form models on all subgroups at once"""
+ANOMALY_SUBGROUP_WORKERS = int(os.getenv("ANOMALY_SUBGROUP_WORKERS", default=1))
+"""Number of processes running subdimension anomaly of a KPI, 1 runs them inline
+
+Processes of the celery prefork pool (-P prefork/processes) are daemonic and
+cannot start these, so the anomaly worker needs a non-prefork pool, e.g.
+-P threads. Otherwise the subgroups are run inline.
+"""
+ANOMALY_SUBGROUP_WORKER_MEMORY_LIMIT = int(
+    os.getenv("ANOMALY_SUBGROUP_WORKER_MEMORY_LIMIT", default=0)
+)
+"""Max memory in MB of each subdimension anomaly process, 0 for no limit"""
+ANOMALY_MODEL_STATE_ENABLED = _make_bool(
+    os.getenv("ANOMALY_MODEL_STATE_ENABLED", default=False)
+)
+"""Save EWMA/EWSTD windows and Prophet fits of each series between runs"""
+ANOMALY_MODEL_STATE_DIR = os.getenv(
+    "ANOMALY_MODEL_STATE_DIR", default=f"{CWD}/.anomaly_model_state"
+)
+ANOMALY_PROPHET_REFIT_STRIDE = int(
+    os.getenv("ANOMALY_PROPHET_REFIT_STRIDE", default=1)
+)
+"""Refit Prophet every N points, the points in between reuse the last fit"""
+ANOMALY_PROPHET_WARM_START_ENABLED = _make_bool(
+    os.getenv("ANOMALY_PROPHET_WARM_START_ENABLED", default=False)
+)
+"""Start each Prophet fit from the parameters of the last fit of the series"""
 
 # Summary and DeepDrills Configuration
 MAX_SUMMARY_DEEPDRILLS_SLACK_DAYS = int(
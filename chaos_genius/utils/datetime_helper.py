@@ -1,6 +1,8 @@
 """Provides helper functions related to datetime operations."""
 
-from datetime import date, datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Dict, Optional
 
 import pandas as pd
 import pytz
@@ -28,24 +30,39 @@ def get_datetime_string_with_tz(date_value, hourly=False) -> str:
     return main_str
 
 
-def _get_tz_from_offset_str(utc_offset_str):
-    # TODO: update code when tz implementation is complete
+@lru_cache(maxsize=None)
+def get_offset_tz_index() -> Dict[timedelta, tzinfo]:
+    """Return a map of UTC offsets to the first pytz timezone with that offset.
+
+    The offset of a timezone is its offset after its last transition. The
+    index is built once per process, on first use.
+    """
+    index = {}
+    for tz_name in pytz.all_timezones:
+        tz = pytz.timezone(tz_name)
+        # fixed offset timezones (like UTC) do not have transitions
+        transition_info = getattr(tz, "_transition_info", None)
+        if transition_info:
+            index.setdefault(transition_info[-1][0], tz)
+    return index
+
+
+def get_tz_from_offset_str(utc_offset_str: str) -> Optional[tzinfo]:
+    """Return a timezone for an offset string like "GMT+05:30", if one exists."""
     sign = -1 if utc_offset_str[-6] == "-" else 1
     utc_offset_mins = int(utc_offset_str[-2:]) * sign
     utc_offset_hrs = int(utc_offset_str[-5:-3]) * sign
 
     utc_offset = timedelta(hours=utc_offset_hrs, minutes=utc_offset_mins)
+    return get_offset_tz_index().get(utc_offset)
+
 
-    timezones = pytz.all_timezones
-    for tz_name in timezones:
-        try:
-            tz = pytz.timezone(tz_name)
-            tz_offset = tz._transition_info[-1][0]
-            if utc_offset == tz_offset:
-                return tz
-        except AttributeError:
-            pass
-    return _get_tz_from_offset_str("GMT+00:00")
+def _get_tz_from_offset_str(utc_offset_str):
+    # TODO: update code when tz implementation is complete
+    tz = get_tz_from_offset_str(utc_offset_str)
+    if tz is None:
+        return get_tz_from_offset_str("GMT+00:00")
+    return tz
 
 
 def get_lastscan_string_with_tz(datetime_value_str) -> str:
@@ -13,6 +13,7 @@ from sqlalchemy.orm.attributes import flag_modified
 from chaos_genius.controllers.kpi_controller import (
     delete_anomaly_output_for_kpi,
     get_kpi_data_from_id,
+    rescale_anomaly_output_for_kpi,
 )
 from chaos_genius.core.anomaly.constants import MODEL_NAME_MAPPING
 from chaos_genius.core.utils.round import round_number
@@ -270,6 +271,7 @@ def kpi_anomaly_params(kpi_id: int):
     if err != "":
         return jsonify({"error": err, "status": "failure"}), 400
 
+    old_anomaly_params = get_anomaly_params_dict(kpi)
     err, new_kpi = update_anomaly_params(
         kpi, new_anomaly_params, check_editable=not is_first_time
     )
@@ -290,6 +292,22 @@ def kpi_anomaly_params(kpi_id: int):
         else:
             run_anomaly = False
 
+    if run_anomaly and err == "" and _is_sensitivity_only_change(
+        old_anomaly_params, new_anomaly_params
+    ):
+        # the bounds are rescaled to the new sensitivity without rerunning
+        run_anomaly = not rescale_anomaly_output_for_kpi(
+            new_kpi.id,
+            old_anomaly_params["model_name"],
+            old_anomaly_params["sensitivity"],
+            new_anomaly_params["sensitivity"],
+        )
+        if not run_anomaly:
+            current_app.logger.info(
+                "Rescaled anomaly data since only sensitivity was edited for "
+                + f"KPI ID: {new_kpi.id}"
+            )
+
     if run_anomaly and err == "":
         current_app.logger.info(
             "Deleting anomaly data and re-running anomaly since anomaly params was "
@@ -773,6 +791,7 @@ ANOMALY_PARAM_FIELDS = {
     "scheduler_params_time",
     "scheduler_frequency",
     "run_optional",
+    "prescreen",
 }
 
 
@@ -782,6 +801,7 @@ DEFAULT_ANOMALY_PARAMS = {
     "model_name": None,
     "seasonality": [],
     "sensitivity": None,
+    "prescreen": False,
     # scheduler params
     "scheduler_params_time": "11:00:00",
     "scheduler_frequency": "D",
@@ -981,6 +1001,14 @@ def validate_partial_anomaly_params(
 
                 return err, anomaly_params
 
+    if "prescreen" in anomaly_params:
+        if not isinstance(anomaly_params["prescreen"], bool):
+            return (
+                "prescreen must be a boolean. "
+                + f"Got: {repr(anomaly_params['prescreen'])}",
+                anomaly_params,
+            )
+
     return "", anomaly_params
 
 
@@ -1089,6 +1117,25 @@ def update_anomaly_params(
     return "", new_kpi
 
 
+def _is_sensitivity_only_change(
+    old_anomaly_params: Dict[str, Any], new_anomaly_params: Dict[str, Any]
+) -> bool:
+    """Check if the sensitivity is the only anomaly param that was changed.
+
+    The scheduled time is ignored since it doesn't affect the anomaly output.
+    """
+    changed_fields = {
+        field
+        for field, value in new_anomaly_params.items()
+        if old_anomaly_params.get(field) != value
+    } - {"scheduler_params_time"}
+    return (
+        changed_fields == {"sensitivity"}
+        and old_anomaly_params.get("sensitivity") is not None
+        and old_anomaly_params.get("model_name") is not None
+    )
+
+
 def get_anomaly_params_dict(kpi: Kpi):
     anomaly_params = DEFAULT_ANOMALY_PARAMS.copy()
 
@@ -14,6 +14,7 @@ from sqlalchemy import func
 from chaos_genius.connectors import get_metadata, get_schema_names
 from chaos_genius.connectors import get_table_info as get_table_metadata
 from chaos_genius.connectors import get_view_list
+from chaos_genius.connectors.engine_registry import evict_engine
 from chaos_genius.controllers.data_source_controller import (
     get_datasource_data_from_id,
     mask_sensitive_info,
@@ -393,6 +394,7 @@ def delete_data_source():
             # delete the data source record
             data_source_obj.active = False
             data_source_obj.save(commit=True)
+            evict_engine(data_source_obj.id)
             msg = "deleted"
             status = True
     except Exception as err_msg:  # noqa B902
@@ -591,6 +593,7 @@ def update_data_source_info(datasource_id):
         else:
             ds_obj.sourceConfig = connection_config
         ds_obj.save(commit=True)
+        evict_engine(datasource_id)
         status = "success"
     except Exception as err:  # noqa B902
         status = "failure"
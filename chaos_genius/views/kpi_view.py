@@ -24,12 +24,15 @@ from chaos_genius.controllers.kpi_controller import (
     delete_rca_output_for_kpi,
     get_anomaly_count,
     get_kpi_data_from_id,
+    invalidate_last_data_date_cache,
 )
+from chaos_genius.core.anomaly.processor import delete_anomaly_model_state
 from chaos_genius.core.rca.constants import TIME_RANGES_BY_KEY
 from chaos_genius.core.rca.rca_utils.api_utils import (
     kpi_aggregation,
     kpi_line_data,
 )
+from chaos_genius.core.utils.data_cache import invalidate_kpi_data_cache
 from chaos_genius.core.utils.kpi_validation import validate_kpi
 from chaos_genius.databases.db_utils import chech_editable_field
 from chaos_genius.databases.models.dashboard_kpi_mapper_model import (
@@ -341,6 +344,7 @@ def disable_kpi(kpi_id):
             kpi_obj.active = False
             kpi_obj.save(commit=True)
             disable_mapper_for_kpi_ids([kpi_id])
+            delete_anomaly_model_state(kpi_id)
             status = "success"
         else:
             message = "KPI not found"
@@ -453,6 +457,10 @@ def edit_kpi(kpi_id):
                     + f"edited for KPI ID: {kpi_id}"
                 )
 
+                # cached data might not match the edited KPI definition
+                invalidate_kpi_data_cache(kpi_id)
+                invalidate_last_data_date_cache(kpi_id)
+
                 from chaos_genius.jobs.anomaly_tasks import ready_rca_task
 
                 rca_task = ready_rca_task(kpi_id)
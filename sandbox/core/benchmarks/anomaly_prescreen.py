@@ -0,0 +1,89 @@
+"""Benchmark the median/MAD pre-screen of ProcessAnomalyDetection.
+
+Runs the anomaly detection of the newest point of many synthetic daily series
+with and without the pre-screen, and reports the time saved and how often
+both agree on whether the point is an anomaly. A tenth of the series get a
+spike at their newest point.
+
+Run from the repository root:
+    PYTHONPATH=. python sandbox/core/benchmarks/anomaly_prescreen.py [model]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from chaos_genius.core.anomaly.processor import ProcessAnomalyDetection
+
+NUM_SERIES = 40
+NUM_POINTS = 120
+PERIOD = 90
+NEW_POINTS = 1
+SPIKE_FRACTION = 0.1
+
+
+def make_series(rng):
+    """Return synthetic daily series with weekly seasonality and noise."""
+    dates = pd.date_range("2022-01-01", periods=NUM_POINTS, freq="D")
+    all_series = []
+    for i in range(NUM_SERIES):
+        level = rng.uniform(100, 1000)
+        weekly = level * 0.1 * np.sin(2 * np.pi * np.arange(NUM_POINTS) / 7)
+        y = level + weekly + rng.normal(0, level * 0.03, NUM_POINTS)
+        if i < NUM_SERIES * SPIKE_FRACTION:
+            y[-1] += level * 0.5
+        all_series.append(pd.DataFrame({"dt": dates, "y": y}))
+    return all_series
+
+
+def run(model_name, all_series, prescreen):
+    """Return the outputs of all series and the time (s) they took."""
+    last_date = all_series[0]["dt"].iloc[-1 - NEW_POINTS]
+    start = time.perf_counter()
+    outputs = [
+        ProcessAnomalyDetection(
+            model_name,
+            series,
+            last_date,
+            PERIOD,
+            "benchmark",
+            "D",
+            "medium",
+            14,
+            "subdim",
+            {"series": str(i)},
+            prescreen=prescreen,
+        ).predict()
+        for i, series in enumerate(all_series)
+    ]
+    return outputs, time.perf_counter() - start
+
+
+def main():
+    """Print the time saved by the pre-screen and its agreement rate."""
+    model_name = sys.argv[1] if len(sys.argv) > 1 else "ProphetModel"
+    all_series = make_series(np.random.default_rng(0))
+
+    # the first run imports and warms up the model
+    run(model_name, all_series[:1], False)
+    full_outputs, full_time = run(model_name, all_series, False)
+    screened_outputs, screened_time = run(model_name, all_series, True)
+
+    full_anomaly = np.concatenate([out["anomaly"] for out in full_outputs])
+    screened_anomaly = np.concatenate([out["anomaly"] for out in screened_outputs])
+    num_screened = sum(out["is_screened"].all() for out in screened_outputs)
+    missed = ((full_anomaly != 0) & (screened_anomaly == 0)).sum()
+
+    print(f"model: {model_name}, series: {NUM_SERIES}, new points: {NEW_POINTS}")
+    print(f"without pre-screen: {full_time:8.2f} s")
+    print(f"with pre-screen:    {screened_time:8.2f} s")
+    print(f"time saved:         {1 - screened_time / full_time:8.1%}")
+    print(f"series screened:    {num_screened} / {NUM_SERIES}")
+    print(f"agreement rate:     {(full_anomaly == screened_anomaly).mean():8.1%}")
+    print(f"anomalies missed:   {missed} / {(full_anomaly != 0).sum()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark the import time of modules on the web app and worker import paths.
+
+Each module is imported in a fresh interpreter, so the times include all of
+its dependencies. Also lists the heavy libraries (modeling and plotting)
+which each import pulls in; these should only be imported when a model is
+run or a plot is drawn.
+
+Run from the repository root:
+    PYTHONPATH=. python sandbox/core/benchmarks/import_time.py
+"""
+
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "chaos_genius.core.anomaly.models",
+    "chaos_genius.core.anomaly.controller",
+    "chaos_genius.core.rca.root_cause_analysis",
+]
+
+HEAVY_MODULES = ["prophet", "statsmodels", "matplotlib"]
+
+REPEATS = 5
+
+_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def time_import(module):
+    """Return the import time (s) of a module and the heavy modules it loads."""
+    output = subprocess.run(
+        [sys.executable, "-c", _SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(output[0]), output[1].split(",") if len(output) > 1 else []
+
+
+def main():
+    """Print the median import time of each module."""
+    for module in MODULES:
+        # the first import warms up the bytecode and file system caches
+        time_import(module)
+        times = []
+        for _ in range(REPEATS):
+            elapsed, heavy = time_import(module)
+            times.append(elapsed)
+        heavy_str = ", ".join(heavy) if heavy else "none"
+        print(f"{module}")
+        print(f"    median: {statistics.median(times) * 1e3:8.1f} ms")
+        print(f"    heavy modules imported: {heavy_str}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark timezone lookups from UTC offset strings.
+
+Compares the previous lookup, which instantiated every pytz timezone on each
+call, with the lazily built offset index in chaos_genius.utils.datetime_helper.
+
+Run from the repository root:
+    PYTHONPATH=. python sandbox/core/benchmarks/tz_offset_index.py
+"""
+
+import contextlib
+import timeit
+from datetime import timedelta
+
+import pytz
+
+from chaos_genius.core.utils.constants import SUPPORTED_TIMEZONES
+from chaos_genius.utils.datetime_helper import (
+    get_offset_tz_index,
+    get_tz_from_offset_str,
+)
+
+OFFSET_STRINGS = sorted(set(SUPPORTED_TIMEZONES.values()))
+
+
+def linear_scan_tz_from_offset_str(utc_offset_str):
+    """Previous implementation: scan all timezones on every call."""
+    sign = -1 if utc_offset_str[-6] == "-" else 1
+    utc_offset_mins = int(utc_offset_str[-2:]) * sign
+    utc_offset_hrs = int(utc_offset_str[-5:-3]) * sign
+
+    utc_offset = timedelta(hours=utc_offset_hrs, minutes=utc_offset_mins)
+
+    for tz_name in pytz.all_timezones:
+        with contextlib.suppress(AttributeError):
+            tz = pytz.timezone(tz_name)
+            if tz._transition_info[-1][0] == utc_offset:
+                return tz
+    return None
+
+
+def _per_call_us(func, number):
+    total = timeit.timeit(
+        lambda: [func(offset_str) for offset_str in OFFSET_STRINGS], number=number
+    )
+    return total / (number * len(OFFSET_STRINGS)) * 1e6
+
+
+def main():
+    """Print the per-call latency of both lookups."""
+    for offset_str in OFFSET_STRINGS:
+        assert linear_scan_tz_from_offset_str(
+            offset_str
+        ) is get_tz_from_offset_str(offset_str), offset_str
+
+    get_offset_tz_index.cache_clear()
+    build_ms = timeit.timeit(get_offset_tz_index, number=1) * 1e3
+
+    print(f"offset strings looked up: {len(OFFSET_STRINGS)}")
+    linear_scan_us = _per_call_us(linear_scan_tz_from_offset_str, 3)
+    offset_index_us = _per_call_us(get_tz_from_offset_str, 1000)
+    print(f"linear scan:  {linear_scan_us:10.1f} us/call")
+    print(f"offset index: {offset_index_us:10.1f} us/call")
+    print(f"index build (once per process): {build_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 """Tests Anomaly Controller Functions."""
 
+import multiprocessing
 from dataclasses import dataclass
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 from pandas.core.base import NoNewAttributesMixin
 import pytest
@@ -10,6 +12,11 @@ from _pytest.monkeypatch import MonkeyPatch
 from pandas.testing import assert_frame_equal
 
 from chaos_genius.core.anomaly.controller import AnomalyDetectionController
+from chaos_genius.core.anomaly.processor import ProcessAnomalyDetection
+from chaos_genius.core.utils.data_loader import (
+    PUSHDOWN_COUNT_COLUMN,
+    PUSHDOWN_MAX_COLUMN,
+)
 from chaos_genius.databases.models.data_source_model import DataSource
 
 
@@ -72,10 +79,12 @@ testdata_detect_anomaly = [
             {
                 "dt": [datetime(2022, 1, 16, 0, 0, 0)],
                 "y": [19353.0],
+                "yhat": [17680.516152],
                 "yhat_lower": [14144.412922],
                 "yhat_upper": [21216.619383],
                 "anomaly": [0],
                 "severity": [0.0],
+                "std_dev": [4265.198940],
             }
         ),
     ),
@@ -91,10 +100,12 @@ testdata_detect_anomaly = [
             {
                 "dt": [datetime(2022, 1, 16, 0, 0, 0)],
                 "y": [6.81],
+                "yhat": [11.978674],
                 "yhat_lower": [9.582939],
                 "yhat_upper": [14.374409],
                 "anomaly": [-1],
                 "severity": [34.093368],
+                "std_dev": [2.711123],
             }
         ),
     ),
@@ -141,3 +152,397 @@ def test_detect_anomaly(
     pred_series["anomaly"] = int(pred_series["anomaly"])
 
     assert_frame_equal(pred_series, expected)
+
+
+def test_run_anomaly_for_subgroups_in_pool(monkeypatch: MonkeyPatch):
+    """Tests that subgroups run in processes match running them inline."""
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    daily_data = load_input_data("tests/test_data/input_daily_data.csv")
+    input_data = pd.concat(
+        [
+            daily_data.assign(city=city, y=daily_data["y"] * scale)
+            for city, scale in [("a", 1), ("b", 2), ("c", 0.5), ("d", 3)]
+        ],
+        ignore_index=True,
+    )
+    subgroups = [{"city": "a"}, {"city": "b"}, {"city": "c"}, {"city": "d"}]
+    last_dates = {"a": None, "b": datetime(2022, 1, 5), "c": None, "d": None}
+
+    adc = AnomalyDetectionController(kpi_info_daily, datetime(2022, 1, 16))
+    monkeypatch.setattr(
+        adc,
+        "_get_last_date_in_db",
+        lambda series, subgroup: last_dates[subgroup["city"]],
+    )
+
+    get_series_data = adc._get_series_data
+
+    def failing_get_series_data(input_data, series, subgroup, last_date):
+        if subgroup == {"city": "d"}:
+            raise ValueError("failing subgroup")
+        return get_series_data(input_data, series, subgroup, last_date)
+
+    monkeypatch.setattr(adc, "_get_series_data", failing_get_series_data)
+
+    saved = []
+    monkeypatch.setattr(
+        adc,
+        "_save_anomaly_outputs",
+        lambda anomaly_outputs, series: saved.extend(anomaly_outputs),
+    )
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.controller.ANOMALY_SUBGROUP_WORKERS", 2
+    )
+
+    remaining = adc._run_anomaly_for_subgroups_in_pool(input_data, subgroups)
+
+    assert remaining == []
+    assert [subgroup for _, subgroup in saved] == subgroups[:3]
+    for anomaly_output, subgroup in saved:
+        expected = adc._predict_series(
+            input_data, "subdim", subgroup, last_dates[subgroup["city"]]
+        )
+        assert_frame_equal(anomaly_output, expected)
+
+
+def test_run_anomaly_for_subgroups_in_daemonic_process(monkeypatch: MonkeyPatch):
+    """Tests that daemonic processes run subgroups inline instead of in a pool."""
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    monkeypatch.setattr(
+        DataSource,
+        "get_by_id",
+        lambda *args, **kwargs: TestDataSource({"connection_type": "Postgres"}),
+    )
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.controller.ANOMALY_SUBGROUP_WORKERS", 2
+    )
+    adc = AnomalyDetectionController(kpi_info_daily, datetime(2022, 1, 16))
+    input_data = load_input_data("tests/test_data/input_daily_data.csv")
+    subgroups = [{"city": "a"}, {"city": "b"}]
+
+    def run_in_pool(queue):
+        queue.put(adc._run_anomaly_for_subgroups_in_pool(input_data, subgroups))
+
+    # like a worker of the celery prefork pool
+    mp_context = multiprocessing.get_context("fork")
+    queue = mp_context.Queue()
+    process = mp_context.Process(target=run_in_pool, args=(queue,), daemon=True)
+    process.start()
+    remaining = queue.get(timeout=60)
+    process.join()
+
+    assert process.exitcode == 0
+    assert remaining == subgroups
+
+
+def test_filter_subgroups(monkeypatch: MonkeyPatch):
+    """Tests that subgroups are filtered by their number of data points."""
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.controller.MIN_DATA_IN_SUBGROUP", 3
+    )
+
+    input_data = pd.DataFrame(
+        {
+            "dt": pd.date_range("2022-01-01", periods=12),
+            "city": ["a", "a", "b", "a", "b", "c", "a", "b", "a", None, "c", "b"],
+            "device": ["x", "y", "x", "x", None, "y", "x", "y", "y", "x", "x", "x"],
+            "y": [1.0, 2, 3, None, 5, 6, 7, 8, 9, 10, 11, 12],
+        }
+    )
+    kpi_info = dict(kpi_info_daily, dimensions=["city", "device"])
+    adc = AnomalyDetectionController(kpi_info, datetime(2022, 1, 16))
+    subgroups = adc._get_subgroup_list(input_data)
+
+    # rows without a metric value or with a missing dimension are not counted
+    assert adc._filter_subgroups(subgroups, input_data) == [
+        {"device": "x"},
+        {"city": "a"},
+        {"device": "y"},
+        {"city": "b"},
+    ]
+
+
+def test_get_last_date_in_db(monkeypatch: MonkeyPatch):
+    """Tests that last dates of all series are fetched in one query."""
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    calls = []
+
+    def get_last_dates_in_db(kpi_id):
+        calls.append(kpi_id)
+        return {
+            ("overall", None): datetime(2022, 1, 10),
+            ("subdim", '{"city": "a", "device": "x"}'): datetime(2022, 1, 12),
+            ("dq", '{"dq": "max"}'): datetime(2022, 1, 11),
+        }
+
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.controller.get_last_dates_in_db",
+        get_last_dates_in_db,
+    )
+
+    adc = AnomalyDetectionController(kpi_info_daily, datetime(2022, 1, 16))
+    assert adc._get_last_date_in_db("overall") == datetime(2022, 1, 10)
+    assert adc._get_last_date_in_db(
+        "subdim", {"device": "x", "city": "a"}
+    ) == datetime(2022, 1, 12)
+    assert adc._get_last_date_in_db("dq", {"dq": "max"}) == datetime(2022, 1, 11)
+    assert adc._get_last_date_in_db("dq", {"dq": "count"}) is None
+    assert adc._get_last_date_in_db("subdim", {"city": "a"}) is None
+    assert calls == [kpi_info_daily["id"]]
+
+
+def test_flush_anomaly_outputs(monkeypatch: MonkeyPatch):
+    """Tests that outputs of a stage are written together."""
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    writes = []
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.controller.write_dataframe",
+        lambda df, table_name: writes.append((df, table_name)),
+    )
+
+    adc = AnomalyDetectionController(kpi_info_daily, datetime(2022, 1, 16))
+    output = testdata_detect_anomaly[0][-1]
+    adc._save_anomaly_output(output, "subdim", {"city": "a"})
+    adc._save_anomaly_outputs(
+        [(output, {"city": "b"}), (output, {"city": "c"})], "subdim"
+    )
+    assert writes == []
+
+    adc._flush_anomaly_outputs()
+    adc._flush_anomaly_outputs()
+
+    assert len(writes) == 1
+    written, table_name = writes[0]
+    assert table_name == "anomaly_data_output"
+    assert written.index.tolist() == [0, 0, 0]
+    assert written["series_type"].tolist() == [
+        '{"city": "a"}', '{"city": "b"}', '{"city": "c"}'
+    ]
+    assert written["data_datetime"].tolist() == [datetime(2022, 1, 16)] * 3
+
+
+@pytest.mark.parametrize(
+    "aggregation, pushdown", [("sum", True), ("count", False), ("mean", False)]
+)
+def test_pushdown_aggregations(monkeypatch: MonkeyPatch, aggregation, pushdown):
+    """Tests that only sum KPIs are aggregated in the data source."""
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource({"connection_type": "Postgres", "id": 1})
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.controller.ANALYTICS_PUSHDOWN_ENABLED", True
+    )
+
+    info = dict(kpi_info_daily, aggregation=aggregation)
+    adc = AnomalyDetectionController(info, datetime(2022, 1, 16))
+
+    assert adc._pushdown == pushdown
+    # count KPIs keep the data quality series of their raw data
+    assert adc._preaggregated == pushdown
+
+
+@pytest.mark.parametrize(
+    "source, dq_strs",
+    [
+        ("raw", ["max", "count", "mean", "missing"]),
+        ("preaggregated", ["count", "missing"]),
+        ("pushdown", ["max", "count", "mean", "missing"]),
+    ],
+)
+@pytest.mark.parametrize("frequency", ["D", "H"])
+@pytest.mark.parametrize("metric_dtype", ["float", "int"])
+@pytest.mark.parametrize(
+    "last_dates",
+    [
+        [None, None, None, None],
+        [datetime(2022, 1, 20)] * 4,
+        [None, datetime(2022, 1, 20), datetime(2022, 2, 3), None],
+    ],
+)
+def test_get_dq_series_data(
+    monkeypatch: MonkeyPatch, source, dq_strs, frequency, metric_dtype, last_dates
+):
+    """Tests that resampling all DQ metrics at once matches each one alone."""
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource({"connection_type": "Postgres", "id": 1})
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    rng = np.random.default_rng(0)
+    n = 500
+    input_data = pd.DataFrame(
+        {
+            "dt": pd.Timestamp(2022, 1, 1)
+            + pd.to_timedelta(rng.integers(0, 30 * 24, n), unit="H"),
+            "y": rng.normal(100, 10, n),
+            "count": rng.integers(1, 10, n),
+            "max": rng.normal(200, 10, n),
+        }
+    ).sort_values("dt")
+    # gaps in the data and missing values
+    input_data = input_data[input_data["dt"].dt.day % 7 != 3]
+    if metric_dtype == "int":
+        input_data["y"] = input_data["y"].round().astype(int)
+    else:
+        input_data.loc[input_data.index[::13], "y"] = np.nan
+
+    info = dict(
+        kpi_info_daily,
+        count_column="count",
+        anomaly_params=dict(kpi_info_daily["anomaly_params"], frequency=frequency),
+    )
+    adc = AnomalyDetectionController(info, datetime(2022, 2, 5))
+    if source != "raw":
+        adc._preaggregated = True
+    if source == "pushdown":
+        adc._pushdown = True
+        input_data = input_data.rename(
+            columns={"count": PUSHDOWN_COUNT_COLUMN, "max": PUSHDOWN_MAX_COLUMN}
+        )
+        adc._preaggregated_count_col = PUSHDOWN_COUNT_COLUMN
+
+    dq_list = [{"dq": dq} for dq in dq_strs]
+    last_dates = last_dates[: len(dq_list)]
+    series_data = adc._get_dq_series_data(input_data, dq_list, last_dates)
+
+    assert len(series_data) == len(dq_list)
+    for dq, last_date, data in zip(dq_list, last_dates, series_data):
+        if dq["dq"] == "missing":
+            assert data is None
+            continue
+        expected = adc._get_series_data(input_data, "dq", dq, last_date)
+        assert_frame_equal(data, expected)
+
+
+def test_prescreen_subgroups(monkeypatch: MonkeyPatch):
+    """Tests that screening subgroups at once matches screening each one."""
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource({"connection_type": "Postgres", "id": 1})
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2022-01-01", periods=50, freq="D")
+    input_data = pd.concat(
+        [
+            pd.DataFrame({"dt": dates, "city": city, "y": rng.normal(100, 5, 50)})
+            for city in "abcd"
+        ],
+        ignore_index=True,
+    )
+    # quiet new points, with a spike in b which needs the model
+    input_data.loc[input_data["dt"] >= dates[-5], "y"] = 100.0
+    spike = (input_data["city"] == "b") & (input_data["dt"] == dates[-2])
+    input_data.loc[spike, "y"] = 200
+    subgroups = [{"city": city} for city in "abcd"]
+    last_dates = {"a": dates[-4], "b": dates[-4], "c": None, "d": dates[-6]}
+
+    info = dict(
+        kpi_info_daily,
+        anomaly_params=dict(kpi_info_daily["anomaly_params"], prescreen=True),
+    )
+    adc = AnomalyDetectionController(info, dates[-1])
+    monkeypatch.setattr(
+        adc,
+        "_get_last_date_in_db",
+        lambda series, subgroup: last_dates[subgroup["city"]],
+    )
+    saved = []
+    monkeypatch.setattr(
+        adc,
+        "_save_anomaly_outputs",
+        lambda anomaly_outputs, series: saved.extend(anomaly_outputs),
+    )
+
+    remaining = adc._prescreen_subgroups(input_data, subgroups)
+
+    assert remaining == [{"city": "b"}, {"city": "c"}]
+    assert [subgroup for _, subgroup in saved] == [{"city": "a"}, {"city": "d"}]
+    for anomaly_output, subgroup in saved:
+        last_date = last_dates[subgroup["city"]]
+        series_data = adc._get_series_data(input_data, "subdim", subgroup, last_date)
+        expected = ProcessAnomalyDetection(
+            "EWMAModel",
+            series_data.reset_index(),
+            last_date,
+            30,
+            "test_table",
+            "D",
+            "medium",
+            14,
+            "subdim",
+            subgroup,
+            prescreen=True,
+        )._predict_prescreen()
+        assert_frame_equal(anomaly_output, expected)
@@ -1,12 +1,21 @@
 """Tests Anomaly Processor Functions."""
 
+import os
+import subprocess
+import sys
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 import pytest
 
+from chaos_genius.core.anomaly.models import MODEL_MAPPER
 from chaos_genius.core.anomaly.models.ewma_model import EWMAModel
-from chaos_genius.core.anomaly.processor import ProcessAnomalyDetection
+from chaos_genius.core.anomaly.models.prophet_model import ProphetModel
+from chaos_genius.core.anomaly.processor import (
+    ProcessAnomalyDetection,
+    delete_anomaly_model_state,
+)
 
 
 def load_input_data(file_name):
@@ -145,3 +154,576 @@ def test_detect_severity(input_data_str, expected):
     )._detect_severity(input_data)
 
     assert pred_series["severity"].iloc[-1] == expected
+
+
+testdata_predict_rolling = [
+    ("tests/test_data/input_daily_data.csv", datetime(2022, 1, 5), 20, "D"),
+    ("tests/test_data/input_hourly_data.csv", datetime(2022, 1, 10), 360, "H"),
+]
+
+
+@pytest.mark.parametrize(
+    "model_name",
+    ["StandardDeviationModel", "EWMAModel", "EWSTDModel", "RollingMedianModel"],
+)
+@pytest.mark.parametrize("sensitivity", ["low", "medium", "high"])
+@pytest.mark.parametrize(
+    "input_data_str,last_date_in_db,anomaly_period,frequency",
+    testdata_predict_rolling,
+    ids=["daily", "hourly"],
+)
+def test_predict_rolling(
+    model_name,
+    sensitivity,
+    input_data_str,
+    last_date_in_db,
+    anomaly_period,
+    frequency,
+):
+    """Tests that batch prediction matches predicting one point at a time."""
+    input_data = load_input_data(input_data_str)
+    processor = ProcessAnomalyDetection(
+        model_name,
+        input_data,
+        last_date_in_db,
+        anomaly_period,
+        "test_table",
+        frequency,
+        sensitivity,
+        14,
+        "overall",
+        None,
+        {},
+    )
+    model = MODEL_MAPPER[model_name]()
+
+    rolling = processor._predict_rolling(model)
+    processor._predict_rolling = lambda model: None
+    expected = processor._predict(model)
+
+    assert rolling is not None
+    assert rolling.columns.to_list() == expected.columns.to_list()
+    assert rolling["dt"].to_list() == expected["dt"].to_list()
+    assert rolling["anomaly"].to_list() == expected["anomaly"].to_list()
+    for col in ["y", "yhat", "yhat_lower", "yhat_upper", "severity", "std_dev"]:
+        np.testing.assert_allclose(
+            rolling[col].to_numpy(), expected[col].to_numpy(dtype=float), rtol=1e-9
+        )
+
+
+def test_predict_rolling_fallback():
+    """Tests that prediction falls back to the loop if data has gaps."""
+    input_data = load_input_data("tests/test_data/input_daily_data.csv")
+    input_data = input_data.drop(index=25).reset_index(drop=True)
+    processor = ProcessAnomalyDetection(
+        "EWMAModel",
+        input_data,
+        datetime(2022, 1, 5),
+        20,
+        "test_table",
+        "D",
+        "medium",
+        14,
+        "overall",
+        None,
+        {},
+    )
+
+    assert processor._predict_rolling(EWMAModel()) is None
+    assert len(processor._predict(EWMAModel())) > 0
+
+
+def _compute_severity_by_row(anomaly_prediction):
+    """Severity as previously computed one row at a time."""
+    std_dev = anomaly_prediction["y"].std()
+    if std_dev == 0:
+        return [0] * len(anomaly_prediction)
+
+    severities = []
+    for _, row in anomaly_prediction.iterrows():
+        if row["anomaly"] == 0:
+            severities.append(0)
+            continue
+        elif row["anomaly"] == 1:
+            zscore = (row["y"] - row["yhat_upper"]) / std_dev
+        else:
+            zscore = (row["y"] - row["yhat_lower"]) / std_dev
+        severities.append(min(max(abs(zscore * 100 / 3), 0), 100))
+    return severities
+
+
+testdata_severity_parity = [
+    load_input_data("tests/test_data/input_daily_severity_data.csv"),
+    load_input_data("tests/test_data/input_hourly_severity_data.csv"),
+    # high, low, no anomaly and a deviation above 3 std devs
+    pd.DataFrame(
+        {
+            "y": [10.0, 1.0, 5.0, 100.0],
+            "yhat_upper": [8.0, 8.0, 8.0, 8.0],
+            "yhat_lower": [2.0, 2.0, 2.0, 2.0],
+            "anomaly": [1, -1, 0, 1],
+        }
+    ),
+    # no deviation in the data
+    pd.DataFrame(
+        {
+            "y": [5.0, 5.0, 5.0],
+            "yhat_upper": [4.0, 4.0, 4.0],
+            "yhat_lower": [1.0, 1.0, 1.0],
+            "anomaly": [1, 1, 1],
+        }
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "input_data",
+    testdata_severity_parity,
+    ids=["daily", "hourly", "mixed", "zero_std_dev"],
+)
+def test_detect_severity_parity(input_data):
+    """Tests that vectorized severity matches the row by row computation."""
+    expected = _compute_severity_by_row(input_data)
+    pred_series = ProcessAnomalyDetection(
+        "EWMAModel",
+        input_data,
+        "2022-03-09",
+        30,
+        "test_table",
+        "D",
+        "medium",
+        14,
+        "overall",
+        None,
+        {},
+    )._detect_severity(input_data.copy())
+
+    assert pred_series["severity"].to_list() == expected
+
+
+@pytest.mark.parametrize(
+    "model_name", ["EWMAModel", "EWSTDModel", "RollingMedianModel"]
+)
+@pytest.mark.parametrize(
+    "input_data_str,last_dates_in_db,anomaly_period,frequency",
+    [
+        (
+            "tests/test_data/input_daily_data.csv",
+            [datetime(2022, 1, 5), datetime(2022, 1, 12)],
+            20,
+            "D",
+        ),
+        (
+            "tests/test_data/input_hourly_data.csv",
+            [datetime(2022, 1, 10), datetime(2022, 1, 12, 5)],
+            360,
+            "H",
+        ),
+    ],
+    ids=["daily", "hourly"],
+)
+def test_predict_from_window_state(
+    monkeypatch,
+    tmp_path,
+    model_name,
+    input_data_str,
+    last_dates_in_db,
+    anomaly_period,
+    frequency,
+):
+    """Tests that runs with a saved window only need the new points."""
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_ENABLED", True
+    )
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_DIR", str(tmp_path)
+    )
+    input_data = load_input_data(input_data_str)
+    first_last_date, second_last_date = last_dates_in_db
+
+    def get_processor(data, last_date):
+        return ProcessAnomalyDetection(
+            model_name,
+            data,
+            last_date,
+            anomaly_period,
+            "test_table",
+            frequency,
+            "medium",
+            14,
+            "subdim",
+            {"city": "a"},
+            {},
+            kpi_id=1,
+        )
+
+    # the first run saves the window ending at its last predicted point
+    first_run = get_processor(
+        input_data[input_data["dt"] <= second_last_date], first_last_date
+    )
+    assert first_run.predict()["dt"].iloc[-1] == second_last_date
+
+    # the second run has no points before its last date
+    new_data = input_data[input_data["dt"] > second_last_date].reset_index(drop=True)
+    from_state = get_processor(new_data, second_last_date).predict()
+
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_ENABLED", False
+    )
+    expected = get_processor(input_data, second_last_date).predict()
+
+    assert len(from_state) == len(new_data)
+    assert from_state["dt"].to_list() == expected["dt"].to_list()
+    assert from_state["anomaly"].to_list() == expected["anomaly"].to_list()
+    for col in ["y", "yhat", "yhat_lower", "yhat_upper", "severity", "std_dev"]:
+        np.testing.assert_allclose(
+            from_state[col].to_numpy(dtype=float),
+            expected[col].to_numpy(dtype=float),
+            rtol=1e-9,
+        )
+
+    # a window which doesn't end at the last date is not used
+    assert get_processor(new_data, first_last_date).predict().empty
+
+    # input data covering the window is used over the saved window, so
+    # restated points are not ignored
+    restated_data = input_data.copy()
+    restated_data.loc[restated_data["dt"] <= second_last_date, "y"] *= 2
+    expected = get_processor(restated_data, second_last_date).predict()
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_ENABLED", True
+    )
+    # saves the window ending at the last date again
+    first_run.predict()
+    from_input = get_processor(restated_data, second_last_date).predict()
+    np.testing.assert_allclose(
+        from_input["yhat"].to_numpy(dtype=float),
+        expected["yhat"].to_numpy(dtype=float),
+        rtol=1e-9,
+    )
+
+
+def test_model_state_paths(monkeypatch, tmp_path):
+    """Tests that each model has its own state, which is deleted with the KPI's."""
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_ENABLED", True
+    )
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_DIR", str(tmp_path)
+    )
+    input_data = load_input_data("tests/test_data/input_daily_data.csv")
+
+    def get_processor(model_name):
+        return ProcessAnomalyDetection(
+            model_name,
+            input_data,
+            datetime(2022, 1, 5),
+            20,
+            "test_table",
+            "D",
+            "medium",
+            14,
+            "overall",
+            None,
+            {},
+            kpi_id=1,
+        )
+
+    get_processor("EWMAModel").predict()
+    ewma_path = get_processor("EWMAModel").model_path
+    prophet_path = get_processor("ProphetModel").model_path
+    assert os.path.exists(ewma_path)
+    assert prophet_path != ewma_path
+    assert not os.path.exists(prophet_path)
+
+    delete_anomaly_model_state(1)
+    assert not os.path.exists(os.path.join(tmp_path, "1"))
+
+
+def test_prophet_refit_stride_and_warm_start(monkeypatch, tmp_path):
+    """Tests that Prophet refits every few points and warm-starts across runs."""
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_ENABLED", True
+    )
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.processor.ANOMALY_MODEL_STATE_DIR", str(tmp_path)
+    )
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.models.prophet_model."
+        "ANOMALY_PROPHET_REFIT_STRIDE",
+        3,
+    )
+    input_data = load_input_data("tests/test_data/input_daily_data.csv")
+
+    fits = []
+    fit = ProphetModel._fit
+
+    def count_fits(self, df, interval_width):
+        fits.append(self.model is not None)
+        fit(self, df, interval_width)
+
+    monkeypatch.setattr(ProphetModel, "_fit", count_fits)
+
+    def run(data, last_date):
+        return ProcessAnomalyDetection(
+            "ProphetModel",
+            data,
+            last_date,
+            20,
+            "test_table",
+            "D",
+            "medium",
+            14,
+            "overall",
+            None,
+            {},
+            kpi_id=1,
+        ).predict()
+
+    first_run = run(input_data[input_data["dt"] <= "2022-01-12"], datetime(2022, 1, 5))
+    assert len(first_run) == 7
+    assert fits == [False, True, True]
+    assert not first_run[["yhat_lower", "yhat_upper"]].isna().any().any()
+
+    # the saved fit is loaded and used for a point within the stride
+    fits.clear()
+    second_run = run(input_data, datetime(2022, 1, 12))
+    assert len(second_run) == 4
+    assert fits == [True]
+
+
+def test_prophet_warm_start_param_shapes(monkeypatch):
+    """Tests that Prophet is only warm-started with parameters of the same shape."""
+    import prophet
+
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.models.prophet_model."
+        "ANOMALY_PROPHET_WARM_START_ENABLED",
+        True,
+    )
+    inits = []
+    prophet_fit = prophet.Prophet.fit
+
+    def record_init(self, df, **kwargs):
+        inits.append(kwargs.get("init") is not None)
+        return prophet_fit(self, df, **kwargs)
+
+    monkeypatch.setattr(prophet.Prophet, "fit", record_init)
+    input_data = load_input_data("tests/test_data/input_daily_data.csv")
+    input_data = input_data.rename(columns={"dt": "ds"})
+
+    model = ProphetModel()
+    # fewer changepoints and no weekly seasonality on the first 10 days
+    model._fit(input_data.iloc[:10], 0.9)
+    model._fit(input_data.iloc[:-1], 0.9)
+    # same number of points, one day later
+    model._fit(input_data.iloc[1:], 0.9)
+    assert inits == [False, False, True]
+
+    # warm start is disabled by default
+    monkeypatch.setattr(
+        "chaos_genius.core.anomaly.models.prophet_model."
+        "ANOMALY_PROPHET_WARM_START_ENABLED",
+        False,
+    )
+    inits.clear()
+    model._fit(input_data.iloc[:-1], 0.9)
+    assert inits == [False]
+
+
+def test_prophet_load_invalid_state(tmp_path):
+    """Tests that a new Prophet model is used if the saved state is invalid."""
+    path = os.path.join(tmp_path, "state.json")
+    for content in ["{", "{}", '{"model_kwargs": {}, "model": "{}"}', "[]"]:
+        with open(path, "w") as f:
+            f.write(content)
+        model = ProphetModel.load(path)
+        assert model.model is None
+        assert model.points_since_fit == 0
+
+
+def test_models_imported_lazily():
+    """Tests that models and plotting libraries are imported on first use."""
+    script = (
+        "import sys\n"
+        "import chaos_genius.core.anomaly.models\n"
+        "import chaos_genius.core.rca.root_cause_analysis\n"
+        "print(sorted(m for m in ('prophet', 'statsmodels', 'matplotlib')"
+        " if m in sys.modules))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    ).stdout
+    assert output.strip() == "[]"
+
+    assert set(MODEL_MAPPER) == {
+        "StandardDeviationModel",
+        "ProphetModel",
+        "EWSTDModel",
+        "EWMAModel",
+        "ETSModel",
+        "RollingMedianModel",
+    }
+    assert MODEL_MAPPER["ProphetModel"] is ProphetModel
+    assert MODEL_MAPPER["EWMAModel"] is EWMAModel
+
+
+def test_predict_prescreen(monkeypatch):
+    """Tests that only series with a new point off the screen run the model."""
+    rng = np.random.default_rng(0)
+    input_data = pd.DataFrame(
+        {
+            "dt": pd.date_range("2022-01-01", periods=60, freq="D"),
+            "y": rng.normal(100, 5, 60),
+        }
+    )
+    input_data.loc[57:, "y"] = [100.0, 101.0, 99.0]
+
+    def get_processor(data, prescreen):
+        return ProcessAnomalyDetection(
+            "StandardDeviationModel",
+            data,
+            datetime(2022, 2, 26),
+            30,
+            "test_table",
+            "D",
+            "medium",
+            14,
+            "subdim",
+            {"city": "a"},
+            {},
+            prescreen=prescreen,
+        )
+
+    def failing_predict(*args, **kwargs):
+        raise AssertionError("model run for a quiet series")
+
+    with monkeypatch.context() as m:
+        m.setattr(MODEL_MAPPER["StandardDeviationModel"], "predict", failing_predict)
+        screened = get_processor(input_data, True).predict()
+
+    assert screened["dt"].to_list() == list(
+        pd.date_range("2022-02-27", periods=3, freq="D")
+    )
+    assert screened["y"].to_list() == [100.0, 101.0, 99.0]
+    assert screened["anomaly"].to_list() == [0, 0, 0]
+    assert screened["is_screened"].all()
+    assert (screened["yhat_lower"] < screened["y"]).all()
+    assert (screened["yhat_upper"] > screened["y"]).all()
+
+    # a point off the screen runs the model for all of the new points
+    input_data.loc[58, "y"] = 150.0
+    expected = get_processor(input_data, False).predict()
+    output = get_processor(input_data, True).predict()
+
+    assert not output["is_screened"].any()
+    pd.testing.assert_frame_equal(output.drop(columns="is_screened"), expected)
+
+
+@pytest.mark.parametrize("seasonality", [["W"], ["D"], ["M", "D", "W"]])
+@pytest.mark.parametrize(
+    "input_data_str,last_date_in_db,anomaly_period,frequency",
+    testdata_predict_rolling,
+    ids=["daily", "hourly"],
+)
+def test_rolling_median_seasonality(
+    seasonality, input_data_str, last_date_in_db, anomaly_period, frequency
+):
+    """Tests that seasonal buckets give the same bounds in batch and one by one."""
+    input_data = load_input_data(input_data_str)
+    model_kwargs = {"seasonality": seasonality}
+    processor = ProcessAnomalyDetection(
+        "RollingMedianModel",
+        input_data,
+        last_date_in_db,
+        anomaly_period,
+        "test_table",
+        frequency,
+        "medium",
+        14,
+        "overall",
+        None,
+        model_kwargs,
+    )
+    model = MODEL_MAPPER["RollingMedianModel"](model_kwargs=model_kwargs)
+
+    rolling = processor._predict_rolling(model)
+    processor._predict_rolling = lambda model: None
+    expected = processor._predict(model)
+    unbucketed = ProcessAnomalyDetection(
+        "RollingMedianModel",
+        input_data,
+        last_date_in_db,
+        anomaly_period,
+        "test_table",
+        frequency,
+        "medium",
+        14,
+        "overall",
+        None,
+        {},
+    )._predict_rolling(MODEL_MAPPER["RollingMedianModel"]())
+
+    assert rolling["dt"].to_list() == expected["dt"].to_list()
+    for col in ["yhat_lower", "yhat_upper", "severity"]:
+        np.testing.assert_allclose(
+            rolling[col].to_numpy(), expected[col].to_numpy(dtype=float), rtol=1e-9
+        )
+    if frequency == "H" and seasonality == ["D"]:
+        assert not np.allclose(rolling["yhat_upper"], unbucketed["yhat_upper"])
+    else:
+        # too few weeks in the period for weekly buckets, all points are used
+        np.testing.assert_allclose(rolling["yhat_upper"], unbucketed["yhat_upper"])
+
+
+@pytest.mark.parametrize(
+    "model_name",
+    ["StandardDeviationModel", "EWMAModel", "EWSTDModel", "RollingMedianModel"],
+)
+@pytest.mark.parametrize(
+    "old_sensitivity,new_sensitivity", [("low", "high"), ("high", "medium")]
+)
+def test_rescale_bounds_to_sensitivity(model_name, old_sensitivity, new_sensitivity):
+    """Tests that rescaled bounds match the bounds predicted at a sensitivity."""
+    input_data_str, last_date_in_db, anomaly_period, frequency = (
+        testdata_predict_rolling[0]
+    )
+    input_data = load_input_data(input_data_str)
+
+    def predict(sensitivity):
+        return ProcessAnomalyDetection(
+            model_name,
+            input_data,
+            last_date_in_db,
+            anomaly_period,
+            "test_table",
+            frequency,
+            sensitivity,
+            14,
+            "overall",
+            None,
+            {},
+        )._predict_rolling(MODEL_MAPPER[model_name]())
+
+    old = predict(old_sensitivity)
+    new = predict(new_sensitivity)
+    model = MODEL_MAPPER[model_name]
+    ratio = model.get_bounds_scale(new_sensitivity) / model.get_bounds_scale(
+        old_sensitivity
+    )
+
+    np.testing.assert_allclose(new["yhat"], old["yhat"], rtol=1e-9)
+    np.testing.assert_allclose(new["std_dev"], old["std_dev"], rtol=1e-9)
+    np.testing.assert_allclose(
+        new["yhat_lower"], old["yhat"] - (old["yhat"] - old["yhat_lower"]) * ratio
+    )
+    np.testing.assert_allclose(
+        new["yhat_upper"], old["yhat"] + (old["yhat_upper"] - old["yhat"]) * ratio
+    )
+
+
+@pytest.mark.parametrize("model_name", ["ProphetModel", "ETSModel"])
+def test_forecast_interval_bounds_not_rescaled(model_name):
+    """Tests that models with forecast intervals are not rescaled."""
+    with pytest.raises(NotImplementedError):
+        MODEL_MAPPER[model_name].get_bounds_scale("high")
@@ -11,6 +11,9 @@ from chaos_genius.core.anomaly.utils import (
     get_timedelta,
     date_time_checker,
     fill_data,
+    fill_resampled_series,
+    get_fill_dates,
+    get_series_type_key,
 )
 
 
@@ -110,3 +113,85 @@ def test_fill_data(
         input_data, dt_col, metric_col, last_date, period, end_date, frequency
     )
     assert_series_equal(output.iloc[-1], expected, check_names=False)
+
+
+def test_get_series_type_key():
+    """Tests that subgroups match regardless of their keys' order."""
+    assert get_series_type_key(None) is None
+    assert get_series_type_key({"b": "1", "a": "2"}) == '{"a": "2", "b": "1"}'
+    assert get_series_type_key('{"b": "1", "a": "2"}') == '{"a": "2", "b": "1"}'
+
+
+@pytest.mark.parametrize(
+    "frequency, start_date",
+    [("D", datetime(2022, 1, 1)), ("H", datetime(2022, 1, 9, 15))],
+    ids=["daily", "hourly"],
+)
+def test_fill_data_start_and_end(frequency, start_date):
+    """Tests that missing start and end dates are filled, leaving the input as is."""
+    input_data = pd.DataFrame(
+        {
+            "dt": ["2022-01-05 10:00:00", "2022-01-06 00:00:00"],
+            "y": [1.0, 2.0],
+            "count": [3, 4],
+        }
+    )
+    output = fill_data(
+        input_data, "dt", "y", datetime(2022, 1, 10), 10, datetime(2022, 1, 12),
+        frequency, "count",
+    )
+
+    assert output["dt"].to_list() == [
+        start_date,
+        datetime(2022, 1, 5, 10),
+        datetime(2022, 1, 6),
+        datetime(2022, 1, 12),
+    ]
+    assert output["y"].to_list() == [0, 1, 2, 0]
+    assert output["count"].to_list() == [0, 3, 4, 0]
+    assert input_data["dt"].to_list() == ["2022-01-05 10:00:00", "2022-01-06 00:00:00"]
+
+    # dates present at the frequency's precision are not filled again
+    output = fill_data(
+        input_data, "dt", "y", datetime(2022, 1, 5, 10), 1, datetime(2022, 1, 6),
+        frequency, "count",
+    )
+    assert len(output) == 2
+
+
+@pytest.mark.parametrize("agg", ["sum", "mean", "count"])
+def test_fill_resampled_series(agg):
+    """Tests that filling resampled data matches resampling filled data."""
+    input_data = pd.DataFrame(
+        {
+            "dt": pd.to_datetime(["2022-01-05", "2022-01-05", "2022-01-08"]),
+            "y": [1.0, 2.0, 3.0],
+        }
+    )
+    fill_dates = get_fill_dates(datetime(2022, 1, 10), 8, datetime(2022, 1, 11), "D")
+    assert fill_dates == (datetime(2022, 1, 3), datetime(2022, 1, 11))
+
+    expected = (
+        fill_data(input_data, "dt", "y", datetime(2022, 1, 10), 8,
+                  datetime(2022, 1, 11), "D")
+        .set_index("dt")
+        .resample("D")["y"]
+        .agg(agg)
+    )
+    if agg == "mean":
+        expected = expected.fillna(0)
+
+    index = pd.date_range("2022-01-01", "2022-01-12", freq="D")
+    resampled = input_data.set_index("dt").resample("D")["y"]
+    output = fill_resampled_series(
+        resampled.agg(agg).reindex(index),
+        resampled.size().reindex(index).fillna(0) > 0,
+        list(fill_dates),
+        agg,
+        "D",
+    )
+
+    assert output.isna().to_list() == [True] * 2 + [False] * 9 + [True]
+    assert_series_equal(
+        output.dropna(), expected.astype(float), check_names=False, check_freq=False
+    )
@@ -0,0 +1,86 @@
+"""Tests for bulk writes to the metadata database."""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from chaos_genius.databases.bulk_writer import _copy_insert, write_dataframe
+
+
+class FakeCursor:
+    """Cursor which records the COPY statements run on it."""
+
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, file):
+        self.copies.append((sql, file.read()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeConnection:
+    """SQLAlchemy connection wrapping a DBAPI connection with a FakeCursor."""
+
+    def __init__(self):
+        self.connection = self
+        self.fake_cursor = FakeCursor()
+
+    def cursor(self):
+        return self.fake_cursor
+
+
+class FakeTable:
+    """Table as passed to to_sql insert methods."""
+
+    schema = None
+    name = "anomaly_data_output"
+
+
+def test_copy_insert():
+    """Tests that rows are sent as CSV, with None as NULL."""
+    conn = FakeConnection()
+    rows = [
+        (0, datetime(2022, 1, 1), 1.5, None, '{"city": "a, b"}'),
+        (1, datetime(2022, 1, 2), 2.0, 1, None),
+        # empty strings are quoted, so COPY does not read them as NULL
+        (2, datetime(2022, 1, 3), 3.0, 0, ""),
+    ]
+
+    _copy_insert(
+        FakeTable(), conn, ["index", "data_datetime", "y", "is_anomaly", "series_type"],
+        iter(rows),
+    )
+
+    assert conn.fake_cursor.copies == [
+        (
+            'COPY "anomaly_data_output" ("index", "data_datetime", "y", '
+            '"is_anomaly", "series_type") FROM STDIN WITH (FORMAT CSV)',
+            '0,2022-01-01 00:00:00,1.5,,"{""city"": ""a, b""}"\n'
+            "1,2022-01-02 00:00:00,2.0,1,\n"
+            '2,2022-01-03 00:00:00,3.0,0,""\n',
+        )
+    ]
+
+
+def test_write_dataframe_without_copy():
+    """Tests that databases without COPY get the rows with INSERTs."""
+    engine = create_engine("sqlite://")
+    df = pd.DataFrame(
+        {"y": [1.0, np.nan, 3.0], "series_type": ['{"city": "a"}', None, ""]},
+        index=[0, 1, 0],
+    )
+
+    write_dataframe(df, "anomaly_data_output", engine=engine)
+    write_dataframe(df, "anomaly_data_output", engine=engine)
+
+    written = pd.read_sql("select * from anomaly_data_output", engine)
+    assert written["index"].tolist() == [0, 1, 0] * 2
+    assert written["y"].isna().tolist() == [False, True, False] * 2
+    assert written["series_type"].tolist() == ['{"city": "a"}', None, ""] * 2
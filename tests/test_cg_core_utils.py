@@ -1,10 +1,13 @@
 """Tests for util functions in chaos_genius.core.utils.utils module."""
 
+import numpy as np
 import pandas as pd
 
 from chaos_genius.core.utils.utils import (
+    SubgroupIndex,
     get_subgroup_from_df,
     get_user_string_from_subgroup_dict,
+    is_string_column,
 )
 
 
@@ -34,6 +37,49 @@ def test_get_subgroup_from_df():
     test_df_subgroup = get_subgroup_from_df(df, subgroup)
     assert (actual_df_subgroup == test_df_subgroup).all().all()
 
+    # categorical dimensions
+    cat_df = df.astype({"sg1": "category", "sg2": "category"})
+    test_df_subgroup = get_subgroup_from_df(cat_df, subgroup)
+    assert test_df_subgroup.index.tolist() == actual_df_subgroup.index.tolist()
+
+
+def test_subgroup_index():
+    """Tests that `SubgroupIndex` finds the same rows as `get_subgroup_from_df`."""
+    df = pd.DataFrame(
+        {
+            "sg1": ["A1", "A1", "A2", "A2", "A1", None, "A2", "A1"],
+            "sg2": ["B1", "B2", "B2", "B1", "B1", "B2", None, "B2"],
+            "m1": range(8),
+        },
+        index=[10, 11, 12, 13, 14, 15, 16, 17],
+    )
+    subgroups = [
+        {"sg1": "A1"},
+        {"sg2": "B2"},
+        {"sg1": "A2", "sg2": "B1"},
+        {"sg2": "B1", "sg1": "A1"},
+        {"sg1": "A3"},
+        {"sg1": "A2", "sg2": "B3"},
+    ]
+
+    for data in [df, df.astype({"sg1": "category", "sg2": "category"})]:
+        index = SubgroupIndex(data)
+        for subgroup in subgroups:
+            expected = get_subgroup_from_df(data, subgroup)
+            actual = index.get_subgroup_df(subgroup)
+            assert actual.index.tolist() == expected.index.tolist()
+            assert np.array_equal(
+                index.get_rows(subgroup), data.index.get_indexer(expected.index)
+            )
+
+
+def test_is_string_column():
+    """Tests for `is_string_column`."""
+    assert is_string_column(pd.Series(["a", "b"]))
+    assert is_string_column(pd.Series(["a", "b"], dtype="category"))
+    assert not is_string_column(pd.Series([1, 2]))
+    assert not is_string_column(pd.Series([1, 2], dtype="category"))
+
 
 def test_get_user_string_from_subgroup_dict():
     """Tests for `get_user_string_from_subgroup_dict`."""
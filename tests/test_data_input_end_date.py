@@ -1,7 +1,11 @@
 """Tests for end_date calculation in Anomaly and RCA data loading calls."""
 
-from datetime import datetime
+from datetime import date, datetime
 
+import pytest
+
+from chaos_genius.controllers import kpi_controller
+from chaos_genius.core.utils.data_loader import DataLoader
 from chaos_genius.core.utils.end_date import load_input_data_end_date
 
 
@@ -21,3 +25,32 @@ def test_load_input_data_end_date():
     kpi_info["anomaly_params"] = {"frequency": "H"}
     end_date = load_input_data_end_date(kpi_info)
     assert end_date == datetime(2021, 10, 2).date()
+
+
+def test_get_end_date_for_rca_kpi(monkeypatch):
+    """Test that the RCA end date is found with one cached query."""
+    last_dates = {1: date(2021, 10, 1), 2: None}
+    calls = []
+
+    def mock_init(self, kpi_info, end_date=None, days_before=None, **kwargs):
+        self.kpi_info = kpi_info
+        calls.append((kpi_info["id"], end_date, days_before))
+
+    def mock_get_last_date(self):
+        return last_dates[self.kpi_info["id"]]
+
+    monkeypatch.setattr(DataLoader, "__init__", mock_init)
+    monkeypatch.setattr(DataLoader, "get_last_date", mock_get_last_date)
+    monkeypatch.setattr(kpi_controller, "_LAST_DATA_DATE_CACHE", {})
+
+    end_date = date(2021, 10, 3)
+    assert kpi_controller._get_end_date_for_rca_kpi({"id": 1}, end_date) == date(
+        2021, 10, 1
+    )
+    assert not kpi_controller._is_data_present_for_end_date({"id": 1}, end_date)
+    assert calls == [
+        (1, end_date, kpi_controller.MAX_SUMMARY_DEEPDRILLS_SLACK_DAYS)
+    ]
+
+    with pytest.raises(ValueError):
+        kpi_controller._get_end_date_for_rca_kpi({"id": 2}, end_date)
@@ -1,12 +1,16 @@
 """Tests for the data_loader module."""
 import re
+import time
 from dataclasses import dataclass
 from datetime import date, timedelta
 
+import pandas as pd
 import pytest
+import pytz
 from _pytest.monkeypatch import MonkeyPatch
 
-from chaos_genius.core.utils import data_loader
+from chaos_genius.core.utils import chunk_aggregator, data_cache, data_loader
+from chaos_genius.core.utils.constants import SUPPORTED_TIMEZONES
 from chaos_genius.databases.models.data_source_model import DataSource
 
 
@@ -46,7 +50,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
     # tail
     tail = 5
     dl = data_loader.DataLoader(kpi_info, tail=tail)
-    output_query = f"""select * from "cloud_cost" limit {tail}"""
+    output_query = f"""select "date", "cloud_cost" from "cloud_cost" limit {tail}"""
     assert output_query == dl._build_query().strip()
 
     # count
@@ -68,9 +72,10 @@ def test_data_loader(monkeypatch: MonkeyPatch):
 
     dl = data_loader.DataLoader(kpi_info)
     output_query = (
-        r"select \* from \(select \* from cloud_cost\) as \"[a-z]{10}\""
+        'select "date", "cloud_cost" from '
+        + '(select * from cloud_cost) as "cg_kpi_query"'
     )
-    assert re.match(output_query, dl._build_query().strip())
+    assert output_query == dl._build_query().strip()
 
     # tests for different date inputs
     kpi_info = {
@@ -87,21 +92,21 @@ def test_data_loader(monkeypatch: MonkeyPatch):
 
     # no end_date, no start_date, no days_before
     dl = data_loader.DataLoader(kpi_info)
-    output_query = """select * from "cloud_cost\""""
+    output_query = """select "date", "cloud_cost" from "cloud_cost\""""
     assert output_query == dl._build_query().strip()
 
     # end_date, no start_date, no days_before
     end_date = date(2020, 1, 1)
     dl = data_loader.DataLoader(kpi_info, end_date=end_date)
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" < """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00'"""
     assert output_query == dl._build_query().strip()
 
     # no end_date, start_date, no days_before
     start_date = date(2019, 1, 1)
     dl = data_loader.DataLoader(kpi_info, start_date=start_date)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00'"""
     assert output_query == dl._build_query().strip()
 
@@ -112,7 +117,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00'"""
     assert output_query == dl._build_query().strip()
@@ -133,7 +138,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
     )
     start_date = end_date - timedelta(days=days_before)
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00'"""
     assert output_query == dl._build_query().strip()
@@ -146,7 +151,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
     )
     end_date = start_date + timedelta(days=days_before)
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00'"""
     assert output_query == dl._build_query().strip()
@@ -175,7 +180,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T05:30:00' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T05:30:00'"""
     assert output_query == dl._build_query().strip()
@@ -183,7 +188,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
     data_source["database_timezone"] = "America/New_York"
     start_date = start_date - timedelta(days=1)
     end_date = end_date - timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T20:00:00' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T20:00:00'"""
 
@@ -196,7 +201,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+00:00' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+00:00'"""
     assert output_query == dl._build_query().strip()
@@ -204,7 +209,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
     data_source["database_timezone"] = "America/New_York"
     start_date = start_date - timedelta(days=1)
     end_date = end_date - timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+00:00' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+00:00'"""
 
@@ -224,7 +229,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+05:30' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+05:30'"""
     assert output_query == dl._build_query().strip()
@@ -236,7 +241,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from `cloud_cost` where `date` >= """ \
+    output_query = """select `date`, `cloud_cost` from `cloud_cost` where `date` >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+05:30' and `date` < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+05:30'"""
     assert output_query == dl._build_query().strip()
@@ -250,7 +255,9 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "test-ILLEGAL-schema"."CLOUD_COST" where """ \
+    output_query = """select "DATE", "CLOUD_COST" from """ \
+        + """"test-ILLEGAL-schema"."CLOUD_COST" """ \
+        + """where """ \
         + f""""DATE" >= '{start_date.strftime("%Y-%m-%d")}T00:00:00+05:30' and """ \
         + f""""DATE" < '{end_date.strftime("%Y-%m-%d")}T00:00:00+05:30'"""
     assert output_query == dl._build_query().strip()
@@ -262,7 +269,8 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "PUBLIC"."CLOUD_COST" where "DATE" >= """ \
+    output_query = """select "DATE", "CLOUD_COST" from "PUBLIC"."CLOUD_COST" """ \
+        + """where "DATE" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+05:30' and "DATE" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+05:30'"""
     assert output_query == dl._build_query().strip()
@@ -275,7 +283,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "public"."cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "public"."cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+05:30' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+05:30'"""
     assert output_query == dl._build_query().strip()
@@ -288,7 +296,7 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from "public"."cloud_cost" where "date" >= """ \
+    output_query = """select "date", "cloud_cost" from "public"."cloud_cost" where "date" >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+05:30' and "date" < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+05:30'"""
     assert output_query == dl._build_query().strip()
@@ -301,7 +309,797 @@ def test_data_loader(monkeypatch: MonkeyPatch):
         kpi_info, end_date=end_date, start_date=start_date
     )
     end_date = end_date + timedelta(days=1)
-    output_query = """select * from `public`.`cloud_cost` where `date` >= """ \
+    output_query = """select `date`, `cloud_cost` from `public`.`cloud_cost` where `date` >= """ \
         + f"""'{start_date.strftime("%Y-%m-%d")}T00:00:00+05:30' and `date` < """ \
         + f"""'{end_date.strftime("%Y-%m-%d")}T00:00:00+05:30'"""
     assert output_query == dl._build_query().strip()
+
+
+def test_data_loader_pushdown(monkeypatch: MonkeyPatch):
+    """Test the queries generated with aggregation pushdown."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "aggregation": "sum",
+        "dimensions": ["region"],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(data_loader, "TIMEZONE", "UTC")
+    dates = {"start_date": date(2022, 1, 1), "end_date": date(2022, 1, 31)}
+
+    dl = data_loader.DataLoader(kpi_info, pushdown_frequency="H", **dates)
+    output_query = (
+        """select date_trunc('hour', "date") as "date", "region", """
+        + """sum("cloud_cost") as "cloud_cost", """
+        + """count("cloud_cost") as "cg_pushdown_count", """
+        + """min("cloud_cost") as "cg_pushdown_min", """
+        + """max("cloud_cost") as "cg_pushdown_max" from "cloud_cost" """
+        + f"""where {" and ".join(dl._build_date_filter())} """
+        + """group by date_trunc('hour', "date"), "region\""""
+    )
+    assert output_query == dl._build_query().strip()
+
+    # count queries are not aggregated
+    output_query = 'select count(*) from "cloud_cost" where ' + " and ".join(
+        dl._build_date_filter()
+    )
+    assert output_query == dl._build_query(count=True).strip()
+
+    # count KPIs can have categorical metrics
+    kpi_info["aggregation"] = "count"
+    data_source["connection_type"] = "MySQL"
+    dl = data_loader.DataLoader(kpi_info, pushdown_frequency="D", **dates)
+    output_query = (
+        """select TIMESTAMP(DATE(`date`)) as `date`, `region`, """
+        + """count(`cloud_cost`) as `cloud_cost`, """
+        + """count(`cloud_cost`) as `cg_pushdown_count` from `cloud_cost` """
+        + f"""where {" and ".join(dl._build_date_filter())} """
+        + """group by TIMESTAMP(DATE(`date`)), `region`"""
+    )
+    assert output_query == dl._build_query().strip()
+
+    # the date range is needed to check the timezone offsets
+    dl = data_loader.DataLoader(kpi_info, pushdown_frequency="D")
+    assert dl.stream_aggregation
+
+
+@pytest.mark.parametrize(
+    "database_timezone, reporting_timezone, frequency, pushdown",
+    [
+        ("Etc/UTC", "UTC", "D", True),
+        ("Asia/Kolkata", "Asia/Kolkata", "D", True),
+        ("Asia/Tokyo", "UTC", "H", True),
+        ("Asia/Tokyo", "UTC", "D", False),
+        ("Asia/Kolkata", "UTC", "H", False),
+        ("Europe/London", "America/New_York", "H", True),
+        ("Europe/London", "America/New_York", "D", False),
+    ],
+)
+def test_data_loader_pushdown_timezones(
+    monkeypatch: MonkeyPatch,
+    database_timezone,
+    reporting_timezone,
+    frequency,
+    pushdown,
+):
+    """Test that the database only truncates data in the reporting timezone."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "aggregation": "sum",
+        "dimensions": [],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": database_timezone,
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(data_loader, "TIMEZONE", reporting_timezone)
+
+    # raw rows every 10 minutes, in the database timezone
+    raw_df = pd.DataFrame(
+        {
+            "date": pd.date_range("2022-01-01", "2022-01-15", freq="10min"),
+            "cloud_cost": 1.0,
+        }
+    )
+
+    def run_query(self, query, use_cache=True):
+        # the database truncates in the database timezone
+        df = raw_df.assign(date=raw_df["date"].dt.floor(frequency))
+        return (
+            df.groupby("date")["cloud_cost"]
+            .agg(["sum", "count", "min", "max"])
+            .rename(
+                columns={
+                    "sum": "cloud_cost",
+                    "count": data_loader.PUSHDOWN_COUNT_COLUMN,
+                    "min": data_loader.PUSHDOWN_MIN_COLUMN,
+                    "max": data_loader.PUSHDOWN_MAX_COLUMN,
+                }
+            )
+            .reset_index()
+        )
+
+    def iter_query_chunks(self, query):
+        for i in range(0, len(raw_df), 500):
+            yield raw_df.iloc[i:i + 500].reset_index(drop=True)
+
+    dates = {"start_date": date(2022, 1, 2), "end_date": date(2022, 1, 13)}
+    dl = data_loader.DataLoader(kpi_info, pushdown_frequency=frequency, **dates)
+    monkeypatch.setattr(data_loader.DataLoader, "_run_query", run_query)
+    monkeypatch.setattr(type(dl.db_connection), "iter_query_chunks", iter_query_chunks)
+    assert dl.stream_aggregation != pushdown
+    df = dl.get_data().sort_values("date", ignore_index=True)
+
+    # same buckets as aggregating after the conversion to the reporting timezone
+    expected = (
+        data_loader.DataLoader(
+            kpi_info, pushdown_frequency=frequency, stream_aggregation=True, **dates
+        )
+        .get_data()
+        .sort_values("date", ignore_index=True)
+    )
+    assert (df["date"] == df["date"].dt.floor(frequency)).all()
+    assert df["date"].tolist() == expected["date"].tolist()
+    assert df["cloud_cost"].tolist() == expected["cloud_cost"].tolist()
+
+    # aware datetimes are truncated in the database session's timezone
+    kpi_info["timezone_aware"] = True
+    dl = data_loader.DataLoader(kpi_info, pushdown_frequency=frequency, **dates)
+    assert dl.stream_aggregation
+
+    # BigQuery truncates timestamp columns in UTC, London is at UTC in January
+    data_source["connection_type"] = "BigQuery"
+    kpi_info["timezone_aware"] = False
+    dl = data_loader.DataLoader(kpi_info, pushdown_frequency=frequency, **dates)
+    assert dl.stream_aggregation != (
+        pushdown and database_timezone in ("Etc/UTC", "Europe/London")
+    )
+
+
+def test_data_loader_projection(monkeypatch: MonkeyPatch):
+    """Test that only the KPI columns are selected."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "count_column": "num_rows",
+        "dimensions": ["region", "date"],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    dl = data_loader.DataLoader(kpi_info)
+    output_query = (
+        """select "date", "cloud_cost", "region", "num_rows" from "cloud_cost\""""
+    )
+    assert output_query == dl._build_query().strip()
+
+    # validation needs all the columns
+    dl = data_loader.DataLoader(kpi_info, validation=True)
+    output_query = """select * from "cloud_cost\""""
+    assert output_query == dl._build_query().strip()
+
+
+def test_data_loader_cache(monkeypatch: MonkeyPatch, tmp_path):
+    """Test that only missing and restated days are fetched with the cache."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "dimensions": [],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(data_cache, "KPI_DATA_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_cache, "KPI_DATA_CACHE_RESTATEMENT_DAYS", 2)
+
+    fetched_ranges = []
+
+    def load_range(self, start_date, end_date):
+        fetched_ranges.append((start_date, end_date))
+        dates = pd.date_range(
+            start_date, pd.Timestamp(end_date) - pd.Timedelta(hours=6), freq="6H"
+        )
+        return pd.DataFrame({"date": dates, "cloud_cost": 1.0})
+
+    monkeypatch.setattr(data_loader.DataLoader, "_load_range", load_range)
+
+    def get_data(end_date):
+        return data_loader.DataLoader(
+            kpi_info, start_date=date(2022, 1, 1), end_date=end_date, use_cache=True
+        ).get_data()
+
+    df = get_data(date(2022, 1, 10))
+    assert fetched_ranges == [(date(2022, 1, 1), date(2022, 1, 11))]
+    assert len(df) == 10 * 4
+
+    # only the new days and the last 2 cached days are fetched
+    fetched_ranges.clear()
+    df = get_data(date(2022, 1, 12))
+    assert fetched_ranges == [(date(2022, 1, 9), date(2022, 1, 13))]
+    assert len(df) == 12 * 4
+    assert df["date"].is_unique
+    assert df["date"].min() == pd.Timestamp(2022, 1, 1)
+    assert df["date"].max() == pd.Timestamp(2022, 1, 12, 18)
+
+    # ranges inside the cache, before the restated days, are not fetched
+    fetched_ranges.clear()
+    df = data_loader.DataLoader(
+        kpi_info, start_date=date(2022, 1, 2), end_date=date(2022, 1, 5), use_cache=True
+    ).get_data()
+    assert fetched_ranges == []
+    assert len(df) == 4 * 4
+
+    # editing the KPI definition discards the cache
+    fetched_ranges.clear()
+    kpi_info["metric"] = "cloud_usage"
+    get_data(date(2022, 1, 12))
+    assert fetched_ranges == [(date(2022, 1, 1), date(2022, 1, 13))]
+
+    fetched_ranges.clear()
+    data_cache.invalidate_kpi_data_cache(kpi_info["id"])
+    get_data(date(2022, 1, 12))
+    assert fetched_ranges == [(date(2022, 1, 1), date(2022, 1, 13))]
+
+
+@pytest.mark.parametrize(
+    "database_timezone, pushdown_frequency",
+    [
+        ("Asia/Kolkata", None),
+        ("Asia/Kolkata", "H"),
+        ("Asia/Kolkata", "D"),
+        ("Asia/Tokyo", "H"),
+    ],
+)
+def test_data_loader_cache_timezones(
+    monkeypatch: MonkeyPatch, tmp_path, database_timezone, pushdown_frequency
+):
+    """Test that cached loads equal uncached loads for other database timezones."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "aggregation": "sum",
+        "dimensions": [],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": database_timezone,
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(data_loader, "TIMEZONE", "UTC")
+    monkeypatch.setattr(data_cache, "KPI_DATA_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_cache, "KPI_DATA_CACHE_RESTATEMENT_DAYS", 2)
+
+    # raw rows every 10 minutes, in the database timezone
+    raw_df = pd.DataFrame(
+        {
+            "date": pd.date_range("2021-12-30", "2022-01-20", freq="10min"),
+            "cloud_cost": 1.0,
+        }
+    )
+
+    def filter_raw_df(query):
+        start, end = re.findall(r"'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)'", query)
+        return raw_df[(raw_df["date"] >= start) & (raw_df["date"] < end)]
+
+    def run_query(self, query, use_cache=True):
+        df = filter_raw_df(query)
+        if "group by" not in query:
+            return df.reset_index(drop=True)
+        # the database truncates in the database timezone
+        df = df.assign(date=df["date"].dt.floor(pushdown_frequency))
+        return (
+            df.groupby("date")["cloud_cost"]
+            .agg(["sum", "count", "min", "max"])
+            .rename(
+                columns={
+                    "sum": "cloud_cost",
+                    "count": data_loader.PUSHDOWN_COUNT_COLUMN,
+                    "min": data_loader.PUSHDOWN_MIN_COLUMN,
+                    "max": data_loader.PUSHDOWN_MAX_COLUMN,
+                }
+            )
+            .reset_index()
+        )
+
+    def iter_query_chunks(self, query):
+        df = filter_raw_df(query)
+        for i in range(0, len(df), 500):
+            yield df.iloc[i:i + 500].reset_index(drop=True)
+
+    monkeypatch.setattr(data_loader.DataLoader, "_run_query", run_query)
+
+    def get_data(end_date, use_cache):
+        dl = data_loader.DataLoader(
+            kpi_info,
+            start_date=date(2022, 1, 1),
+            end_date=end_date,
+            pushdown_frequency=pushdown_frequency,
+            use_cache=use_cache,
+        )
+        monkeypatch.setattr(
+            type(dl.db_connection), "iter_query_chunks", iter_query_chunks
+        )
+        return (
+            dl.get_data()
+            .sort_values("date", ignore_index=True)[["date", "cloud_cost"]]
+        )
+
+    # the second load reads the first days from the cache
+    for end_date in [date(2022, 1, 10), date(2022, 1, 15)]:
+        cached_df = get_data(end_date, use_cache=True)
+        uncached_df = get_data(end_date, use_cache=False)
+        pd.testing.assert_frame_equal(cached_df, uncached_df)
+        assert cached_df["date"].min() == pd.Timestamp(2022, 1, 1)
+        assert cached_df["date"].max() < pd.Timestamp(end_date + timedelta(days=1))
+
+
+def test_data_cache_write_outside_range(monkeypatch: MonkeyPatch, tmp_path):
+    """Test that rows outside of the written range are not dropped silently."""
+    monkeypatch.setattr(data_cache, "KPI_DATA_CACHE_DIR", str(tmp_path))
+    cache = data_cache.KpiDataCache({"id": 1, "datetime_column": "date"})
+
+    df = pd.DataFrame(
+        {
+            "date": pd.date_range("2022-01-01", "2022-01-03", freq="6H"),
+            "cloud_cost": 1.0,
+        }
+    )
+    with pytest.raises(ValueError):
+        cache.write(df, date(2022, 1, 1), date(2022, 1, 3))
+
+    cache.write(df, date(2022, 1, 1), date(2022, 1, 4))
+    pd.testing.assert_frame_equal(cache.read(date(2022, 1, 1), date(2022, 1, 4)), df)
+
+
+def test_data_loader_stream_aggregation(monkeypatch: MonkeyPatch):
+    """Test that streamed chunks are aggregated like the pushdown query."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "aggregation": "sum",
+        "dimensions": ["region"],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(data_loader, "TIMEZONE", "UTC")
+
+    raw_df = pd.DataFrame(
+        {
+            "date": pd.date_range("2022-01-01", periods=200, freq="7min"),
+            "region": ["us", "eu", None, "us"] * 50,
+            "cloud_cost": [float(i) for i in range(200)],
+        }
+    )
+    queries = []
+
+    def iter_query_chunks(self, query):
+        queries.append(query)
+        for i in range(0, len(raw_df), 30):
+            yield raw_df.iloc[i:i + 30].reset_index(drop=True)
+
+    dl = data_loader.DataLoader(
+        kpi_info, pushdown_frequency="H", stream_aggregation=True
+    )
+    monkeypatch.setattr(
+        type(dl.db_connection), "iter_query_chunks", iter_query_chunks
+    )
+    df = dl.get_data()
+
+    # raw rows are streamed, they are not aggregated in the database
+    assert queries == ['select "date", "cloud_cost", "region" from "cloud_cost"']
+
+    expected = (
+        raw_df.groupby(
+            [raw_df["date"].dt.floor("H"), "region"], dropna=False
+        )["cloud_cost"]
+        .agg(["sum", "count", "min", "max"])
+        .reset_index()
+    )
+    df = df.sort_values(["date", "region"]).reset_index(drop=True)
+    expected = expected.sort_values(["date", "region"]).reset_index(drop=True)
+    assert df["date"].tolist() == expected["date"].tolist()
+    assert df["region"].fillna("").tolist() == expected["region"].fillna("").tolist()
+    assert df["cloud_cost"].tolist() == expected["sum"].tolist()
+    assert df[data_loader.PUSHDOWN_COUNT_COLUMN].tolist() == expected["count"].tolist()
+    assert df[data_loader.PUSHDOWN_MIN_COLUMN].tolist() == expected["min"].tolist()
+    assert df[data_loader.PUSHDOWN_MAX_COLUMN].tolist() == expected["max"].tolist()
+
+    # count KPIs only count the metric
+    kpi_info["aggregation"] = "count"
+    dl = data_loader.DataLoader(
+        kpi_info, pushdown_frequency="D", stream_aggregation=True
+    )
+    df = dl.get_data()
+    assert df["cloud_cost"].sum() == len(raw_df)
+    assert df[data_loader.PUSHDOWN_COUNT_COLUMN].sum() == len(raw_df)
+    assert data_loader.PUSHDOWN_MAX_COLUMN not in df.columns
+
+
+def test_data_loader_partitioned_fetch(monkeypatch: MonkeyPatch):
+    """Test that partitions are fetched in parallel and assembled in order."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "dimensions": [],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(data_loader, "TIMEZONE", "UTC")
+
+    def run_query(self, query):
+        # later partitions finish first
+        time.sleep((date(2022, 2, 1) - self.start_date).days / 1000)
+        return pd.DataFrame(
+            {
+                "date": pd.date_range(self.start_date, self.end_date, freq="D")[
+                    :-1
+                ],
+                "cloud_cost": 1.0,
+            }
+        )
+
+    monkeypatch.setattr(data_loader.DataLoader, "_run_query", run_query)
+
+    dl = data_loader.DataLoader(
+        kpi_info,
+        start_date=date(2022, 1, 1),
+        end_date=date(2022, 1, 10),
+        fetch_partitions=4,
+    )
+    assert dl._get_partition_ranges() == [
+        (date(2022, 1, 1), date(2022, 1, 3)),
+        (date(2022, 1, 3), date(2022, 1, 6)),
+        (date(2022, 1, 6), date(2022, 1, 8)),
+        (date(2022, 1, 8), date(2022, 1, 11)),
+    ]
+    df = dl.get_data()
+    assert df["date"].tolist() == list(pd.date_range("2022-01-01", "2022-01-10"))
+
+    # no more partitions than days
+    dl = data_loader.DataLoader(
+        kpi_info,
+        start_date=date(2022, 1, 1),
+        end_date=date(2022, 1, 2),
+        fetch_partitions=4,
+    )
+    assert len(dl._get_partition_ranges()) == 2
+
+    # tail queries are not partitioned
+    dl = data_loader.DataLoader(
+        kpi_info,
+        start_date=date(2022, 1, 1),
+        end_date=date(2022, 1, 10),
+        tail=5,
+        fetch_partitions=4,
+    )
+    assert dl._get_partition_ranges() == []
+
+
+def test_get_tz_from_offset_str(monkeypatch: MonkeyPatch):
+    """Test timezone lookups from offset strings against a full scan."""
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    kpi_info = {"datetime_column": "date", "data_source": {}}
+    dl = data_loader.DataLoader(kpi_info)
+
+    def scan_tz(utc_offset):
+        for tz_name in pytz.all_timezones:
+            tz = pytz.timezone(tz_name)
+            transition_info = getattr(tz, "_transition_info", None)
+            if transition_info and transition_info[-1][0] == utc_offset:
+                return tz
+
+    for offset_str in set(SUPPORTED_TIMEZONES.values()):
+        sign = -1 if offset_str[-6] == "-" else 1
+        utc_offset = sign * timedelta(
+            hours=int(offset_str[-5:-3]), minutes=int(offset_str[-2:])
+        )
+        assert dl._get_tz_from_offset_str(offset_str) is scan_tz(utc_offset)
+
+    with pytest.raises(ValueError):
+        dl._get_tz_from_offset_str("GMT+05:17")
+
+
+def test_data_loader_categorical_dimensions(monkeypatch: MonkeyPatch):
+    """Test that string dimensions are loaded as categoricals."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "dimensions": ["region", "zone"],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    def run_query(self, query):
+        return pd.DataFrame(
+            {
+                "date": pd.date_range("2022-01-01", periods=4, freq="D"),
+                "region": ["us", "eu", "us", None],
+                "zone": [1, 2, 1, 2],
+                "cloud_cost": [1.0, 2.0, 3.0, 4.0],
+            }
+        )
+
+    monkeypatch.setattr(data_loader.DataLoader, "_run_query", run_query)
+
+    df = data_loader.DataLoader(kpi_info, categorical_dimensions=True).get_data()
+    assert df["region"].dtype == "category"
+    assert df["region"].cat.categories.tolist() == ["eu", "us"]
+    assert df["region"].isna().sum() == 1
+    # only string dimensions are encoded
+    assert df["zone"].dtype == "int64"
+    assert df["cloud_cost"].dtype == "float64"
+
+    df = data_loader.DataLoader(kpi_info).get_data()
+    assert df["region"].dtype == object
+
+
+def test_data_loader_last_date(monkeypatch: MonkeyPatch):
+    """Test that the last date with data is fetched with a single query."""
+    kpi_info = {
+        "datetime_column": "date",
+        "id": 1,
+        "kpi_query": "",
+        "kpi_type": "table",
+        "metric": "cloud_cost",
+        "dimensions": ["region"],
+        "table_name": "cloud_cost",
+        "data_source": {},
+        "filters": "",
+        "timezone_aware": False,
+    }
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "database_timezone": "Etc/UTC",
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {}},
+    }
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource(data_source)
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+    monkeypatch.setattr(data_loader, "TIMEZONE", "Asia/Kolkata")
+
+    queries = []
+    max_date = pd.Timestamp("2022-01-04 20:00:00")
+
+    def run_query(self, query, use_cache=True):
+        assert not use_cache
+        queries.append(query)
+        return pd.DataFrame({"max": [max_date]})
+
+    monkeypatch.setattr(data_loader.DataLoader, "_run_query", run_query)
+
+    dl = data_loader.DataLoader(kpi_info, end_date=date(2022, 1, 5), days_before=5)
+    # 20:00 UTC is the next day in the reporting timezone
+    assert dl.get_last_date() == date(2022, 1, 5)
+    assert len(queries) == 1
+    assert queries[0].startswith('select max("date") as "date" from "cloud_cost"')
+
+    max_date = None
+    assert dl.get_last_date() is None
+
+
+def test_chunk_aggregator_compaction(monkeypatch: MonkeyPatch):
+    """Test that large aggregates are not compacted again for every chunk."""
+    monkeypatch.setattr(chunk_aggregator, "COMPACT_THRESHOLD", 10)
+    aggregator = chunk_aggregator.ChunkAggregator(
+        dt_col="date",
+        metric_col="cloud_cost",
+        group_cols=[],
+        frequency="H",
+        count_col=data_loader.PUSHDOWN_COUNT_COLUMN,
+    )
+
+    compactions = []
+    compact = aggregator._compact
+
+    def count_compact():
+        compactions.append(len(aggregator._partials))
+        compact()
+
+    monkeypatch.setattr(aggregator, "_compact", count_compact)
+
+    # every chunk has new hours, so compacting never reduces the rows
+    dates = pd.date_range("2022-01-01", periods=500, freq="H")
+    for i in range(0, len(dates), 5):
+        aggregator.add(pd.DataFrame({"date": dates[i:i + 5], "cloud_cost": 1.0}))
+    assert len(compactions) <= 10
+
+    df = aggregator.result()
+    assert df["date"].tolist() == dates.tolist()
+    assert (df["cloud_cost"] == 1).all()
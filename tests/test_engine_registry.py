@@ -0,0 +1,98 @@
+"""Tests for the data source engine registry."""
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from chaos_genius.connectors import engine_registry, get_sqla_db_conn
+
+
+def test_engine_registry():
+    """Test that engines are shared per data source and config."""
+    created = []
+
+    def create_sqlite_engine():
+        engine = create_engine("sqlite://")
+        created.append(engine)
+        return engine
+
+    config = {"host": "localhost", "port": 5432}
+    engine = engine_registry.get_registered_engine(
+        1, "PostgresDb", config, create_sqlite_engine
+    )
+    assert engine is engine_registry.get_registered_engine(
+        1, "PostgresDb", dict(config), create_sqlite_engine
+    )
+    assert len(created) == 1
+
+    # changed connection config re-creates the engine
+    new_engine = engine_registry.get_registered_engine(
+        1, "PostgresDb", {**config, "port": 5433}, create_sqlite_engine
+    )
+    assert new_engine is not engine
+    assert len(created) == 2
+
+    # other data sources get their own engine
+    engine_registry.get_registered_engine(
+        2, "PostgresDb", config, create_sqlite_engine
+    )
+    assert len(created) == 3
+
+    engine_registry.evict_engine(1)
+    engine_registry.evict_engine(2)
+    assert 1 not in engine_registry._ENGINES
+    engine_registry.get_registered_engine(
+        1, "PostgresDb", {**config, "port": 5433}, create_sqlite_engine
+    )
+    assert len(created) == 4
+    engine_registry.evict_engine(1)
+
+
+def test_shared_db_engine():
+    """Test that connectors of the same data source share their engine."""
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "is_third_party": False,
+        "sourceConfig": {
+            "connectionConfiguration": {
+                "host": "localhost",
+                "port": 5432,
+                "username": "postgres",
+                "password": "postgres",
+                "database": "postgres",
+            }
+        },
+    }
+
+    engine = get_sqla_db_conn(data_source_info=data_source).get_shared_db_engine()
+    assert engine.pool._pre_ping
+    assert engine is get_sqla_db_conn(
+        data_source_info=data_source
+    ).get_shared_db_engine()
+
+    engine_registry.evict_engine(1)
+    assert engine is not get_sqla_db_conn(
+        data_source_info=data_source
+    ).get_shared_db_engine()
+    engine_registry.evict_engine(1)
+
+
+def test_dispose_engines_after_fork(tmp_path):
+    """Test that engines drop inherited connections without closing them."""
+    engine = engine_registry.get_registered_engine(
+        1,
+        "PostgresDb",
+        {},
+        lambda: create_engine(f"sqlite:///{tmp_path}/db.sqlite", poolclass=QueuePool),
+    )
+    with engine.connect() as connection:
+        dbapi_connection = connection.connection.connection
+    pool = engine.pool
+
+    engine_registry.dispose_engines_after_fork()
+
+    assert engine.pool is not pool
+    # the inherited connection stays open for the parent process
+    dbapi_connection.execute("select 1")
+    with engine.connect() as connection:
+        assert connection.connection.connection is not dbapi_connection
+    engine_registry.evict_engine(1)
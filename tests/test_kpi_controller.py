@@ -0,0 +1,188 @@
+"""Tests KPI Controller Functions."""
+
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from chaos_genius.controllers import kpi_controller
+from chaos_genius.core.anomaly.models import MODEL_MAPPER
+from chaos_genius.core.anomaly.prescreen import MEDIAN_MAD_ZSCORE
+from chaos_genius.core.anomaly.processor import compute_severity, detect_anomalies
+
+# anomaly_data_output without its postgres only columns
+ANOMALY_OUTPUT_TABLE = """
+CREATE TABLE anomaly_data_output (
+    id INTEGER PRIMARY KEY,
+    kpi_id INTEGER,
+    y FLOAT,
+    yhat FLOAT,
+    yhat_lower FLOAT,
+    yhat_upper FLOAT,
+    is_anomaly INTEGER,
+    severity FLOAT,
+    std_dev FLOAT,
+    is_screened BOOLEAN
+)
+"""
+
+
+def make_db(monkeypatch, outputs: pd.DataFrame):
+    """Return an engine with the given anomaly outputs, used by kpi_controller."""
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(ANOMALY_OUTPUT_TABLE)
+    outputs.to_sql("anomaly_data_output", engine, if_exists="append", index=False)
+    monkeypatch.setattr(
+        kpi_controller, "db", SimpleNamespace(session=Session(engine))
+    )
+    return engine
+
+
+def test_rescale_anomaly_output_for_kpi(monkeypatch):
+    """Tests that rescaled output matches detecting anomalies with new bounds."""
+    outputs = pd.DataFrame(
+        {
+            "id": [1, 2, 3, 4, 5, 6],
+            "kpi_id": [1, 1, 1, 1, 1, 2],
+            "y": [13.0, 7.0, 10.5, 30.0, 11.5, 13.0],
+            "yhat": [10.0, 10.0, 10.0, 10.0, 10.0, 10.0],
+            "yhat_lower": [6.0, 6.0, 6.0, 5.0, 7.0, 6.0],
+            "yhat_upper": [14.0, 14.0, 14.0, 16.0, 13.0, 14.0],
+            "is_anomaly": [0, 0, 0, 1, 0, 0],
+            "severity": [0.0, 0.0, 0.0, 50.0, 0.0, 0.0],
+            "std_dev": [2.0, 2.0, 2.0, 2.0, 1.5, 2.0],
+            "is_screened": [None, False, None, None, True, None],
+        }
+    )
+    engine = make_db(monkeypatch, outputs)
+
+    assert kpi_controller.rescale_anomaly_output_for_kpi(1, "EWSTDModel", "low", "high")
+
+    rescaled = pd.read_sql("SELECT * FROM anomaly_data_output ORDER BY id", engine)
+    model = MODEL_MAPPER["EWSTDModel"]
+    ratio = np.where(
+        outputs["is_screened"].eq(True),
+        MEDIAN_MAD_ZSCORE["high"] / MEDIAN_MAD_ZSCORE["low"],
+        model.get_bounds_scale("high") / model.get_bounds_scale("low"),
+    )
+    yhat = outputs["yhat"]
+    expected = outputs.copy()
+    expected["yhat_lower"] = yhat - (yhat - outputs["yhat_lower"]) * ratio
+    expected["yhat_upper"] = yhat + (outputs["yhat_upper"] - yhat) * ratio
+    expected = detect_anomalies(expected)
+    expected["severity"] = compute_severity(expected, outputs["std_dev"].to_numpy())
+
+    kpi_rows = outputs["kpi_id"] == 1
+    for col in ["yhat_lower", "yhat_upper", "severity"]:
+        np.testing.assert_allclose(rescaled[col][kpi_rows], expected[col][kpi_rows])
+    assert rescaled["is_anomaly"].tolist() == [1, -1, 0, 1, 0, 0]
+    assert (
+        rescaled["is_anomaly"][kpi_rows].tolist()
+        == expected["anomaly"][kpi_rows].tolist()
+    )
+    # output of other KPIs is not changed
+    pd.testing.assert_series_equal(
+        rescaled.iloc[5], outputs.iloc[5], check_names=False, check_dtype=False
+    )
+
+
+def test_rescale_anomaly_output_without_center(monkeypatch):
+    """Tests that output saved without a center is left to be run again."""
+    outputs = pd.DataFrame(
+        {
+            "id": [1, 2],
+            "kpi_id": [1, 1],
+            "y": [13.0, 7.0],
+            "yhat": [10.0, None],
+            "yhat_lower": [6.0, 6.0],
+            "yhat_upper": [14.0, 14.0],
+            "is_anomaly": [0, 0],
+            "severity": [0.0, 0.0],
+            "std_dev": [2.0, None],
+            "is_screened": [None, None],
+        }
+    )
+    engine = make_db(monkeypatch, outputs)
+
+    assert not kpi_controller.rescale_anomaly_output_for_kpi(
+        1, "EWSTDModel", "low", "high"
+    )
+    assert not kpi_controller.rescale_anomaly_output_for_kpi(
+        1, "UnknownModel", "low", "high"
+    )
+
+    pd.testing.assert_frame_equal(
+        pd.read_sql("SELECT * FROM anomaly_data_output ORDER BY id", engine),
+        outputs,
+        check_dtype=False,
+    )
+
+
+def test_rescale_anomaly_output_forecast_intervals(monkeypatch):
+    """Tests that output of models with forecast intervals is left to be run again."""
+    outputs = pd.DataFrame(
+        {
+            "id": [1],
+            "kpi_id": [1],
+            "y": [13.0],
+            "yhat": [10.0],
+            "yhat_lower": [6.0],
+            "yhat_upper": [14.0],
+            "is_anomaly": [0],
+            "severity": [0.0],
+            "std_dev": [2.0],
+            "is_screened": [None],
+        }
+    )
+    engine = make_db(monkeypatch, outputs)
+
+    assert not kpi_controller.rescale_anomaly_output_for_kpi(
+        1, "ProphetModel", "low", "high"
+    )
+    rescaled = pd.read_sql("SELECT * FROM anomaly_data_output", engine)
+    pd.testing.assert_frame_equal(rescaled, outputs, check_dtype=False)
+    """Test that last dates with data expire and are invalidated per KPI."""
+    queries = []
+
+    class FakeDataLoader:
+        def __init__(self, kpi_info, end_date, days_before):
+            self.end_date = end_date
+
+        def get_last_date(self):
+            queries.append(self.end_date)
+            return self.end_date
+
+    clock = [0.0]
+    monkeypatch.setattr(kpi_controller, "DataLoader", FakeDataLoader)
+    monkeypatch.setattr(
+        kpi_controller, "time", SimpleNamespace(monotonic=lambda: clock[0])
+    )
+    monkeypatch.setattr(kpi_controller, "_LAST_DATA_DATE_CACHE", {})
+
+    end_date = date(2022, 1, 10)
+    for kpi_id in [1, 2, 1]:
+        assert kpi_controller._get_last_data_date({"id": kpi_id}, end_date) == end_date
+    assert len(queries) == 2
+
+    # entries of the edited KPI are dropped
+    kpi_controller.invalidate_last_data_date_cache(1)
+    assert list(kpi_controller._LAST_DATA_DATE_CACHE) == [(2, end_date)]
+    kpi_controller._get_last_data_date({"id": 1}, end_date)
+    assert len(queries) == 3
+
+    # expired entries are dropped on the next write
+    clock[0] += kpi_controller.LAST_DATA_DATE_CACHE_TTL
+    kpi_controller._get_last_data_date({"id": 3}, end_date)
+    assert list(kpi_controller._LAST_DATA_DATE_CACHE) == [(3, end_date)]
+
+    # KPIs scheduled hourly are queried every time
+    hourly_kpi = {"id": 4, "scheduler_params": {"scheduler_frequency": "H"}}
+    queries.clear()
+    for _ in range(2):
+        kpi_controller._get_last_data_date(hourly_kpi, end_date)
+    assert len(queries) == 2
+    assert list(kpi_controller._LAST_DATA_DATE_CACHE) == [(3, end_date)]
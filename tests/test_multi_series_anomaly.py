@@ -0,0 +1,257 @@
+"""Tests anomaly detection of many series at once."""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from chaos_genius.core.anomaly.constants import RESAMPLE_FREQUENCY
+from chaos_genius.core.anomaly.controller import AnomalyDetectionController
+from chaos_genius.core.anomaly.multi_series import MultiSeriesAnomalyDetection
+from chaos_genius.core.anomaly.processor import ProcessAnomalyDetection
+from chaos_genius.core.anomaly.utils import fill_data
+from chaos_genius.core.utils.utils import get_subgroup_from_df
+from chaos_genius.databases.models.data_source_model import DataSource
+
+
+def load_series_data(file_name):
+    """Load the test data as several shifted and scaled series."""
+    df = pd.read_csv(file_name)
+    y = df["y"].to_numpy()
+    index = pd.DatetimeIndex(pd.to_datetime(df["dt"]))
+    data = pd.DataFrame(
+        {
+            0: y,
+            1: y * 2 + 5,
+            2: np.roll(y, 7),
+            3: y[::-1],
+            4: np.where(np.arange(len(y)) % 5 == 0, y * 3, y),
+        },
+        index=index,
+    )
+    # series with a later start, an earlier end and too few points
+    data.iloc[:10, 1] = np.nan
+    data.iloc[-6:, 2] = np.nan
+    data.iloc[:-8, 4] = np.nan
+    return data
+
+
+def predict_series(
+    model_name, data, column, last_date, period, freq, sensitivity, model_kwargs={}
+):
+    """Predict one series the usual way."""
+    series = data[column].dropna()
+    input_data = pd.DataFrame({"dt": series.index, "y": series.to_numpy()})
+    return ProcessAnomalyDetection(
+        model_name,
+        input_data,
+        last_date,
+        period,
+        "test_table",
+        freq,
+        sensitivity,
+        14,
+        "subdim",
+        None,
+        model_kwargs,
+    ).predict()
+
+
+testdata_multi_series = [
+    (
+        "tests/test_data/input_daily_data.csv",
+        [None, datetime(2022, 1, 5), None, datetime(2022, 1, 20), None],
+        20,
+        "D",
+    ),
+    (
+        "tests/test_data/input_hourly_data.csv",
+        [datetime(2022, 1, 10), None, datetime(2022, 1, 12, 5), None, None],
+        360,
+        "H",
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "model_name",
+    ["StandardDeviationModel", "EWMAModel", "EWSTDModel", "RollingMedianModel"],
+)
+@pytest.mark.parametrize("sensitivity", ["low", "high"])
+@pytest.mark.parametrize(
+    "input_data_str,last_dates,anomaly_period,frequency",
+    testdata_multi_series,
+    ids=["daily", "hourly"],
+)
+def test_multi_series_predict(
+    model_name, sensitivity, input_data_str, last_dates, anomaly_period, frequency
+):
+    """Tests that predicting all series at once matches predicting each one."""
+    data = load_series_data(input_data_str)
+    outputs = MultiSeriesAnomalyDetection(
+        model_name,
+        data,
+        last_dates,
+        anomaly_period,
+        frequency,
+        sensitivity,
+        14,
+    ).predict()
+
+    assert len(outputs) == len(last_dates)
+    for column, (output, last_date) in enumerate(zip(outputs, last_dates)):
+        expected = predict_series(
+            model_name, data, column, last_date, anomaly_period, frequency,
+            sensitivity,
+        )
+
+        assert output is not None
+        assert output.columns.to_list() == expected.columns.to_list()
+        assert output["dt"].to_list() == expected["dt"].to_list()
+        assert output["anomaly"].to_list() == expected["anomaly"].to_list()
+        for col in ["y", "yhat", "yhat_lower", "yhat_upper", "severity", "std_dev"]:
+            np.testing.assert_allclose(
+                output[col].to_numpy(dtype=float),
+                expected[col].to_numpy(dtype=float),
+                rtol=1e-9,
+            )
+
+
+def test_multi_series_rolling_median_seasonality():
+    """Tests seasonal buckets of the rolling median model on many series."""
+    data = load_series_data("tests/test_data/input_hourly_data.csv")
+    last_dates = [datetime(2022, 1, 10), None, datetime(2022, 1, 12, 5), None, None]
+    model_kwargs = {"seasonality": ["D"]}
+    outputs = MultiSeriesAnomalyDetection(
+        "RollingMedianModel", data, last_dates, 360, "H", "medium", 14, model_kwargs
+    ).predict()
+
+    for column, (output, last_date) in enumerate(zip(outputs, last_dates)):
+        expected = predict_series(
+            "RollingMedianModel", data, column, last_date, 360, "H", "medium",
+            model_kwargs,
+        )
+        assert output["dt"].to_list() == expected["dt"].to_list()
+        assert output["anomaly"].to_list() == expected["anomaly"].to_list()
+        for col in ["yhat_lower", "yhat_upper", "severity"]:
+            np.testing.assert_allclose(
+                output[col].to_numpy(dtype=float),
+                expected[col].to_numpy(dtype=float),
+                rtol=1e-9,
+            )
+
+
+def test_multi_series_unsupported():
+    """Tests that series which can't be predicted at once are left out."""
+    data = load_series_data("tests/test_data/input_daily_data.csv")
+    outputs = MultiSeriesAnomalyDetection(
+        "EWMAModel",
+        data,
+        [datetime(2022, 1, 5, 12), None, None, None, None],
+        20,
+        "D",
+        "medium",
+        14,
+    ).predict()
+
+    assert outputs[0] is None
+    assert all(output is not None for output in outputs[1:])
+    assert MultiSeriesAnomalyDetection.is_supported("EWMAModel")
+    assert not MultiSeriesAnomalyDetection.is_supported("ProphetModel")
+
+
+kpi_info = {
+    "id": 1,
+    "data_source": 1,
+    "kpi_type": "table",
+    "aggregation": "mean",
+    "datetime_column": "dt",
+    "count_column": None,
+    "table_name": "test_table",
+    "metric": "y",
+    "anomaly_params": {
+        "anomaly_period": 10,
+        "seasonality": [],
+        "sensitivity": "medium",
+        "model_name": "EWMAModel",
+        "frequency": "D",
+    },
+    "scheduler_params": {"scheduler_frequency": "D"},
+}
+
+
+@pytest.mark.parametrize("aggregation", ["mean", "sum", "count"])
+def test_get_subgroup_series_data(monkeypatch: MonkeyPatch, aggregation):
+    """Tests that subgroup series match filtering and resampling each one."""
+
+    @dataclass
+    class TestDataSource:
+        as_dict: dict
+
+    def get_data_source(*args, **kwargs):
+        return TestDataSource({"connection_type": "Postgres", "id": 1})
+
+    monkeypatch.setattr(DataSource, "get_by_id", get_data_source)
+
+    rng = np.random.default_rng(0)
+    n = 600
+    input_data = pd.DataFrame(
+        {
+            "dt": pd.Timestamp(2022, 1, 1)
+            + pd.to_timedelta(rng.integers(0, 40 * 24, n), unit="H"),
+            "city": rng.choice(["a", "b", "c"], n),
+            "device": rng.choice(["x", "y"], n),
+            "y": rng.normal(100, 10, n),
+        }
+    )
+    # a subgroup with gaps and missing values
+    sparse = (input_data["city"] == "c") & (input_data["dt"].dt.day % 3 == 0)
+    input_data = input_data[~sparse].reset_index(drop=True)
+    input_data.loc[::17, "y"] = np.nan
+
+    subgroups = [
+        {"city": "a"},
+        {"city": "c"},
+        {"city": "b", "device": "x"},
+        {"city": "c", "device": "y"},
+        {"device": "y"},
+    ]
+    last_dates = [
+        None,
+        datetime(2022, 1, 20),
+        datetime(2022, 1, 2),
+        None,
+        datetime(2022, 2, 15),
+    ]
+    end_date = datetime(2022, 2, 12)
+
+    info = dict(kpi_info, aggregation=aggregation)
+    adc = AnomalyDetectionController(info, end_date)
+    series_data = adc._get_subgroup_series_data(input_data, subgroups, last_dates)
+
+    assert len(series_data.columns) == len(subgroups)
+    for i, (subgroup, last_date) in enumerate(zip(subgroups, last_dates)):
+        filled = fill_data(
+            get_subgroup_from_df(input_data, subgroup)[["dt", "y"]],
+            "dt",
+            "y",
+            last_date,
+            10,
+            end_date,
+            "D",
+        )
+        expected = (
+            filled.set_index("dt")
+            .resample(RESAMPLE_FREQUENCY["D"])
+            .agg({"y": aggregation})["y"]
+            .fillna(0)
+        )
+
+        series = series_data[i].dropna()
+        assert series.index.to_list() == expected.index.to_list()
+        np.testing.assert_allclose(
+            series.to_numpy(), expected.to_numpy(dtype=float), rtol=1e-12
+        )
@@ -0,0 +1,148 @@
+"""Tests for the data source query result cache."""
+import os
+import pickle
+
+import pandas as pd
+
+from chaos_genius.connectors import base_db, get_sqla_db_conn, query_cache
+
+
+def test_query_cache_key():
+    """Test that cache keys only ignore insignificant query differences."""
+    config = {"host": "localhost"}
+    key = query_cache.get_query_cache_key(1, config, "select 1 from t;")
+    assert key == query_cache.get_query_cache_key(1, config, "select 1\n  from t")
+    assert key != query_cache.get_query_cache_key(2, config, "select 1 from t")
+    assert key != query_cache.get_query_cache_key(1, {}, "select 1 from t")
+    assert key != query_cache.get_query_cache_key(1, config, "select 2 from t")
+
+
+def test_disk_query_cache(tmp_path, monkeypatch):
+    """Test TTL expiry and LRU eviction of the disk cache."""
+    cache = query_cache.DiskQueryCache(str(tmp_path), ttl=60, max_entries=2)
+    df = pd.DataFrame({"a": [1, 2]})
+
+    cache.set("a", df)
+    cache.set("b", df)
+    pd.testing.assert_frame_equal(cache.get("a"), df)
+    os.utime(os.path.join(tmp_path, "b.pkl"), (0, 0))
+
+    # "b" is the least recently used
+    cache.set("c", df)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    monkeypatch.setattr(cache, "ttl", -1)
+    assert cache.get("a") is None
+    assert not os.path.exists(os.path.join(tmp_path, "a.pkl"))
+
+
+def test_run_cached_query(tmp_path, monkeypatch):
+    """Test that query results are reused unless the cache is bypassed."""
+    cache = query_cache.DiskQueryCache(str(tmp_path), ttl=60, max_entries=10)
+    monkeypatch.setattr(base_db, "QUERY_CACHE_ENABLED", True)
+    monkeypatch.setattr(base_db, "get_query_cache", lambda: cache)
+
+    data_source = {
+        "connection_type": "Postgres",
+        "id": 1,
+        "is_third_party": False,
+        "sourceConfig": {"connectionConfiguration": {"host": "localhost"}},
+    }
+    db = get_sqla_db_conn(data_source_info=data_source)
+
+    queries = []
+
+    def run_query(query):
+        queries.append(query)
+        return pd.DataFrame({"count": [len(queries)]})
+
+    monkeypatch.setattr(db, "run_query", run_query)
+
+    assert db.run_cached_query("select count(*) from t").iloc[0, 0] == 1
+    assert db.run_cached_query("select count(*)\nfrom t").iloc[0, 0] == 1
+    assert len(queries) == 1
+
+    df = db.run_cached_query("select count(*) from t", use_cache=False)
+    assert df.iloc[0, 0] == 2
+    assert db.run_cached_query("select count(*) from t").iloc[0, 0] == 2
+
+    # unsaved connection configs are not cached
+    db.data_source_id = None
+    assert db.run_cached_query("select count(*) from t").iloc[0, 0] == 3
+    assert db.run_cached_query("select count(*) from t").iloc[0, 0] == 4
+
+
+class FakeRedis:
+    """In memory stand-in for the redis commands used by the query cache."""
+
+    def __init__(self):
+        self.values = {}
+        self.scores = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def zadd(self, name, mapping):
+        self.scores.update({key.encode(): score for key, score in mapping.items()})
+
+    def zcard(self, name):
+        return len(self.scores)
+
+    def zrange(self, name, start, end):
+        return sorted(self.scores, key=self.scores.get)[start:end + 1]
+
+    def zrem(self, name, *keys):
+        for key in keys:
+            self.scores.pop(key, None)
+
+    def pipeline(self):
+        client = self
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return getattr(client, name)
+
+            def execute(self):
+                pass
+
+        return Pipeline()
+
+
+def test_redis_query_cache(monkeypatch):
+    """Test that results are stored as Parquet in redis and never unpickled."""
+    import redis
+
+    client = FakeRedis()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url: client)
+    cache = query_cache.RedisQueryCache("redis://localhost:6379/2", 60, 2)
+    df = pd.DataFrame(
+        {
+            "date": pd.date_range("2022-01-01", periods=2, tz="UTC"),
+            "region": ["us", None],
+            "cloud_cost": [1.5, 2.0],
+        }
+    )
+
+    cache.set("a", df)
+    value = client.get(query_cache.REDIS_KEY_PREFIX + "a")
+    assert value.startswith(b"PAR1")
+    pd.testing.assert_frame_equal(cache.get("a"), df)
+
+    cache.set("b", df)
+    cache.set("c", df)
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+    # values which are not Parquet are discarded, not unpickled
+    client.set(query_cache.REDIS_KEY_PREFIX + "d", pickle.dumps(df))
+    assert cache.get("d") is None
+    assert client.get(query_cache.REDIS_KEY_PREFIX + "d") is None
@@ -0,0 +1,94 @@
+"""Tests for the RootCauseAnalysis class."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from chaos_genius.core.rca.root_cause_analysis import RootCauseAnalysis
+
+
+def _get_rca_outputs(grp1_df, grp2_df, agg):
+    rca = RootCauseAnalysis(
+        grp1_df, grp2_df, ["region", "device", "price"], "cost", agg=agg
+    )
+    outputs = [
+        rca.get_panel_metrics(),
+        rca.get_impact_rows(),
+        rca.get_waterfall_table_rows(),
+        rca.get_hierarchical_table("region"),
+    ]
+    return json.dumps(outputs, sort_keys=True, default=str)
+
+
+@pytest.mark.parametrize("agg", ["mean", "sum", "count"])
+def test_rca_categorical_dimensions(agg):
+    """Test that categorical dimensions give the same RCA as string ones."""
+    rng = np.random.default_rng(0)
+
+    def make_df(num_rows, regions):
+        return pd.DataFrame(
+            {
+                "region": rng.choice(regions, num_rows),
+                "device": rng.choice(["ios", "android", "web"], num_rows),
+                "price": rng.integers(1, 100, num_rows).astype(float),
+                "cost": rng.random(num_rows) * 10,
+            }
+        )
+
+    # regions differ between the groups, so do their categories
+    grp1_df = make_df(500, ["us", "eu", "in"])
+    grp2_df = make_df(600, ["us", "eu", "jp"])
+
+    cat_dtypes = {"region": "category", "device": "category"}
+    assert _get_rca_outputs(
+        grp1_df.copy(), grp2_df.copy(), agg
+    ) == _get_rca_outputs(
+        grp1_df.astype(cat_dtypes), grp2_df.astype(cat_dtypes), agg
+    )
+
+
+def test_rca_pushdown_count():
+    """Test that pushed down count KPIs give the same RCA as the raw data."""
+    rng = np.random.default_rng(0)
+
+    def make_df(num_rows):
+        return pd.DataFrame(
+            {
+                "region": rng.choice(["us", "eu", "in"], num_rows),
+                "device": rng.choice(["ios", "android", "web"], num_rows),
+                "cost": rng.random(num_rows) * 10,
+            }
+        )
+
+    def aggregate(df):
+        return (
+            df.groupby(["region", "device"])["cost"]
+            .agg(cost="sum", row_count="count")
+            .reset_index()
+        )
+
+    def get_outputs(grp1_df, grp2_df, **kwargs):
+        rca = RootCauseAnalysis(
+            grp1_df, grp2_df, ["region", "device"], "cost", agg="count", **kwargs
+        )
+        # row indices differ between raw and aggregated data
+        waterfall_rows = [
+            {key: val for key, val in row.items() if "indices" not in key}
+            for row in rca.get_waterfall_table_rows()
+        ]
+        outputs = [rca.get_panel_metrics(), rca.get_impact_rows(), waterfall_rows]
+        return json.dumps(outputs, sort_keys=True, default=str)
+
+    grp1_df, grp2_df = make_df(500), make_df(600)
+    expected = get_outputs(grp1_df, grp2_df)
+    preaggregated = {"preaggregated": True, "preaggregated_count_col": "row_count"}
+
+    assert expected == get_outputs(
+        aggregate(grp1_df), aggregate(grp2_df), pushdown=True, **preaggregated
+    )
+    # data preaggregated in the data source keeps its previous output
+    assert expected != get_outputs(
+        aggregate(grp1_df), aggregate(grp2_df), **preaggregated
+    )